@@ -1,18 +1,112 @@
-from flask import Flask, render_template, request, redirect, url_for, session, send_file, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, send_file, jsonify, Response, stream_with_context
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 import os
-import subprocess
+import re
+import hmac
+import json
+import secrets
+import atexit
+import time
 import threading
-import datetime
-import shutil
-import zipfile
+import tempfile
+from zipfile import ZIP_STORED, ZIP_DEFLATED
+from cache_snapshot import SNAPSHOT_FILENAME, read_snapshot_header
+from fleet_registry import OFFLINE
+from fleet_backend import create_fleet_registry, LeaderLock
+from heartbeat_store import HeartbeatStore
+from event_stream import EventBroadcaster
+from build_jobs import BuildJobQueue, BuildQueueFull, READY
+from zip_stream import stream_zip
+from orchestrator_base import (executable_cache, cached_base_executable, ensure_base_executable,
+                               orchestrator_config, config_bytes, EXECUTABLE_NAME, CONFIG_FILENAME)
 
 app = Flask(__name__)
-app.secret_key = 'supersecret'
 
 DUMMY_USERNAME = "admin"
 DUMMY_PASSWORD = "password123"
 
-orchestrators = {}  # {ip: (orch_id, name, last_seen)}
+HEARTBEAT_TIMEOUT = 70  # seconds without a heartbeat before an orchestrator is offline
+# Offline orchestrators are forgotten after this many seconds without a heartbeat (0 keeps them)
+OFFLINE_RETENTION = int(os.environ.get("OFFLINE_RETENTION", str(7 * 86400)))
+PRUNE_INTERVAL = 3600
+
+# Shared secret orchestrators send as X-Fleet-Token; written into every bundle's config.
+# Endpoints that serve or accept fleet data refuse token access while it is unset.
+FLEET_TOKEN = os.environ.get("FLEET_TOKEN")
+if not FLEET_TOKEN:
+    print("[WARNING] FLEET_TOKEN is not set; orchestrators can't use snapshots, peers or the fleet cache")
+
+FLEET_DB_PATH = os.environ.get("FLEET_DB_PATH", "./data/fleet.db")
+
+def load_secret_key(path):
+    # Signs sessions and provisioning links. Every worker must use the same key, so without
+    # SECRET_KEY one is generated once and kept next to the fleet database
+    key = os.environ.get("SECRET_KEY")
+    if key:
+        return key
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            # Linking fails if another worker got there first; its key wins
+            os.link(tmp_path, path)
+            print(f"[INFO] SECRET_KEY is not set; generated one in {path}")
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path) as f:
+        return f.read().strip()
+
+SECRET_KEY_PATH = os.environ.get("SECRET_KEY_PATH", os.path.join(os.path.dirname(FLEET_DB_PATH), "secret_key"))
+app.secret_key = load_secret_key(SECRET_KEY_PATH)
+
+# 'memory' keeps the fleet in this process (python app.py); multi-worker servers need 'sqlite',
+# where every worker reads and writes the fleet in FLEET_DB_PATH
+FLEET_BACKEND = os.environ.get("FLEET_BACKEND", "memory")
+fleet = create_fleet_registry(FLEET_BACKEND, FLEET_DB_PATH, timeout=HEARTBEAT_TIMEOUT)
+heartbeat_store = None
+if FLEET_BACKEND == "memory":
+    heartbeat_store = HeartbeatStore(FLEET_DB_PATH)
+    print(f"[INFO] Restored {fleet.restore(heartbeat_store.load())} orchestrators from {FLEET_DB_PATH}")
+    atexit.register(heartbeat_store.close)
+
+# Of all worker processes, only the lock holder runs the heartbeat monitor and the base build
+LEADER_LOCK_PATH = os.environ.get("LEADER_LOCK_PATH", os.path.join(os.path.dirname(FLEET_DB_PATH), "leader.lock"))
+LEADER_RETRY = 5  # seconds between attempts of standby workers to take over
+leader_lock = LeaderLock(LEADER_LOCK_PATH)
+
+# Dashboard clients get orchestrator state changes pushed over SSE instead of polling
+fleet_events = EventBroadcaster()
+STREAM_SUMMARY_INTERVAL = 15
+MAX_STATUS_PAGE = 1000
+
+# Builds run on a small worker pool, each in its own directory under BUILD_JOBS_DIR
+BUILD_JOBS_DIR = './orchestrator_dist/jobs'
+BUILD_WORKERS = int(os.environ.get("BUILD_WORKERS", "2"))
+GENERATE_WAIT = 20  # seconds /generate waits for a job before handing off to the status page
+
+# Bulk provisioning: manifest download links carry their signed config, so they need no stored state
+MAX_PROVISION_BATCH = 1000
+PROVISION_LINK_TTL = 24 * 3600
+
+# Built base executables, keyed by template sources and build options
+ARTIFACT_CACHE_BYTES = int(os.environ.get("ARTIFACT_CACHE_BYTES", str(2 * 1024 ** 3)))
+artifacts = executable_cache(max_bytes=ARTIFACT_CACHE_BYTES)
+
+SNAPSHOT_DIR = './cache_snapshots'
+SNAPSHOT_PATH = os.path.join(SNAPSHOT_DIR, SNAPSHOT_FILENAME)
+
+# Fleet-wide semantic cache; loads an embedding model, so it's opt-in
+if os.environ.get("FLEET_CACHE_ENABLED") == "1":
+    from fleet_cache_routes import fleet_cache_bp, FLEET_CACHE_TOKEN
+    if FLEET_CACHE_TOKEN:
+        app.register_blueprint(fleet_cache_bp)
+    else:
+        # Open stores would let anyone poison the answers served to the whole fleet
+        print("[WARNING] Fleet cache disabled: set FLEET_CACHE_TOKEN or FLEET_TOKEN to enable it")
 
 @app.route('/', methods=['GET', 'POST'])
 def login():
@@ -37,26 +131,229 @@ def generate():
     if 'user' not in session:
         return redirect(url_for('login'))
 
-    name = request.form.get('name')
-    if not name:
+    params = build_params(request.form)
+    if not params['name']:
         return "Name is required.", 400
+    cached = cached_base_executable(artifacts)
+    if cached is not None:
+        return bundle_response(params, cached)
+    try:
+        job = build_jobs.submit(params)
+    except BuildQueueFull:
+        return "Too many builds in progress, try again shortly.", 503
+
+    # Usually only packaging is left, which is quick; otherwise let the page follow the job
+    if not job.done.wait(GENERATE_WAIT) or job.status != READY:
+        return redirect(url_for('home', job=job.id))
+    return bundle_response(params, job.artifact_path)
+
+@app.route('/api/builds', methods=['POST'])
+def submit_build():
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    params = build_params(request.get_json(silent=True) or request.form)
+    if not params['name']:
+        return jsonify({"error": "name is required"}), 400
+    try:
+        cached = cached_base_executable(artifacts)
+        job = build_jobs.completed(params, cached) if cached else build_jobs.submit(params)
+    except BuildQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({**job.to_dict(), "status_url": url_for('build_status', job_id=job.id)}), 202
+
+@app.route('/api/builds/<job_id>')
+def build_status(job_id):
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = build_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown build"}), 404
+    data = job.to_dict()
+    if job.status == READY:
+        data["download_url"] = url_for('download_build', job_id=job.id)
+    return jsonify(data)
+
+@app.route('/api/builds/<job_id>/download')
+def download_build(job_id):
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    job = build_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown build"}), 404
+    if job.status != READY:
+        return jsonify({"error": f"Build is {job.status}"}), 409
+    if not os.path.exists(job.artifact_path):
+        return jsonify({"error": "Build artifact was evicted, submit the build again"}), 410
+    return bundle_response(job.params, job.artifact_path)
+
+@app.route('/api/provision', methods=['POST'])
+def provision():
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+    items = data.get('orchestrators') or []
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "orchestrators must be a non-empty list"}), 400
+    if len(items) > MAX_PROVISION_BATCH:
+        return jsonify({"error": f"At most {MAX_PROVISION_BATCH} orchestrators per batch"}), 400
+
+    # Batch-level settings are defaults for each entry; an entry may be just a name
+    defaults = {key: data[key] for key in ('controller_url', 'interval', 'warm_cache') if key in data}
+    entries = []
+    for item in items:
+        if not isinstance(item, (str, dict)):
+            return jsonify({"error": "Each orchestrator must be a name or an object"}), 400
+        entry = {**defaults, **(item if isinstance(item, dict) else {"name": item})}
+        if not isinstance(entry.get('name'), str) or not entry['name'].strip():
+            return jsonify({"error": "Every orchestrator needs a name"}), 400
+        if not isinstance(entry.get('controller_url') or '', str):
+            return jsonify({"error": "controller_url must be a string"}), 400
+        entries.append(entry)
+    batch = [build_params(entry) for entry in entries]
+
+    # One base executable serves the whole batch; build it first if needed
+    executable_path = cached_base_executable(artifacts)
+    if executable_path is None:
+        try:
+            job = build_jobs.submit(batch[0])
+        except BuildQueueFull as e:
+            return jsonify({"error": str(e)}), 503
+        return jsonify({"status": "building", "status_url": url_for('build_status', job_id=job.id),
+                        "error": "Base executable is being built, retry when the build is ready"}), 202
 
-    create_orchestrator_executable(name)
+    if data.get('format', 'zip') == 'manifest':
+        signer = provision_signer()
+        return jsonify({
+            "orchestrators": [
+                {"name": params['name'],
+                 "download_url": url_for('provision_bundle', token=signer.dumps(params), _external=True)}
+                for params in batch
+            ],
+            "expires_in": PROVISION_LINK_TTL,
+        })
+    return provision_archive(batch, executable_path)
+
+@app.route('/api/provision/bundle/<token>')
+def provision_bundle(token):
+    try:
+        params = provision_signer().loads(token, max_age=PROVISION_LINK_TTL)
+    except BadSignature:
+        return jsonify({"error": "Invalid or expired download link"}), 404
+    executable_path = cached_base_executable(artifacts)
+    if executable_path is None:
+        return jsonify({"error": "Base executable is not built, provision the batch again"}), 503
+    return bundle_response(params, executable_path)
 
-    file_path = './orchestrator_dist/orchestrator_build.zip'
-    return send_file(file_path, as_attachment=True)
+def provision_signer():
+    return URLSafeTimedSerializer(app.secret_key, salt='provision')
+
+def provision_archive(batch, executable_path):
+    # Shared executable plus one config per orchestrator: the archive is about the size of a single bundle
+    entries = [(EXECUTABLE_NAME, executable_path, ZIP_STORED)]
+    if any(params['include_snapshot'] for params in batch) and os.path.exists(SNAPSHOT_PATH):
+        entries.append((SNAPSHOT_FILENAME, SNAPSHOT_PATH, ZIP_STORED))
+    manifest = []
+    used = set()
+    for params in batch:
+        stem = re.sub(r'[^A-Za-z0-9._-]+', '_', params['name']).strip('._') or 'orchestrator'
+        filename, n = f"{stem}.json", 1
+        while filename in used:
+            n += 1
+            filename = f"{stem}-{n}.json"
+        used.add(filename)
+        config_path = f"configs/{filename}"
+        config = orchestrator_config(params['name'], params['controller_url'], params['interval'], FLEET_TOKEN)
+        entries.append((config_path, config_bytes(config), ZIP_DEFLATED))
+        manifest.append({"name": params['name'], "config": config_path,
+                         "command": f"./{EXECUTABLE_NAME} --config {config_path}"})
+    entries.append(("manifest.json", json.dumps({"orchestrators": manifest}, indent=2).encode("utf-8"), ZIP_DEFLATED))
+    print(f"[INFO] Streaming provisioning archive for {len(batch)} orchestrators")
+    return Response(stream_with_context(stream_zip(entries)), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=orchestrators.zip'})
+
+@app.route('/api/build_stats')
+def build_stats():
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({"jobs": build_jobs.get_stats(), "artifacts": artifacts.get_stats()})
+
+def build_params(form):
+    interval = form.get('interval')
+    return {
+        "name": (form.get('name') or '').strip(),
+        "include_snapshot": form.get('warm_cache') in ('on', True),
+        "controller_url": form.get('controller_url') or request.host_url.rstrip('/'),
+        "interval": int(interval) if str(interval or '').isdigit() else None,
+    }
 
 @app.route('/heartbeat', methods=['POST'])
 def heartbeat():
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
     orch_id = data.get('id')
+    if orch_id is not None and (not isinstance(orch_id, str) or not orch_id.strip()):
+        return jsonify({"error": "id must be a non-empty string"}), 400
     orch_name = data.get('name', 'Unnamed Orchestrator')
+    if not isinstance(orch_name, str):
+        return jsonify({"error": "name must be a string"}), 400
+    port = data.get('replication_port')
+    if port is not None and (isinstance(port, bool) or not isinstance(port, int) or not 1 <= port <= 65535):
+        return jsonify({"error": "replication_port must be an integer from 1 to 65535"}), 400
     ip = request.remote_addr
-    now = datetime.datetime.utcnow()
-    orchestrators[ip] = (orch_id, orch_name, now)
-    print(f"[Heartbeat] {orch_id} ({orch_name}) @ {ip} @ {now}")
+    replication_url = None
+    # Peers send the fleet token to this URL, so only token holders may advertise one
+    if port is not None and fleet_authorized():
+        replication_url = f"http://{ip}:{port}"
+    record = fleet.heartbeat(orch_id, orch_name, ip, replication_url)
+    if heartbeat_store is not None:
+        heartbeat_store.save(record)
+    print(f"[Heartbeat] {orch_id} ({orch_name}) @ {ip} @ {record.last_seen_at}")
     return {"status": "received"}
 
+def fleet_authorized():
+    # Dashboard users, or orchestrators presenting the fleet token
+    if 'user' in session:
+        return True
+    token = request.headers.get('X-Fleet-Token')
+    return bool(FLEET_TOKEN and token) and hmac.compare_digest(token.encode(), FLEET_TOKEN.encode())
+
+@app.route('/api/cache_snapshot', methods=['GET'])
+def download_cache_snapshot():
+    if not fleet_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    if not os.path.exists(SNAPSHOT_PATH):
+        return jsonify({"error": "No cache snapshot uploaded"}), 404
+    return send_file(os.path.abspath(SNAPSHOT_PATH), as_attachment=True, download_name=SNAPSHOT_FILENAME)
+
+@app.route('/api/cache_snapshot', methods=['POST'])
+def upload_cache_snapshot():
+    if not fleet_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    upload = request.files.get('snapshot')
+    if upload is None:
+        return jsonify({"error": "snapshot file is required"}), 400
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            upload.save(f)
+        with open(tmp_path, 'rb') as f:
+            header = read_snapshot_header(f)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+    except ValueError as e:
+        os.remove(tmp_path)
+        return jsonify({"error": str(e)}), 400
+
+    print(f"[INFO] Stored cache snapshot with {header['count']} entries ({header['model_name']})")
+    return jsonify({"status": "stored", "entries": header['count'], "model_name": header['model_name']})
+
 @app.route('/dashboard')
 def dashboard():
     if 'user' not in session:
@@ -66,66 +363,147 @@ def dashboard():
 @app.route('/api/heartbeat_status')
 def heartbeat_status():
     if 'user' not in session:
-        return jsonify([])
-
-    now = datetime.datetime.utcnow()
-    data = []
-    for ip, (orch_id, name, last_seen) in orchestrators.items():
-        status = "Online" if (now - last_seen).total_seconds() <= 70 else "Offline"
-        data.append({
-            "name": name or orch_id,
-            "ip": ip,
-            "last_seen": last_seen.strftime('%Y-%m-%d'),
-            "status": status
-        })
-    return jsonify(data)
+        return jsonify({"items": [], "next_cursor": None, "total": 0})
 
-def monitor_heartbeats():
-    while True:
-        now = datetime.datetime.utcnow()
-        for ip, (orch_id, name, last_seen) in list(orchestrators.items()):
-            if (now - last_seen).total_seconds() > 60:
-                print(f"[WARNING] Lost heartbeat from {orch_id} ({name}) @ {ip}")
-        threading.Event().wait(15)
+    # Unchanged fleet: answer from the client's copy without building the page
+    etag = f"v{fleet.version}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
 
-def create_orchestrator_executable(name):
-    base_path = './orchestrator-template'  # Remove /controller prefix
-    build_path = './orchestrator_dist'
-    os.makedirs(build_path, exist_ok=True)
+    args = request.args
+    try:
+        page = fleet.query(
+            status=args.get('status') or None,
+            name=args.get('name') or None,
+            seen_after=args.get('seen_after') or None,
+            seen_before=args.get('seen_before') or None,
+            sort=args.get('sort', 'name'),
+            descending=args.get('order') == 'desc',
+            cursor=args.get('cursor') or None,
+            offset=max(args.get('offset', 0, type=int), 0),
+            limit=min(max(args.get('limit', 100, type=int), 1), MAX_STATUS_PAGE),
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
 
-    shutil.copyfile(f'{base_path}/orchestrator.py', f'{base_path}/orchestrator_build.py')
+    response = jsonify({
+        "items": [status_row(record) for record in page["records"]],
+        "next_cursor": page["next_cursor"],
+        "total": page["total"],
+        "version": page["version"],
+    })
+    response.set_etag(f"v{page['version']}")
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/heartbeat_stream')
+def heartbeat_stream():
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
 
-    with open(f'{base_path}/orchestrator_build.py', 'r+') as f:
-        content = f.read()
-        f.seek(0)
-        f.write(f'ORCHESTRATOR_NAME = "{name}"\n' + content)
-        f.truncate()
+    # ?snapshot=counts skips the full fleet list for clients that page through heartbeat_status
+    if request.args.get('snapshot') == 'counts':
+        snapshot = fleet.counts
+    else:
+        def snapshot():
+            return [status_row(record) for record in fleet.records()]
+
+    stream = fleet_events.stream(snapshot, fleet.counts, STREAM_SUMMARY_INTERVAL)
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/fleet_counts')
+def fleet_counts():
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(fleet.counts())
 
-    subprocess.run([
-        "pyinstaller",
-        "--onefile",
-        "--distpath", build_path,
-        "--clean",
-        "--name", "orchestrator_build",
-        "--noconsole",
-        f"{base_path}/orchestrator_build.py"
-    ], check=True)
+@app.route('/api/peers')
+def peers():
+    # Used by orchestrators for cache replication discovery
+    if not fleet_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(fleet.peers(exclude=request.args.get('exclude')))
+
+def log_lost_heartbeat(record, old_status, new_status):
+    # Every worker sees the change; one log line is enough
+    if new_status == OFFLINE and leader_lock.is_leader:
+        print(f"[WARNING] Lost heartbeat from {record.id} ({record.name}) @ {record.ip}")
+
+def publish_status_change(record, old_status, new_status):
+    event = "new" if old_status is None else new_status.lower()
+    fleet_events.publish(event, status_row(record))
+
+def status_row(record):
+    return {
+        "id": record.id,
+        "name": record.name or record.id,
+        "ip": record.ip,
+        "last_seen": record.last_seen_date,
+        "status": record.status
+    }
+
+fleet.add_listener(log_lost_heartbeat)
+fleet.add_listener(publish_status_change)
+
+def monitor_heartbeats():
+    # Advances the registry's timing wheel (memory) or runs one indexed UPDATE per tick (sqlite);
+    # only orchestrators that just timed out are touched
+    fleet.run_expiry()
 
-    executable_path = os.path.join(build_path, "orchestrator_build")
-    zip_path = os.path.join(build_path, "orchestrator_build.zip")
+def prune_offline():
+    # Orchestrators that were replaced or decommissioned would otherwise stay listed forever
+    while OFFLINE_RETENTION > 0:
+        try:
+            removed = fleet.prune(OFFLINE_RETENTION)
+            if heartbeat_store is not None:
+                for orch_id in removed:
+                    heartbeat_store.delete(orch_id)
+            if removed:
+                print(f"[INFO] Pruned {len(removed)} orchestrators offline for over {OFFLINE_RETENTION}s")
+        except Exception as e:
+            print(f"[WARNING] Pruning offline orchestrators failed: {e}")
+        time.sleep(PRUNE_INTERVAL)
 
-    if not os.path.exists(executable_path):
-        raise FileNotFoundError("orchestrator_build not found!")
+def run_leader_tasks():
+    # Standby workers keep trying, so the tasks move to another worker if the leader dies
+    while not leader_lock.try_acquire():
+        time.sleep(LEADER_RETRY)
+    print(f"[INFO] Worker {os.getpid()} runs the heartbeat monitor")
+    # Build the base executable now if the image didn't, so the first download doesn't wait for it
+    threading.Thread(target=ensure_base_executable, args=(artifacts,), daemon=True).start()
+    threading.Thread(target=prune_offline, daemon=True).start()
+    monitor_heartbeats()
 
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
+def start_background_tasks():
+    # Called once per process: by __main__, or by gunicorn's post_worker_init in each worker
+    threading.Thread(target=run_leader_tasks, daemon=True).start()
 
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        zipf.write(executable_path, arcname="orchestrator_build")
+def run_build_job(params, job_dir, report):
+    # Only the base executable is built; bundles are zipped on the fly when downloaded
+    report("base executable", 10)
+    return ensure_base_executable(artifacts, work_root=job_dir)
 
-    print(f"[INFO] Created zipped orchestrator at {zip_path}")
+# Shared job state lets any worker answer for a build another worker runs
+build_jobs = BuildJobQueue(run_build_job, BUILD_JOBS_DIR, max_workers=BUILD_WORKERS,
+                           db_path=os.path.join(BUILD_JOBS_DIR, "jobs.db") if FLEET_BACKEND == "sqlite" else None)
 
+def bundle_response(params, executable_path):
+    # Streamed as it is zipped: no temporary file, and memory stays at about one read chunk
+    entries = [
+        (EXECUTABLE_NAME, executable_path, ZIP_STORED),
+        (CONFIG_FILENAME, config_bytes(orchestrator_config(params['name'], params['controller_url'],
+                                                           params['interval'], FLEET_TOKEN)), ZIP_DEFLATED),
+    ]
+    if params['include_snapshot'] and os.path.exists(SNAPSHOT_PATH):
+        entries.append((SNAPSHOT_FILENAME, SNAPSHOT_PATH, ZIP_STORED))
+    print(f"[INFO] Streaming orchestrator bundle for {params['name']}")
+    return Response(stream_with_context(stream_zip(entries)), mimetype='application/zip',
+                    headers={'Content-Disposition': 'attachment; filename=orchestrator_build.zip'})
 
 if __name__ == '__main__':
-    threading.Thread(target=monitor_heartbeats, daemon=True).start()
+    # Development server; production runs several workers with: gunicorn -c gunicorn.conf.py app:app
+    start_background_tasks()
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,135 @@
+"""
+Artifact Cache - Content-addressed store for orchestrator build artifacts
+A build artifact is fully determined by its inputs (template sources, which include the
+template's requirements.txt, and build options), so it is stored under a hash of those and
+identical requests reuse it instead of building again. The store is bounded by total size;
+the least recently used artifacts are evicted first.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger("artifact_cache")
+
+
+def artifact_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable parts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class ArtifactCache:
+    """
+    Size-bounded LRU of files keyed by content hash.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 2 * 1024 ** 3, suffix: str = ".zip"):
+        """
+        Initialize the cache, picking up artifacts already on disk.
+
+        Args:
+            root: Directory the artifacts are stored in
+            max_bytes: Total size kept before least recently used artifacts are deleted
+            suffix: File extension of stored artifacts
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+        existing = []
+        for filename in os.listdir(root):
+            if filename.endswith(suffix):
+                st = os.stat(os.path.join(root, filename))
+                existing.append((st.st_mtime, filename[:-len(suffix)], st.st_size))
+        # mtime is refreshed on every hit, so it orders the entries by last use
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + self.suffix)
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """Path of the artifact for `key`, or None; `count` records the lookup in the hit metrics"""
+        path = self._path(key)
+        with self._lock:
+            if key not in self._entries:
+                # Another process sharing the directory may have stored it since we listed it
+                try:
+                    size = os.path.getsize(path)
+                except FileNotFoundError:
+                    if count:
+                        self.stats["misses"] += 1
+                    return None
+                self._entries[key] = size
+                self._bytes += size
+            self._entries.move_to_end(key)
+            if count:
+                self.stats["hits"] += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._bytes -= self._entries.pop(key, 0)
+            return None
+        return path
+
+    def put(self, key: str, source_path: str) -> str:
+        """
+        Move a finished artifact into the cache.
+
+        Args:
+            key: Content hash of the artifact's inputs
+            source_path: File to move; must be on the same filesystem as the cache
+
+        Returns:
+            Path of the cached artifact
+        """
+        path = self._path(key)
+        size = os.path.getsize(source_path)
+        os.replace(source_path, path)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.stats["stores"] += 1
+        self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: Optional[str] = None):
+        evicted = []
+        with self._lock:
+            while self._bytes > self.max_bytes and self._entries:
+                key = next(iter(self._entries))
+                if key == keep:
+                    break
+                self._bytes -= self._entries.pop(key)
+                self.stats["evictions"] += 1
+                evicted.append(key)
+        for key in evicted:
+            # Downloads already streaming the file keep their open handle
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logger.info(f"Evicted artifact {key[:12]}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,110 @@
+"""
+Heartbeat Benchmark - Heartbeat throughput of the controller at different worker counts
+Starts the controller under gunicorn once per worker count (with a fresh fleet database),
+posts heartbeats from several client processes for a fixed time, and reports requests per
+second and latency percentiles.
+
+    python bench_heartbeats.py --workers 1,4 --clients 16 --duration 10
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+import requests
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not come up within {timeout}s")
+
+
+def run_client(args):
+    url, client, duration, fleet_size = args
+    session = requests.Session()
+    latencies, errors = [], 0
+    deadline = time.time() + duration
+    i = 0
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            response = session.post(url, json={"id": f"bench-{client}-{i % fleet_size}", "name": f"bench {client}"},
+                                    timeout=10)
+            if response.status_code != 200:
+                errors += 1
+        except requests.RequestException:
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+        i += 1
+    return latencies, errors
+
+
+def bench(workers: int, backend: str, clients: int, duration: float, fleet_size: int, port: int, cwd: str):
+    data_dir = tempfile.mkdtemp(prefix="bench-fleet-")
+    env = {**os.environ, "FLEET_BACKEND": backend, "FLEET_DB_PATH": os.path.join(data_dir, "fleet.db"),
+           "WEB_CONCURRENCY": str(workers)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(APP_DIR, "gunicorn.conf.py"),
+         "--pythonpath", APP_DIR, "--bind", f"127.0.0.1:{port}", "app:app"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(f"{base_url}/api/peers", server)
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(run_client, [(f"{base_url}/heartbeat", c, duration, fleet_size)
+                                            for c in range(clients)])
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Controller heartbeat throughput benchmark")
+    parser.add_argument("--workers", default=f"1,{multiprocessing.cpu_count()}",
+                        help="Comma-separated gunicorn worker counts")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "memory"],
+                        help="Fleet backend; memory is only correct with one worker")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent client processes")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of load per worker count")
+    parser.add_argument("--fleet-size", type=int, default=1000, help="Distinct orchestrator ids per client")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--cwd", default=APP_DIR, help="Directory the controller runs in")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        r = bench(workers, args.backend, args.clients, args.duration, args.fleet_size, args.port, args.cwd)
+        print(f"{r['workers']:>8} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.0f} "
+              f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
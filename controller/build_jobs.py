@@ -0,0 +1,198 @@
+"""
+Build Jobs - Background orchestrator builds for the controller
+Download requests become jobs run by a bounded worker pool, so a slow build (the first one
+after a template change compiles the base executable) never holds up a request thread.
+Every job writes into its own directory; clients poll the job status and download the
+artifact once it is ready. Finished jobs and their files are dropped after a TTL.
+With several server processes, job state is also written to a shared SQLite database so any
+process can answer status and download requests for a job another one runs.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger("build_jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+
+class BuildQueueFull(Exception):
+    pass
+
+
+class BuildJob:
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = QUEUED
+        self.stage = "queued"
+        self.progress = 0
+        self.error = None
+        self.artifact_path = None
+        self.created = time.time()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.params.get("name"),
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+    @classmethod
+    def from_row(cls, row) -> "BuildJob":
+        job = cls(json.loads(row[1]))
+        job.id, job.status, job.stage, job.progress, job.error, job.artifact_path, job.created, job.finished = \
+            row[0], *row[2:]
+        if job.finished is not None:
+            job.done.set()
+        return job
+
+
+class BuildJobQueue:
+    """
+    Runs build jobs on a fixed number of worker threads.
+    """
+
+    def __init__(self, build: Callable[[Dict[str, Any], str, Callable[[str, int], None]], str],
+                 jobs_dir: str, max_workers: int = 2, max_pending: int = 64, ttl: float = 3600,
+                 db_path: Optional[str] = None):
+        """
+        Args:
+            build: build(params, job_dir, report) -> artifact path; report(stage, progress) updates the job
+            jobs_dir: Parent of the per-job build directories
+            max_workers: Builds running at once
+            max_pending: Queued plus running jobs accepted before submit() refuses more
+            ttl: Seconds a finished job and its artifact are kept
+            db_path: SQLite database shared with other processes, or None to keep jobs in memory only
+        """
+        self.build = build
+        self.jobs_dir = jobs_dir
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0}
+        self._jobs: Dict[str, BuildJob] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="build-job")
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS build_jobs (id TEXT PRIMARY KEY, params TEXT, status TEXT, "
+                "stage TEXT, progress INTEGER, error TEXT, artifact_path TEXT, created REAL, finished REAL)"
+            )
+            self._db_lock = threading.Lock()
+
+    def _save(self, job: BuildJob):
+        if self._db is None:
+            return
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO build_jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (job.id, json.dumps(job.params), job.status, job.stage, job.progress,
+                              job.error, job.artifact_path, job.created, job.finished))
+
+    def submit(self, params: Dict[str, Any]) -> BuildJob:
+        """Queue a build; raises BuildQueueFull when max_pending jobs are already waiting or running"""
+        self._expire()
+        job = BuildJob(params)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise BuildQueueFull(f"{self._pending} builds already pending")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+        self._save(job)
+        self._executor.submit(self._run, job)
+        return job
+
+    def completed(self, params: Dict[str, Any], artifact_path: str) -> BuildJob:
+        """Register a job whose artifact already exists, without using a worker"""
+        self._expire()
+        job = BuildJob(params)
+        job.artifact_path = artifact_path
+        job.status, job.stage, job.progress = READY, "done", 100
+        job.finished = job.created
+        job.done.set()
+        with self._lock:
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+            self.stats["succeeded"] += 1
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[BuildJob]:
+        job = self._jobs.get(job_id)
+        if job is not None or self._db is None:
+            return job
+        # Submitted to another process; a snapshot of its last saved state
+        with self._db_lock:
+            row = self._db.execute("SELECT id, params, status, stage, progress, error, artifact_path, created, "
+                                   "finished FROM build_jobs WHERE id = ?", (job_id,)).fetchone()
+        return BuildJob.from_row(row) if row else None
+
+    def _run(self, job: BuildJob):
+        job_dir = os.path.join(self.jobs_dir, job.id)
+
+        def report(stage: str, progress: int):
+            job.stage = stage
+            job.progress = progress
+            self._save(job)
+
+        job.status = RUNNING
+        try:
+            os.makedirs(job_dir, exist_ok=True)
+            job.artifact_path = self.build(job.params, job_dir, report)
+            job.stage, job.progress, job.status = "done", 100, READY
+        except Exception as e:
+            logger.error(f"Build job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+                self.stats["succeeded" if job.status == READY else "failed"] += 1
+            self._save(job)
+            job.done.set()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job for job in self._jobs.values() if job.finished and job.finished < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM build_jobs WHERE finished < ?", (cutoff,))
+        for job in expired:
+            shutil.rmtree(os.path.join(self.jobs_dir, job.id), ignore_errors=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "pending": self._pending, "jobs": len(self._jobs)}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+        if self._db is not None:
+            self._db.close()
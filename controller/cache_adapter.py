@@ -1,17 +1,34 @@
 import os
 import json
+import asyncio
 import datetime
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Callable
 from semantic_cache import SemanticCache  # Our core semantic cache engine
+from history_logger import get_history_logger
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("cache_adapter")
 
 class CacheAdapter:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_dir: str = "./semantic_cache", enabled: bool = True, ttl_seconds: int = 3600):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", cache_dir: str = "./semantic_cache", enabled: bool = True, ttl_seconds: int = 3600, log_dir: str = "logs",
+                 remote_url: str = None, remote_timeout: float = 0.5, lookup_budget_ms: float = None,
+                 lookup_workers: int = 4):
         self.enabled = enabled
         self.cache = None
+        # With a budget, lookups run on worker threads and the LLM call starts once the budget is spent
+        self.lookup_budget_ms = lookup_budget_ms
+        self._executor = None
+        if lookup_budget_ms is not None:
+            self._executor = ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="cache-lookup")
+        self._max_pending = lookup_workers * 4
+        self._pending = 0
+        self._budget_lock = threading.Lock()
+        self.budget_stats = {"bypasses": 0, "late_hits": 0, "llm_won": 0, "skipped_lookups": 0, "lookup_errors": 0}
+        self.log_dir = log_dir
+        self.history = get_history_logger(log_dir)
         if enabled:
             try:
                 self.cache = SemanticCache(
@@ -20,6 +37,10 @@ class CacheAdapter:
                     enabled=enabled,
                     ttl_seconds=ttl_seconds
                 )
+                if remote_url:
+                    # Share hits across the fleet through the controller's cache
+                    from remote_cache import RemoteCacheClient
+                    self.cache = RemoteCacheClient(remote_url, local=self.cache, timeout=remote_timeout)
                 logger.info(f"■ Semantic cache initialized with model {model_name}")
             except Exception as e:
                 logger.error(f"■ Failed to initialize semantic cache: {e}")
@@ -31,7 +52,11 @@ class CacheAdapter:
             if not self.enabled or self.cache is None:
                 return await llm_function(prompt, *args, **kwargs)
 
-            cache_result = self.cache.lookup(prompt)
+            llm_task = None
+            if self.lookup_budget_ms is None:
+                cache_result = self.cache.lookup(prompt)
+            else:
+                cache_result, llm_task = await self._budgeted_lookup(prompt, llm_function, args, kwargs)
             similarity = cache_result.get("similarity") if cache_result else 0.0
 
             if cache_result and cache_result.get("response"):
@@ -39,7 +64,10 @@ class CacheAdapter:
                 return self._wrap_cached_response(cache_result["response"], similarity, "HIT")
 
             # Cache miss or too low similarity
-            result = await llm_function(prompt, *args, **kwargs)
+            if llm_task is not None:
+                result = await llm_task
+            else:
+                result = await llm_function(prompt, *args, **kwargs)
 
             # Add metadata
             result.cache_status = "MISS"
@@ -58,7 +86,11 @@ class CacheAdapter:
                 response_text = str(result)
 
             if response_text and self._is_valid_prompt(prompt):
-                self.cache.add(prompt, response_text)
+                if self.lookup_budget_ms is None:
+                    self.cache.add(prompt, response_text)
+                else:
+                    # Encoding the new entry shouldn't delay the response either
+                    self._executor.submit(self._store, prompt, response_text)
                 self._log_history(prompt, 1.0, "STORE")
                 return self._wrap_cached_response(response_text, similarity=1.0, action="STORE")
             else:
@@ -67,6 +99,59 @@ class CacheAdapter:
 
         return wrapped_function
 
+    async def _budgeted_lookup(self, prompt: str, llm_function: Callable, args, kwargs):
+        # Returns (cache result or None, LLM task if the call already had to start)
+        with self._budget_lock:
+            if self._pending >= self._max_pending:
+                # Lookups are backed up; queueing another would only answer after the LLM
+                self.budget_stats["skipped_lookups"] += 1
+                return None, None
+            self._pending += 1
+        lookup = asyncio.get_running_loop().run_in_executor(self._executor, self._run_lookup, prompt)
+
+        done, _ = await asyncio.wait({lookup}, timeout=self.lookup_budget_ms / 1000)
+        if done:
+            return self._lookup_result(lookup), None
+
+        # Over budget: start the LLM now and use the cache only if it answers first
+        self._count_budget("bypasses")
+        llm_task = asyncio.ensure_future(llm_function(prompt, *args, **kwargs))
+        done, _ = await asyncio.wait({lookup, llm_task}, return_when=asyncio.FIRST_COMPLETED)
+        if lookup in done:
+            result = self._lookup_result(lookup)
+            if result and result.get("response"):
+                llm_task.cancel()
+                self._count_budget("late_hits")
+                return result, None
+        else:
+            self._count_budget("llm_won")
+        return None, llm_task
+
+    def _run_lookup(self, prompt: str):
+        try:
+            return self.cache.lookup(prompt)
+        finally:
+            with self._budget_lock:
+                self._pending -= 1
+
+    def _lookup_result(self, lookup):
+        try:
+            return lookup.result()
+        except Exception as e:
+            self._count_budget("lookup_errors")
+            logger.error(f"■ Cache lookup failed: {e}")
+            return None
+
+    def _count_budget(self, stat: str):
+        with self._budget_lock:
+            self.budget_stats[stat] += 1
+
+    def _store(self, prompt: str, response_text: str):
+        try:
+            self.cache.add(prompt, response_text)
+        except Exception as e:
+            logger.error(f"■ Failed to store cache entry: {e}")
+
     def _wrap_cached_response(self, response_text: str, similarity: float = 1.0, action: str = "HIT"):
         from types import SimpleNamespace
         return SimpleNamespace(
@@ -97,6 +182,9 @@ class CacheAdapter:
             return {'enabled': False, 'status': 'Cache disabled'}
         stats = self.cache.get_stats()
         stats['enabled'] = True
+        if self.lookup_budget_ms is not None:
+            with self._budget_lock:
+                stats['lookup_budget'] = {'budget_ms': self.lookup_budget_ms, **self.budget_stats}
         return stats
 
     def clear_cache(self) -> Dict[str, Any]:
@@ -117,13 +205,33 @@ class CacheAdapter:
         }
 
     def get_recent_entries(self, limit: int = 10) -> list:
-        log_path = "logs/cache_list.log"
-        if not os.path.exists(log_path):
-            return []
-        with open(log_path, "r") as f:
-            lines = f.readlines()
-            entries = [json.loads(line.strip()) for line in lines[-limit:] if line.strip()]
-            return entries
+        return self.history.store.recent(limit)
+
+    def query_history(self, start: str = None, end: str = None, cursor: int = None,
+                      limit: int = 100, reverse: bool = False) -> Dict[str, Any]:
+        return self.history.store.query(start=start, end=end, cursor=cursor, limit=limit, reverse=reverse)
+
+    def iter_history(self, start: str = None, end: str = None, last: int = None):
+        # Same fields as the log lines the exports were built from; the store's row id stays internal
+        for entry in self.history.store.iter_entries(start=start, end=end, last=last):
+            yield {key: value for key, value in entry.items() if key != "id"}
+
+    def iter_cache_entries(self, start: str = None, end: str = None):
+        # Full cache contents including embeddings, optionally filtered by entry timestamp
+        if self.cache is None:
+            return
+        for hash_key, entry in self.cache.iter_entries():
+            timestamp = entry.get("timestamp", "")
+            if (start and timestamp < start) or (end and timestamp >= end):
+                continue
+            yield {
+                "hash": hash_key,
+                "timestamp": timestamp,
+                "prompt": entry.get("prompt"),
+                "response": entry.get("response"),
+                "metadata": entry.get("metadata", {}),
+                "embedding": entry.get("embedding"),
+            }
 
     def get_threshold(self) -> float:
         if self.cache and hasattr(self.cache, "similarity_threshold"):
@@ -148,15 +256,10 @@ class CacheAdapter:
         return {'success': True, 'message': f"TTL updated to {ttl_seconds} seconds"}
 
     def _log_history(self, prompt: str, similarity: float, action: str):
-        os.makedirs("logs", exist_ok=True)
-        timestamp = datetime.datetime.now().isoformat()
-        entry = {
-            "timestamp": timestamp,
+        # Only enqueues; the history logger thread does the file I/O
+        self.history.log({
+            "timestamp": datetime.datetime.now().isoformat(),
             "prompt": prompt,
-            "similarity": round(similarity, 4),
+            "similarity": round(float(similarity), 4),
             "action": action
-        }
-        with open("logs/cache_history.log", "a") as f:
-            f.write(f"{timestamp} - {action} - Sim: {entry['similarity']} - Prompt: {prompt[:100]}\n")
-        with open("logs/cache_list.log", "a") as f:
-            f.write(json.dumps(entry) + "\n")
+        })
@@ -1,14 +1,14 @@
 import os
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 import openai
 import time
-import csv
-import json
-import tempfile
 from cache_adapter import CacheAdapter
+from cache_export import (
+    HISTORY_COLUMNS, EXPORT_MEDIA_TYPES, cache_columns, encode_stream, export_filename, export_media_type
+)
 
 adapter = CacheAdapter()
 cache_router = APIRouter(prefix="/cache", tags=["cache"])
@@ -56,25 +56,47 @@ async def disable_cache():
 async def list_cache_entries(limit: int = Query(10, ge=1, le=100)):
     return adapter.get_recent_entries(limit)
 
-@cache_router.get("/export/json")
-async def export_cache_json():
-    entries = adapter.get_recent_entries(limit=1000)
-    path = "logs/cache_export.json"
-    os.makedirs("logs", exist_ok=True)
-    with open(path, "w") as f:
-        json.dump(entries, f, indent=2)
-    return FileResponse(path, filename="cache_export.json")
-
-@cache_router.get("/export/csv")
-async def export_cache_csv():
-    entries = adapter.get_recent_entries(limit=1000)
-    fieldnames = ["timestamp", "prompt", "similarity", "action"]
-    path = "logs/cache_export.csv"
-    with open(path, "w", newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(entries)
-    return FileResponse(path, filename="cache_export.csv")
+@cache_router.get("/history")
+async def query_cache_history(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    reverse: bool = False,
+):
+    return adapter.query_history(start=start, end=end, cursor=cursor, limit=limit, reverse=reverse)
+
+def _export_response(fmt: str, records, columns, compress: bool, base_name: str) -> StreamingResponse:
+    if fmt not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+    filename = export_filename(base_name, fmt, compress)
+    return StreamingResponse(
+        encode_stream(fmt, records, columns, compress),
+        media_type=export_media_type(fmt, compress),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@cache_router.get("/export/full/{fmt}")
+async def export_full_cache(
+    fmt: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    compress: bool = Query(False, alias="gzip"),
+):
+    dimension = getattr(adapter.cache, "dimension", 0)
+    return _export_response(fmt, adapter.iter_cache_entries(start, end), cache_columns(dimension),
+                            compress, "cache_full_export")
+
+@cache_router.get("/export/{fmt}")
+async def export_cache_history(
+    fmt: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    compress: bool = Query(False, alias="gzip"),
+):
+    return _export_response(fmt, adapter.iter_history(start, end, limit), HISTORY_COLUMNS,
+                            compress, "cache_export")
 
 # New endpoint: Get similarity threshold
 @cache_router.get("/threshold")
@@ -10,6 +10,11 @@ import importlib.util
 import logging
 from typing import Dict, Any, Optional, Callable, Awaitable
 import asyncio
+import time
+import threading
+from collections import OrderedDict
+
+from cache_snapshot import SNAPSHOT_FILENAME, download_snapshot, upload_snapshot
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +23,132 @@ logging.basicConfig(
 )
 logger = logging.getLogger("cache_manager")
 
+# Per-download settings the controller writes next to the orchestrator executable
+ORCHESTRATOR_CONFIG_FILENAME = "orchestrator_config.json"
+
+def _bundle_dir() -> str:
+    return os.path.dirname(sys.executable) if getattr(sys, "frozen", False) else os.getcwd()
+
+def load_orchestrator_settings() -> Dict[str, Any]:
+    """Controller URL and fleet token from the bundle's config (ORCHESTRATOR_CONFIG overrides its path)"""
+    path = os.environ.get("ORCHESTRATOR_CONFIG") or os.path.join(_bundle_dir(), ORCHESTRATOR_CONFIG_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            settings = json.load(f)
+        return settings if isinstance(settings, dict) else {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring {path}: {e}")
+        return {}
+
+class TieredCache:
+    """
+    Small in-process exact-match L1 in front of a semantic L2.
+    The L2 is either a local SemanticCache or a CacheDaemonClient; attributes the
+    L1 does not handle are delegated to it.
+    """
+    
+    def __init__(self, l2, max_entries: int = 1024, ttl_seconds: int = 300):
+        """
+        Initialize the tiered cache.
+        
+        Args:
+            l2: Semantic cache to fall through to
+            max_entries: L1 capacity (LRU)
+            ttl_seconds: How long an L1 entry is trusted before asking L2 again
+        """
+        self.l2 = l2
+        self.max_entries = max_entries
+        self.l1_ttl_seconds = ttl_seconds
+        self._l1 = OrderedDict()  # prompt -> (stored_at, result)
+        self._l1_lock = threading.Lock()
+        self.l1_stats = {"l1_hits": 0, "l1_misses": 0}
+    
+    def __getattr__(self, name):
+        return getattr(self.l2, name)
+    
+    def _remember(self, prompt: str, result: Dict[str, Any]):
+        with self._l1_lock:
+            self._l1[prompt] = (time.monotonic(), result)
+            self._l1.move_to_end(prompt)
+            while len(self._l1) > self.max_entries:
+                self._l1.popitem(last=False)
+    
+    def _recall(self, prompt: str):
+        with self._l1_lock:
+            item = self._l1.get(prompt)
+            if item is None:
+                self.l1_stats["l1_misses"] += 1
+                return None
+            stored_at, result = item
+            if time.monotonic() - stored_at > min(self.l1_ttl_seconds, self.l2.ttl_seconds):
+                del self._l1[prompt]
+                self.l1_stats["l1_misses"] += 1
+                return None
+            self._l1.move_to_end(prompt)
+            self.l1_stats["l1_hits"] += 1
+            return result
+    
+    def lookup(self, prompt: str):
+        """Exact-match L1 first, then the semantic L2; only hits are kept in L1"""
+        result = self._recall(prompt)
+        if result is not None:
+            return result
+        result = self.l2.lookup(prompt)
+        if result and result.get("response"):
+            self._remember(prompt, result)
+        return result
+    
+    def lookup_many(self, prompts):
+        results = {prompt: self._recall(prompt) for prompt in prompts}
+        missing = [prompt for prompt, result in results.items() if result is None]
+        if missing:
+            for prompt, result in zip(missing, self.l2.lookup_many(missing)):
+                results[prompt] = result
+                if result and result.get("response"):
+                    self._remember(prompt, result)
+        return [results[prompt] for prompt in prompts]
+    
+    def add(self, prompt: str, response: str):
+        self.l2.add(prompt, response)
+        self._remember(prompt, {
+            "response": response,
+            "similarity": 1.0,
+            "original_query": prompt,
+            "metadata": {},
+        })
+    
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self.l2.clear()
+    
+    def get_stats(self):
+        stats = self.l2.get_stats()
+        with self._l1_lock:
+            stats.update(self.l1_stats, l1_size=len(self._l1))
+        return stats
+    
+    # Threshold and TTL live in L2; the adapter sets them as plain attributes
+    @property
+    def ttl_seconds(self):
+        return self.l2.ttl_seconds
+    
+    @ttl_seconds.setter
+    def ttl_seconds(self, value):
+        self.l2.ttl_seconds = value
+    
+    @property
+    def similarity_threshold(self):
+        return self.l2.similarity_threshold
+    
+    @similarity_threshold.setter
+    def similarity_threshold(self, value):
+        with self._l1_lock:
+            self._l1.clear()
+        self.l2.similarity_threshold = value
+
 class CacheManager:
     """
     Manages the integration between the orchestrator and the caching system.
@@ -43,6 +174,7 @@ class CacheManager:
         
         # Load configuration if it exists
         self.config = self._load_config()
+        self._apply_orchestrator_settings()
         
         # Initialize components
         self._init_components()
@@ -53,8 +185,25 @@ class CacheManager:
         default_config = {
             "enabled": self.enabled,
             "threshold": 0.8,
+            "sketch_threshold": 0.9,
+            "sketch_hit_threshold": 0.95,
+            "chunk_words": None,
+            "max_chunks": 8,
+            "reduction": None,
+            "lookup_budget_ms": None,
             "ttl_seconds": 3600,
-            "model_name": "all-MiniLM-L6-v2"
+            "model_name": "all-MiniLM-L6-v2",
+            "snapshot_path": SNAPSHOT_FILENAME,
+            "snapshot_url": None,
+            "shared_cache": False,
+            "daemon_address": None,
+            "shard_addresses": [],
+            "l1_size": 1024,
+            "l1_ttl_seconds": 300,
+            "fleet_cache_url": None,
+            "fleet_cache_timeout": 0.5,
+            "fleet_cache_token": None,
+            "fleet_token": None
         }
         
         if os.path.exists(config_path):
@@ -75,6 +224,15 @@ class CacheManager:
         
         return default_config
     
+    def _apply_orchestrator_settings(self):
+        """Fill controller-derived settings the cache config leaves unset from the bundle's config"""
+        settings = load_orchestrator_settings()
+        controller = settings.get("controller")
+        if controller and not self.config.get("snapshot_url"):
+            self.config["snapshot_url"] = f"{controller.rstrip('/')}/api/cache_snapshot"
+        if settings.get("token") and not self.config.get("fleet_token"):
+            self.config["fleet_token"] = settings["token"]
+    
     def _save_config(self):
         """Save current configuration to file"""
         config_path = os.path.join(self.cache_dir, "cache_config.json")
@@ -100,33 +258,82 @@ class CacheManager:
             cache_adapter_module = cache_modules.get("cache_adapter")
             cache_integration_module = cache_modules.get("cache_integration")
             
-            if semantic_cache_module:
-                self.semantic_cache = semantic_cache_module.SemanticCache(
+            if self.config.get("shard_addresses"):
+                # Entries are partitioned across several cache daemons
+                from sharded_cache import ShardedCacheClient
+                self.semantic_cache = ShardedCacheClient(self.config["shard_addresses"])
+                logger.info(f"Connected to sharded cache with {len(self.config['shard_addresses'])} nodes")
+            elif self.config.get("daemon_address"):
+                # The model and index live in the local cache daemon
+                from cache_daemon import CacheDaemonClient
+                try:
+                    self.semantic_cache = CacheDaemonClient(self.config["daemon_address"])
+                    logger.info(f"Connected to cache daemon at {self.config['daemon_address']}")
+                except Exception as e:
+                    logger.warning(f"Cache daemon at {self.config['daemon_address']} unavailable ({e}); "
+                                   f"using an in-process cache")
+            
+            if self.semantic_cache is None and not self.config.get("shard_addresses") and semantic_cache_module:
+                cache_class = semantic_cache_module.SemanticCache
+                if self.config.get("shared_cache"):
+                    # One memory-mapped store shared by every process using this cache_dir
+                    from shared_cache import SharedSemanticCache
+                    cache_class = SharedSemanticCache
+                self.semantic_cache = cache_class(
                     model_name=self.config.get("model_name", "all-MiniLM-L6-v2"),
                     cache_path=os.path.join(self.cache_dir, "semantic_cache"),
                     enabled=self.config.get("enabled", True),
-                    ttl_seconds=self.config.get("ttl_seconds", 3600)
+                    ttl_seconds=self.config.get("ttl_seconds", 3600),
+                    similarity_threshold=self.config.get("threshold", 0.8),
+                    sketch_threshold=self.config.get("sketch_threshold", 0.9),
+                    sketch_hit_threshold=self.config.get("sketch_hit_threshold", 0.95),
+                    chunk_words=self.config.get("chunk_words"),
+                    max_chunks=self.config.get("max_chunks", 8),
+                    reduction=self.config.get("reduction")
                 )
                 logger.info("Initialized semantic cache")
+                self._warm_start()
+            
+            if self.semantic_cache and self.config.get("fleet_cache_url"):
+                # Fleet-wide cache on the controller, local cache as fallback
+                from remote_cache import RemoteCacheClient
+                self.semantic_cache = RemoteCacheClient(
+                    self.config["fleet_cache_url"],
+                    local=self.semantic_cache,
+                    timeout=self.config.get("fleet_cache_timeout", 0.5),
+                    token=self.config.get("fleet_cache_token") or self.config.get("fleet_token")
+                )
+                logger.info(f"Using fleet cache at {self.config['fleet_cache_url']}")
+            
+            if self.semantic_cache and self.config.get("l1_size", 0) > 0:
+                self.semantic_cache = TieredCache(
+                    self.semantic_cache,
+                    max_entries=self.config["l1_size"],
+                    ttl_seconds=self.config.get("l1_ttl_seconds", 300)
+                )
             
             if cache_adapter_module:
                 # If we have our own semantic cache instance, use it
                 if self.semantic_cache:
+                    # Created disabled so it doesn't load a second copy of the model
                     self.adapter = cache_adapter_module.CacheAdapter(
                         model_name=self.config.get("model_name", "all-MiniLM-L6-v2"),
                         cache_dir=os.path.join(self.cache_dir, "semantic_cache"),
-                        enabled=self.config.get("enabled", True),
-                        ttl_seconds=self.config.get("ttl_seconds", 3600)
+                        enabled=False,
+                        ttl_seconds=self.config.get("ttl_seconds", 3600),
+                        lookup_budget_ms=self.config.get("lookup_budget_ms")
                     )
                     # Replace the adapter's cache with our instance
                     self.adapter.cache = self.semantic_cache
+                    self.adapter.enabled = self.config.get("enabled", True)
                 else:
                     # Otherwise create a new adapter
                     self.adapter = cache_adapter_module.CacheAdapter(
                         model_name=self.config.get("model_name", "all-MiniLM-L6-v2"),
                         cache_dir=os.path.join(self.cache_dir, "semantic_cache"),
                         enabled=self.config.get("enabled", True),
-                        ttl_seconds=self.config.get("ttl_seconds", 3600)
+                        ttl_seconds=self.config.get("ttl_seconds", 3600),
+                        lookup_budget_ms=self.config.get("lookup_budget_ms")
                     )
                 logger.info("Initialized cache adapter")
             
@@ -138,6 +345,28 @@ class CacheManager:
         except Exception as e:
             logger.error(f"Error initializing cache components: {e}")
     
+    def _warm_start(self):
+        """Pre-warm an empty cache from a bundled or downloaded snapshot"""
+        if self.semantic_cache is None or self.semantic_cache.size() > 0:
+            return
+        
+        snapshot_path = self.config.get("snapshot_path") or SNAPSHOT_FILENAME
+        if not os.path.isabs(snapshot_path):
+            # Bundled snapshots sit next to the executable
+            snapshot_path = os.path.join(_bundle_dir(), snapshot_path)
+        
+        try:
+            if not os.path.exists(snapshot_path) and self.config.get("snapshot_url"):
+                snapshot_path = download_snapshot(
+                    self.config["snapshot_url"], os.path.join(self.cache_dir, SNAPSHOT_FILENAME),
+                    token=self.config.get("fleet_token")
+                )
+            if snapshot_path and os.path.exists(snapshot_path):
+                result = self.semantic_cache.import_snapshot(snapshot_path)
+                logger.info(f"Pre-warmed cache with {result['imported']} entries from {snapshot_path}")
+        except Exception as e:
+            logger.error(f"Failed to pre-warm cache from snapshot: {e}")
+    
     def _import_cache_modules(self):
         """Dynamically import the cache modules"""
         modules = {}
@@ -263,6 +492,26 @@ class CacheManager:
         
         return self.adapter.get_recent_entries(limit)
     
+    def query_history(self, start: str = None, end: str = None, cursor: int = None,
+                      limit: int = 100, reverse: bool = False):
+        """
+        Page through cache history, optionally within a time range.
+        
+        Args:
+            start: Inclusive ISO timestamp lower bound
+            end: Exclusive ISO timestamp upper bound
+            cursor: next_cursor returned by the previous page
+            limit: Page size
+            reverse: Newest first when True
+            
+        Returns:
+            Dict with entries and next_cursor
+        """
+        if not self.adapter:
+            return {"entries": [], "next_cursor": None}
+        
+        return self.adapter.query_history(start, end, cursor, limit, reverse)
+    
     def lookup(self, prompt: str):
         """
         Look up a prompt in the cache.
@@ -291,6 +540,59 @@ class CacheManager:
         
         self.semantic_cache.add(prompt, response)
 
+    def export_snapshot(self, path: str = None):
+        """
+        Export the cache as a binary snapshot.
+        
+        Args:
+            path: Destination file, defaults to cache_snapshot.bin in the cache directory
+            
+        Returns:
+            Dict with entry count and file size
+        """
+        if not self.semantic_cache:
+            return {'success': False, 'message': 'Cache not initialized'}
+        
+        path = path or os.path.join(self.cache_dir, SNAPSHOT_FILENAME)
+        result = self.semantic_cache.export_snapshot(path)
+        return {'success': True, 'path': path, **result}
+    
+    def import_snapshot(self, path: str):
+        """
+        Merge a binary snapshot into the cache.
+        
+        Args:
+            path: Snapshot file
+            
+        Returns:
+            Dict with the number of imported entries
+        """
+        if not self.semantic_cache:
+            return {'success': False, 'message': 'Cache not initialized'}
+        
+        result = self.semantic_cache.import_snapshot(path)
+        return {'success': True, **result}
+    
+    def publish_snapshot(self, url: str = None):
+        """
+        Export the cache and upload it to the controller, which bundles it into new orchestrators.
+        
+        Args:
+            url: Controller snapshot URL, defaults to snapshot_url from the configuration
+            
+        Returns:
+            Dict with the controller's response
+        """
+        url = url or self.config.get("snapshot_url")
+        if not url:
+            return {'success': False, 'message': 'No snapshot_url configured'}
+        
+        exported = self.export_snapshot()
+        if not exported.get('success'):
+            return exported
+        result = upload_snapshot(url, exported['path'], token=self.config.get("fleet_token"))
+        return {'success': True, **result}
+
 # Singleton instance
 _cache_manager = None
 
@@ -0,0 +1,295 @@
+"""
+Cache Replication - Peer-to-peer delta replication of semantic cache entries
+Each orchestrator serves the entries it has added since a sequence number and pulls the
+same from its peers, so an answer paid for on one machine becomes a cache hit on the others.
+
+    GET /replication/delta?since=<seq>&limit=<n>&peer=<requesting node id>
+        X-Fleet-Token: fleet token (401 without it)
+        200 body: cache snapshot (see cache_snapshot.py) holding the delta, with embeddings
+            X-Replication-Node: serving node id
+            X-Replication-Next-Seq: pass as `since` on the next request
+            X-Replication-Last-Seq: newest seq on the serving node
+
+Peers are discovered through the controller (/api/peers), which learns each orchestrator's
+replication port from its heartbeat. Deltas hold every cached prompt and response, so both
+the controller's peer list and the delta endpoint require the fleet token. Conflicts are resolved by keeping the entry with the
+newer timestamp, and entries are never sent back to the node they came from. Transfer rates
+in both directions are capped by a token bucket.
+"""
+
+import io
+import os
+import hmac
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from cache_snapshot import dump_snapshot, load_snapshot
+
+logger = logging.getLogger("cache_replication")
+
+DELTA_PAGE_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+
+class TokenBucket:
+    """
+    Byte-rate limiter shared by all transfers in one direction.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, CHUNK_SIZE)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        """Block until `amount` bytes may be transferred"""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class CacheReplicator:
+    """
+    Serves this node's cache deltas and periodically pulls deltas from peers.
+    """
+
+    def __init__(self, cache, node_id: str, controller_url: Optional[str] = None, port: int = 7200,
+                 interval: float = 30.0, max_bytes_per_sec: float = 1024 * 1024,
+                 state_path: Optional[str] = None, timeout: float = 10.0, token: Optional[str] = None,
+                 host: str = "0.0.0.0"):
+        """
+        Initialize the replicator.
+
+        Args:
+            cache: SemanticCache (or a wrapper delegating to one) to replicate
+            node_id: This orchestrator's id, as sent in its heartbeat
+            controller_url: Controller base URL used for peer discovery
+            port: Port to serve deltas on
+            interval: Seconds between pull rounds
+            max_bytes_per_sec: Cap for outgoing and for incoming delta traffic (0 = unlimited)
+            state_path: JSON file holding the last seq pulled from each peer
+            timeout: HTTP timeout in seconds
+            token: Fleet token; required from peers and sent to them and to the controller
+            host: Address to serve deltas on
+        """
+        if not token:
+            raise ValueError("Cache replication needs a fleet token")
+        self.cache = cache
+        self.node_id = node_id
+        self.controller_url = controller_url.rstrip("/") if controller_url else None
+        self.port = port
+        self.host = host
+        self.token = token
+        self.interval = interval
+        self.timeout = timeout
+        self.state_path = state_path or os.path.join(getattr(cache, "cache_path", "."), "replication_state.json")
+        self.cursors: Dict[str, int] = self._load_state()
+        self.upload_bucket = TokenBucket(max_bytes_per_sec)
+        self.download_bucket = TokenBucket(max_bytes_per_sec)
+        self.session = requests.Session()
+        self.session.headers["X-Fleet-Token"] = token
+        self.stats = {"entries_pulled": 0, "entries_served": 0, "bytes_in": 0, "bytes_out": 0, "pull_errors": 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[stat] += amount
+
+    def _load_state(self) -> Dict[str, int]:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.cursors, f)
+        os.replace(tmp_path, self.state_path)
+
+    # Serving
+
+    def build_delta(self, since: int, limit: int = DELTA_PAGE_SIZE, peer: Optional[str] = None):
+        """
+        Encode the entries changed after `since` as a snapshot.
+
+        Returns:
+            Tuple of (snapshot bytes, next seq, entry count)
+        """
+        import numpy as np
+
+        items, next_seq = self.cache.entries_since(since, limit, exclude_origin=peer)
+        entries = []
+        vectors = np.zeros((len(items), self.cache.dimension), dtype=np.float32)
+        for row, (hash_key, item) in enumerate(items):
+            vectors[row] = item["embedding"]
+            entries.append({
+                "hash": hash_key,
+                "prompt": item["prompt"],
+                "response": item["response"],
+                "metadata": item.get("metadata", {}),
+                "timestamp": item.get("timestamp"),
+                "origin": item.get("origin") or self.node_id,
+            })
+        buffer = io.BytesIO()
+        dump_snapshot(buffer, self.cache.model_name, self.cache.dimension, entries, vectors)
+        return buffer.getvalue(), next_seq, len(entries)
+
+    def _make_handler(self):
+        replicator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != "/replication/delta":
+                    self.send_error(404)
+                    return
+                token = self.headers.get("X-Fleet-Token") or ""
+                if not hmac.compare_digest(token.encode(), replicator.token.encode()):
+                    self.send_error(401)
+                    return
+                params = parse_qs(url.query)
+                try:
+                    since = int(params.get("since", ["0"])[0])
+                    limit = min(int(params.get("limit", [str(DELTA_PAGE_SIZE)])[0]), DELTA_PAGE_SIZE)
+                except ValueError:
+                    self.send_error(400, "since and limit must be integers")
+                    return
+                body, next_seq, count = replicator.build_delta(since, limit, params.get("peer", [None])[0])
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-Replication-Node", replicator.node_id)
+                self.send_header("X-Replication-Next-Seq", str(next_seq))
+                self.send_header("X-Replication-Last-Seq", str(replicator.cache.last_seq))
+                self.end_headers()
+                for start in range(0, len(body), CHUNK_SIZE):
+                    chunk = body[start:start + CHUNK_SIZE]
+                    replicator.upload_bucket.consume(len(chunk))
+                    self.wfile.write(chunk)
+                replicator._count("entries_served", count)
+                replicator._count("bytes_out", len(body))
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    # Pulling
+
+    def discover_peers(self) -> List[Dict[str, Any]]:
+        """Online peers known to the controller, excluding this node"""
+        if not self.controller_url:
+            return []
+        res = self.session.get(f"{self.controller_url}/api/peers", params={"exclude": self.node_id},
+                               timeout=self.timeout)
+        res.raise_for_status()
+        return res.json()
+
+    def pull_from(self, peer_id: str, url: str) -> int:
+        """
+        Pull every delta a peer has after our cursor for it.
+
+        Returns:
+            Number of entries imported
+        """
+        imported = 0
+        while not self._stop.is_set():
+            since = self.cursors.get(peer_id, 0)
+            with self.session.get(f"{url.rstrip('/')}/replication/delta",
+                                  params={"since": since, "limit": DELTA_PAGE_SIZE, "peer": self.node_id},
+                                  stream=True, timeout=self.timeout) as res:
+                res.raise_for_status()
+                buffer = io.BytesIO()
+                for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
+                    self.download_bucket.consume(len(chunk))
+                    buffer.write(chunk)
+                next_seq = int(res.headers["X-Replication-Next-Seq"])
+                last_seq = int(res.headers["X-Replication-Last-Seq"])
+            self._count("bytes_in", buffer.tell())
+
+            if since > last_seq:
+                # The peer's cache was rebuilt from scratch; start over
+                logger.info(f"Peer {peer_id} restarted its sequence; resyncing")
+                self.cursors[peer_id] = 0
+                continue
+
+            buffer.seek(0)
+            header, entries, vectors = load_snapshot(buffer)
+            if header["model_name"] != self.cache.model_name or header["dimension"] != self.cache.dimension:
+                raise ValueError(f"Peer {peer_id} uses {header['model_name']} ({header['dimension']}d)")
+            if entries:
+                imported += self.cache.import_entries(entries, vectors)["imported"]
+            self.cursors[peer_id] = next_seq
+            if next_seq >= last_seq or next_seq == since:
+                break
+        self._count("entries_pulled", imported)
+        self._save_state()
+        return imported
+
+    def pull_once(self) -> int:
+        """One round of pulls from every discovered peer"""
+        try:
+            peers = self.discover_peers()
+        except Exception as e:
+            logger.warning(f"Peer discovery failed: {e}")
+            return 0
+        imported = 0
+        for peer in peers:
+            if not peer.get("replication_url") or peer.get("id") == self.node_id:
+                continue
+            try:
+                imported += self.pull_from(peer["id"], peer["replication_url"])
+            except Exception as e:
+                self._count("pull_errors")
+                logger.warning(f"Replication from {peer['id']} failed: {e}")
+        if imported:
+            logger.info(f"Replicated {imported} entries from peers")
+        return imported
+
+    def _pull_loop(self):
+        while not self._stop.wait(self.interval):
+            self.pull_once()
+
+    def start(self):
+        """Start serving deltas and pulling from peers in background threads"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="replication-server", daemon=True).start()
+        threading.Thread(target=self._pull_loop, name="replication-puller", daemon=True).start()
+        logger.info(f"Cache replication serving on {self.host}:{self.port}")
+
+    def stop(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["peers"] = dict(self.cursors)
+        stats["last_seq"] = self.cache.last_seq
+        return stats
@@ -0,0 +1,237 @@
+"""
+Dim Reduction - Optional dimensionality reduction for the semantic index
+SemanticCache keeps full embeddings in its entries and indexes reduced vectors, which cuts
+index memory and search time roughly in proportion to the dimension. The entries' full
+embeddings stay in memory, so the saving is the index's share of the cache, not the whole.
+
+    pca:<dim>       PCA fitted on the cache's own embeddings once it has enough entries
+    truncate:<dim>  keep the first <dim> components (Matryoshka-trained models), renormalized
+
+The reduced index only picks the nearest entry; whether it is a hit is decided on the full
+embeddings, so reduction can cost hits (a worse neighbour is picked) but never adds false ones.
+
+Compare hit decisions against the full dimension with:
+    python dim_reduction.py --cache-dir ./cache/semantic_cache --spec pca:192 --spec pca:96 --spec truncate:128
+By default every sampled entry is searched against the others (leave-one-out); pass
+--queries prompts.txt to encode real prompts with the cache's model instead.
+"""
+
+import os
+import json
+import time
+import argparse
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger("dim_reduction")
+
+
+class TruncationReducer:
+    """
+    First `output_dim` components, rescaled to the input's norm.
+    """
+
+    fitted = True
+
+    def __init__(self, input_dim: int, output_dim: int):
+        if not 0 < output_dim <= input_dim:
+            raise ValueError(f"Can't truncate {input_dim} dimensions to {output_dim}")
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+
+    def transform(self, vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.input_dim)
+        reduced = np.ascontiguousarray(vectors[:, :self.output_dim])
+        norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+        scale = np.linalg.norm(vectors, axis=1, keepdims=True) / np.where(norms > 0, norms, 1)
+        return (reduced * scale).astype(np.float32)
+
+    def fit(self, vectors):
+        return self
+
+
+class PCAReducer:
+    """
+    Projection onto the top principal components of the cache's embeddings.
+    """
+
+    def __init__(self, input_dim: int, output_dim: int, path: Optional[str] = None, min_train_rows: int = 0):
+        """
+        Args:
+            input_dim: Embedding dimension
+            output_dim: Reduced dimension
+            path: .npz file the fitted projection is saved to and loaded from
+            min_train_rows: Entries needed before fitting (default: 4 * output_dim, at least 256)
+        """
+        if not 0 < output_dim <= input_dim:
+            raise ValueError(f"Can't reduce {input_dim} dimensions to {output_dim}")
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        self.path = path
+        self.min_train_rows = min_train_rows or max(256, 4 * output_dim)
+        self.mean = None
+        self.components = None
+        self.explained_variance = None
+        if path and os.path.exists(path):
+            self._load(path)
+
+    @property
+    def fitted(self) -> bool:
+        return self.components is not None
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float64).reshape(-1, self.input_dim)
+        if len(vectors) < 2:
+            raise ValueError("PCA needs at least two vectors")
+        self.mean = vectors.mean(axis=0)
+        _, singular_values, vt = np.linalg.svd(vectors - self.mean, full_matrices=False)
+        self.components = vt[:self.output_dim].astype(np.float32)
+        variance = singular_values ** 2
+        self.explained_variance = float(variance[:self.output_dim].sum() / variance.sum()) if variance.sum() else 1.0
+        self.mean = self.mean.astype(np.float32)
+        if self.path:
+            self.save(self.path)
+        logger.info(f"Fitted PCA {self.input_dim}->{self.output_dim} on {len(vectors)} vectors, "
+                    f"{self.explained_variance:.1%} variance kept")
+        return self
+
+    def transform(self, vectors) -> np.ndarray:
+        if not self.fitted:
+            raise RuntimeError("PCA reducer has not been fitted")
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.input_dim)
+        return np.ascontiguousarray((vectors - self.mean) @ self.components.T, dtype=np.float32)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, mean=self.mean, components=self.components,
+                 explained_variance=np.float64(self.explained_variance))
+        os.replace(tmp_path, path)
+
+    def _load(self, path: str):
+        data = np.load(path)
+        if data["components"].shape != (self.output_dim, self.input_dim):
+            logger.warning(f"Ignoring {path}: projection shape {data['components'].shape} doesn't match")
+            return
+        self.mean = data["mean"]
+        self.components = data["components"]
+        self.explained_variance = float(data["explained_variance"])
+
+
+def build_reducer(spec: str, input_dim: int, path: Optional[str] = None):
+    """
+    Create a reducer from a spec such as 'pca:128' or 'truncate:256'.
+
+    Args:
+        spec: '<kind>:<output dim>'
+        input_dim: Embedding dimension
+        path: Where a PCA projection is persisted
+
+    Returns:
+        TruncationReducer or PCAReducer
+    """
+    kind, _, dim = spec.partition(":")
+    if not dim.isdigit():
+        raise ValueError(f"Invalid reduction spec: {spec!r}")
+    if kind == "pca":
+        return PCAReducer(input_dim, int(dim), path)
+    if kind == "truncate":
+        return TruncationReducer(input_dim, int(dim))
+    raise ValueError(f"Unknown reduction kind: {kind!r}")
+
+
+def _nearest(base: np.ndarray, queries: np.ndarray, exclude_self: bool):
+    import faiss
+
+    index = faiss.IndexFlatL2(base.shape[1])
+    index.add(np.ascontiguousarray(base, dtype=np.float32))
+    start = time.perf_counter()
+    D, I = index.search(np.ascontiguousarray(queries, dtype=np.float32), 2 if exclude_self else 1)
+    elapsed = time.perf_counter() - start
+    column = 1 if exclude_self else 0
+    return D[:, column], I[:, column], elapsed
+
+
+def agreement_report(embeddings: np.ndarray, specs: List[str], threshold: float = 0.8,
+                     queries: Optional[np.ndarray] = None, sample: int = 5000) -> Dict[str, Any]:
+    """
+    Compare hit/miss decisions and nearest neighbours of reduced indexes against full dimension.
+
+    Args:
+        embeddings: Cached embeddings (n, dim)
+        specs: Reduction specs to evaluate
+        threshold: Similarity threshold the cache uses (similarity = 1 / (1 + L2^2))
+        queries: Query embeddings; None searches cached embeddings against the rest
+        sample: Maximum number of cached embeddings used as leave-one-out queries
+
+    Returns:
+        Report dict keyed by spec, plus the full-dimension baseline
+    """
+    exclude_self = queries is None
+    if queries is None:
+        rows = np.arange(len(embeddings))
+        if len(rows) > sample:
+            rows = np.sort(np.random.default_rng(0).choice(len(rows), sample, replace=False))
+        queries = embeddings[rows]
+    full_d, full_i, full_time = _nearest(embeddings, queries, exclude_self)
+    full_hits = 1 / (1 + full_d) >= threshold
+    report = {"full": {
+        "dimension": embeddings.shape[1],
+        "hit_rate": round(float(full_hits.mean()), 4),
+        "search_ms_per_query": round(full_time * 1000 / len(queries), 4),
+        "index_bytes": int(embeddings.shape[0] * embeddings.shape[1] * 4),
+    }}
+    for spec in specs:
+        reducer = build_reducer(spec, embeddings.shape[1])
+        if not reducer.fitted:
+            reducer.fit(embeddings)
+        _, reduced_i, reduced_time = _nearest(reducer.transform(embeddings), reducer.transform(queries),
+                                              exclude_self)
+        # As in SemanticCache, the reduced index picks the neighbour and the full vectors decide the hit
+        reduced_d = ((embeddings[reduced_i] - queries) ** 2).sum(axis=1)
+        reduced_hits = 1 / (1 + reduced_d) >= threshold
+        report[spec] = {
+            "dimension": reducer.output_dim,
+            "hit_rate": round(float(reduced_hits.mean()), 4),
+            "hit_agreement": round(float((reduced_hits == full_hits).mean()), 4),
+            "top1_agreement": round(float((reduced_i == full_i).mean()), 4),
+            "hit_top1_agreement": round(float((reduced_i[full_hits] == full_i[full_hits]).mean()), 4)
+            if full_hits.any() else None,
+            "search_ms_per_query": round(reduced_time * 1000 / len(queries), 4),
+            "index_bytes": int(embeddings.shape[0] * reducer.output_dim * 4),
+        }
+        if getattr(reducer, "explained_variance", None) is not None:
+            report[spec]["explained_variance"] = round(reducer.explained_variance, 4)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report hit agreement of reduced-dimension indexes")
+    parser.add_argument('--cache-dir', default='./cache/semantic_cache', help='SemanticCache directory')
+    parser.add_argument('--spec', action='append', required=True, help="e.g. pca:128 or truncate:256; repeatable")
+    parser.add_argument('--threshold', type=float, default=0.8, help='Similarity threshold')
+    parser.add_argument('--sample', type=int, default=5000, help='Maximum leave-one-out queries')
+    parser.add_argument('--queries', help='File with one prompt per line to use as queries')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Model for --queries')
+    args = parser.parse_args()
+
+    with open(os.path.join(args.cache_dir, "cache.json"), "r") as f:
+        cache = json.load(f)
+    embeddings = np.array([item["embedding"] for item in cache.values()], dtype=np.float32)
+    if len(embeddings) < 2:
+        parser.error("The cache needs at least two entries")
+
+    queries = None
+    if args.queries:
+        from sentence_transformers import SentenceTransformer
+
+        with open(args.queries, "r") as f:
+            prompts = [line.strip() for line in f if line.strip()]
+        queries = np.asarray(SentenceTransformer(args.model).encode(prompts), dtype=np.float32)
+
+    print(json.dumps(agreement_report(embeddings, args.spec, args.threshold, queries, args.sample), indent=2))
+
+
+if __name__ == '__main__':
+    main()
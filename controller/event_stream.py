@@ -0,0 +1,105 @@
+"""
+Event Stream - Server-Sent Events fan-out for the controller
+Publishers push events to every subscriber's bounded queue without blocking. A subscriber
+that falls too far behind is flagged instead of stalling the publisher; its stream then
+sends a fresh snapshot and carries on from there.
+"""
+
+import json
+import queue
+import threading
+import logging
+from typing import Any, Callable, Iterator, Optional
+
+logger = logging.getLogger("event_stream")
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Encode one event in the text/event-stream format"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, separators=(",", ":"))
+    lines.extend(f"data: {line}" for line in payload.splitlines())
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+    def __init__(self, max_queue: int):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.overflowed = True
+
+
+class EventBroadcaster:
+    """
+    Delivers published events to all current subscribers.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        """
+        Args:
+            max_queue: Events buffered per subscriber before it has to resync from a snapshot
+        """
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: str, data: Any):
+        with self._lock:
+            self._next_id += 1
+            item = (self._next_id, event, data)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(item)
+
+    def stream(self, snapshot: Callable[[], Any], summary: Callable[[], Any],
+               summary_interval: float = 15.0) -> Iterator[str]:
+        """
+        SSE generator for one client: a snapshot, then published events as they happen.
+
+        Args:
+            snapshot: Returns the full state, sent first and after the client overflows
+            summary: Returns a small status payload, sent whenever the stream is idle
+            summary_interval: Idle seconds between summaries (also keeps proxies from timing out)
+        """
+        # Subscribe before taking the snapshot so nothing published in between is lost
+        subscription = self.subscribe()
+        try:
+            yield format_sse(snapshot(), "snapshot")
+            while True:
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    yield format_sse(snapshot(), "snapshot")
+                try:
+                    event_id, event, data = subscription.queue.get(timeout=summary_interval)
+                except queue.Empty:
+                    yield format_sse(summary(), "summary")
+                    continue
+                yield format_sse(data, event, event_id)
+        finally:
+            self.unsubscribe(subscription)
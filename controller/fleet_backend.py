@@ -0,0 +1,381 @@
+"""
+Fleet Backend - Shared fleet state for multi-worker controllers
+FleetRegistry keeps the fleet in process memory, which is fastest but only works with a
+single process. With several WSGI workers every worker has to see the same fleet, so
+SQLiteFleetRegistry keeps it in one SQLite (WAL) database behind the same interface:
+
+    heartbeat      one short write transaction (upsert, plus counters when something changed)
+    expire         one indexed UPDATE over (status, last_seen), run by the leader worker only
+    listeners      status changes are appended to an events table that every worker tails,
+                   so each worker's dashboard streams see changes made by any worker
+
+Online/offline totals and the list version live in a meta table and are kept incrementally.
+LeaderLock picks the one worker that runs the heartbeat monitor and other singleton tasks.
+"""
+
+import os
+import json
+import time
+import base64
+import fcntl
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Any, List, Optional
+
+from fleet_registry import FleetRegistry, OrchestratorRecord, ONLINE, OFFLINE, SORT_FIELDS, decode_cursor
+
+logger = logging.getLogger("fleet_backend")
+
+_COLUMNS = "id, name, ip, first_seen, last_seen, replication_url, status"
+
+# SQL for each sort field, matching FleetRegistry's sort keys
+_SORT_EXPRESSIONS = {
+    "name": "lower(coalesce(nullif(name, ''), id))",
+    "ip": "ip",
+    "status": "status",
+    "last_seen": "strftime('%Y-%m-%d', last_seen, 'unixepoch')",
+}
+
+EVENT_RETENTION = 3600  # seconds status-change events are kept for tailing workers
+
+
+class SQLiteFleetRegistry:
+    """
+    FleetRegistry interface over a SQLite database shared by worker processes.
+    """
+
+    def __init__(self, db_path: str, timeout: float = 70.0, tick: float = 1.0, poll_interval: float = 0.5):
+        """
+        Open (or create) the shared fleet database.
+
+        Args:
+            db_path: Path of the SQLite database file, the same for all workers
+            timeout: Seconds without a heartbeat before an orchestrator goes offline
+            tick: Seconds between expiry passes of the leader's monitor
+            poll_interval: Seconds between reads of the events table for listeners
+        """
+        self.db_path = db_path
+        self.timeout = timeout
+        self.tick = tick
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._listeners: List[Callable[[OrchestratorRecord, str, str], None]] = []
+        self._tail_thread = None
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._transaction(self._create_schema)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; transactions are managed explicitly
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn, *args):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so read-then-write can't race another worker
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _create_schema(conn):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS orchestrators ("
+            "id TEXT PRIMARY KEY, name TEXT, ip TEXT, first_seen REAL NOT NULL, "
+            "last_seen REAL NOT NULL, replication_url TEXT)"
+        )
+        # Databases written by HeartbeatStore have no status column yet
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(orchestrators)")}
+        if "status" not in columns:
+            conn.execute(f"ALTER TABLE orchestrators ADD COLUMN status TEXT NOT NULL DEFAULT '{ONLINE}'")
+        conn.execute("CREATE INDEX IF NOT EXISTS orchestrators_status_seen ON orchestrators (status, last_seen)")
+        conn.execute("CREATE TABLE IF NOT EXISTS fleet_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS fleet_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, orch_id TEXT NOT NULL, "
+            "old_status TEXT, new_status TEXT NOT NULL)"
+        )
+        if conn.execute("SELECT 1 FROM fleet_meta WHERE key = 'total'").fetchone() is None:
+            total, online = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(status = ?), 0) FROM orchestrators", (ONLINE,)
+            ).fetchone()
+            conn.executemany("INSERT OR REPLACE INTO fleet_meta (key, value) VALUES (?, ?)",
+                             [("total", total), ("online", online), ("version", 1)])
+
+    @staticmethod
+    def _bump(conn, **deltas):
+        for key, delta in deltas.items():
+            if delta:
+                conn.execute("UPDATE fleet_meta SET value = value + ? WHERE key = ?", (delta, key))
+
+    @staticmethod
+    def _record(row) -> OrchestratorRecord:
+        record = OrchestratorRecord(row[0], row[1], row[2], row[3])
+        record.last_seen = row[4]
+        record.replication_url = row[5]
+        record.status = row[6]
+        return record
+
+    # Writes
+
+    def heartbeat(self, orch_id: Optional[str], name: str, ip: str, replication_url: Optional[str] = None,
+                  now: Optional[float] = None) -> OrchestratorRecord:
+        """Record a heartbeat; same contract as FleetRegistry.heartbeat"""
+        now = time.time() if now is None else now
+        key = orch_id or ip
+
+        def write(conn):
+            row = conn.execute(f"SELECT {_COLUMNS} FROM orchestrators WHERE id = ?", (key,)).fetchone()
+            if row is None:
+                conn.execute(f"INSERT INTO orchestrators ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, name, ip, now, now, replication_url, ONLINE))
+                self._bump(conn, total=1, online=1, version=1)
+                conn.execute("INSERT INTO fleet_events (created, orch_id, old_status, new_status) "
+                             "VALUES (?, ?, NULL, ?)", (now, key, ONLINE))
+                return (key, name, ip, now, now, replication_url, ONLINE)
+
+            last_seen = max(row[4], now)
+            came_back = row[6] == OFFLINE
+            changed = came_back or row[1] != name or row[2] != ip or row[4] // 86400 != last_seen // 86400
+            conn.execute("UPDATE orchestrators SET name = ?, ip = ?, last_seen = ?, replication_url = ?, "
+                         "status = ? WHERE id = ?", (name, ip, last_seen, replication_url, ONLINE, key))
+            self._bump(conn, online=1 if came_back else 0, version=1 if changed else 0)
+            if came_back:
+                conn.execute("INSERT INTO fleet_events (created, orch_id, old_status, new_status) "
+                             "VALUES (?, ?, ?, ?)", (now, key, OFFLINE, ONLINE))
+            return (key, name, ip, row[3], last_seen, replication_url, ONLINE)
+
+        return self._record(self._transaction(write))
+
+    def restore(self, rows: List[Dict[str, Any]], now: Optional[float] = None) -> int:
+        # The database is the state; there is nothing to restore
+        return 0
+
+    def expire(self, now: Optional[float] = None) -> List[OrchestratorRecord]:
+        """Mark orchestrators offline whose last heartbeat is older than the timeout (leader only)"""
+        now = time.time() if now is None else now
+        cutoff = now - self.timeout
+
+        def write(conn):
+            rows = conn.execute(f"SELECT {_COLUMNS} FROM orchestrators WHERE status = ? AND last_seen < ?",
+                                (ONLINE, cutoff)).fetchall()
+            if rows:
+                conn.execute("UPDATE orchestrators SET status = ? WHERE status = ? AND last_seen < ?",
+                             (OFFLINE, ONLINE, cutoff))
+                conn.executemany("INSERT INTO fleet_events (created, orch_id, old_status, new_status) "
+                                 "VALUES (?, ?, ?, ?)", [(now, row[0], ONLINE, OFFLINE) for row in rows])
+                self._bump(conn, online=-len(rows), version=1)
+            conn.execute("DELETE FROM fleet_events WHERE created < ?", (now - EVENT_RETENTION,))
+            return rows
+
+        records = []
+        for row in self._transaction(write):
+            record = self._record(row)
+            record.status = OFFLINE
+            records.append(record)
+        return records
+
+    def remove(self, orch_id: str) -> bool:
+        def write(conn):
+            row = conn.execute("SELECT status FROM orchestrators WHERE id = ?", (orch_id,)).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM orchestrators WHERE id = ?", (orch_id,))
+            self._bump(conn, total=-1, online=-1 if row[0] == ONLINE else 0, version=1)
+            return True
+
+        return self._transaction(write)
+
+    def prune(self, older_than: float, now: Optional[float] = None) -> List[str]:
+        """Drop offline orchestrators not seen for `older_than` seconds (leader only); returns their ids"""
+        cutoff = (time.time() if now is None else now) - older_than
+
+        def write(conn):
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM orchestrators WHERE status = ? AND last_seen < ?", (OFFLINE, cutoff)
+            )]
+            if stale:
+                conn.execute("DELETE FROM orchestrators WHERE status = ? AND last_seen < ?", (OFFLINE, cutoff))
+                self._bump(conn, total=-len(stale), version=1)
+            return stale
+
+        return self._transaction(write)
+
+    def run_expiry(self, stop: Optional[threading.Event] = None):
+        """Expire overdue orchestrators every tick until `stop` is set"""
+        stop = stop or threading.Event()
+        while not stop.wait(self.tick):
+            try:
+                self.expire()
+            except sqlite3.Error as e:
+                logger.error(f"Heartbeat expiry failed: {e}")
+
+    # Reads
+
+    @property
+    def version(self) -> int:
+        return self._conn().execute("SELECT value FROM fleet_meta WHERE key = 'version'").fetchone()[0]
+
+    def get(self, orch_id: str) -> Optional[OrchestratorRecord]:
+        row = self._conn().execute(f"SELECT {_COLUMNS} FROM orchestrators WHERE id = ?", (orch_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def records(self) -> List[OrchestratorRecord]:
+        return [self._record(row) for row in self._conn().execute(f"SELECT {_COLUMNS} FROM orchestrators")]
+
+    def counts(self) -> Dict[str, int]:
+        meta = dict(self._conn().execute("SELECT key, value FROM fleet_meta").fetchall())
+        return {"total": meta["total"], "online": meta["online"], "offline": meta["total"] - meta["online"],
+                "version": meta["version"]}
+
+    def peers(self, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT id, name, replication_url FROM orchestrators "
+            "WHERE status = ? AND replication_url IS NOT NULL AND id != ?", (ONLINE, exclude or "")
+        ).fetchall()
+        return [{"id": row[0], "name": row[1], "replication_url": row[2]} for row in rows]
+
+    def query(self, status: Optional[str] = None, name: Optional[str] = None, seen_after: Optional[str] = None,
+              seen_before: Optional[str] = None, sort: str = "name", descending: bool = False,
+              cursor: Optional[str] = None, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """One page of orchestrators; same contract and cursors as FleetRegistry.query"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort!r}")
+        expression = _SORT_EXPRESSIONS[sort]
+        date = _SORT_EXPRESSIONS["last_seen"]
+        conditions, params = [], []
+        if status:
+            conditions.append("lower(status) = lower(?)")
+            params.append(status)
+        if name:
+            conditions.append("(instr(lower(coalesce(name, '')), ?) > 0 OR instr(lower(id), ?) > 0)")
+            params += [name.lower(), name.lower()]
+        if seen_after:
+            conditions.append(f"{date} >= ?")
+            params.append(seen_after)
+        if seen_before:
+            conditions.append(f"{date} <= ?")
+            params.append(seen_before)
+
+        conn = self._conn()
+        # One read transaction, so the page, the total and the version agree
+        conn.execute("BEGIN")
+        try:
+            version = conn.execute("SELECT value FROM fleet_meta WHERE key = 'version'").fetchone()[0]
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            total = conn.execute(f"SELECT COUNT(*) FROM orchestrators {where}", params).fetchone()[0]
+
+            page_conditions, page_params = list(conditions), list(params)
+            if cursor is not None:
+                after = list(decode_cursor(cursor))
+                page_conditions.append(f"({expression}, id) {'<' if descending else '>'} (?, ?)")
+                page_params += after
+                offset = 0
+            page_where = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            direction = "DESC" if descending else "ASC"
+            rows = conn.execute(
+                f"SELECT {_COLUMNS}, {expression} FROM orchestrators {page_where} "
+                f"ORDER BY {expression} {direction}, id {direction} LIMIT ? OFFSET ?",
+                (*page_params, limit + 1, offset)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = base64.urlsafe_b64encode(json.dumps([last[7], last[0]]).encode()).decode()
+        return {"records": [self._record(row) for row in rows], "next_cursor": next_cursor,
+                "total": total, "version": version}
+
+    # Listeners
+
+    def add_listener(self, listener: Callable[[OrchestratorRecord, str, str], None]):
+        """Call listener(record, old_status, new_status) for status changes made by any worker"""
+        self._listeners.append(listener)
+        if self._tail_thread is None:
+            self._tail_thread = threading.Thread(target=self._tail_events, name="fleet-events", daemon=True)
+            self._tail_thread.start()
+
+    def _tail_events(self):
+        conn = self._conn()
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM fleet_events").fetchone()[0]
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                events = conn.execute(
+                    f"SELECT e.id, e.old_status, e.new_status, {', '.join('o.' + c for c in _COLUMNS.split(', '))} "
+                    "FROM fleet_events e JOIN orchestrators o ON o.id = e.orch_id "
+                    "WHERE e.id > ? ORDER BY e.id LIMIT 1000", (last_id,)
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Reading fleet events failed: {e}")
+                continue
+            for event in events:
+                last_id = event[0]
+                record = self._record(event[3:])
+                # Report the status as of the event, not whatever it is by now
+                record.status = event[2]
+                for listener in self._listeners:
+                    try:
+                        listener(record, event[1], event[2])
+                    except Exception as e:
+                        logger.error(f"Fleet listener failed: {e}")
+
+
+def create_fleet_registry(backend: str, db_path: str, timeout: float = 70.0):
+    """
+    FleetRegistry for the configured backend.
+
+    Args:
+        backend: 'memory' (single process) or 'sqlite' (shared by all workers)
+        db_path: Database of the sqlite backend
+        timeout: Heartbeat timeout in seconds
+    """
+    if backend == "memory":
+        return FleetRegistry(timeout=timeout)
+    if backend == "sqlite":
+        return SQLiteFleetRegistry(db_path, timeout=timeout)
+    raise ValueError(f"Unknown fleet backend: {backend!r}")
+
+
+class LeaderLock:
+    """
+    Exclusive lock on a file: exactly one process holds it, and the OS releases it when that process dies.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
@@ -0,0 +1,92 @@
+"""
+Fleet Cache Routes - Central semantic cache shared by every orchestrator
+Registered by app.py when FLEET_CACHE_ENABLED=1 and a token is configured (FLEET_CACHE_TOKEN,
+or the fleet-wide FLEET_TOKEN): every request must carry it in X-Fleet-Token, since anyone
+who can store entries decides what the whole fleet gets served. Lookups and stores are
+batched: each request carries a list of prompts or entries.
+
+Under gunicorn every worker is its own process, so entries live in a SharedSemanticCache
+store under FLEET_CACHE_DIR that all workers map: an entry stored through one worker is
+found by lookups in every other, and no worker's saves overwrite another's. Each worker
+still loads the embedding model; set FLEET_CACHE_DAEMON to the address of a cache daemon
+(cache_daemon.py) to have all workers share that process's model and cache instead.
+Hit/miss stats are counted per worker.
+"""
+
+import os
+import hmac
+import threading
+from flask import Blueprint, request, jsonify
+
+fleet_cache_bp = Blueprint('fleet_cache_bp', __name__)
+
+FLEET_CACHE_DIR = os.environ.get("FLEET_CACHE_DIR", "./fleet_cache")
+FLEET_CACHE_MODEL = os.environ.get("FLEET_CACHE_MODEL", "all-MiniLM-L6-v2")
+FLEET_CACHE_TOKEN = os.environ.get("FLEET_CACHE_TOKEN") or os.environ.get("FLEET_TOKEN")
+FLEET_CACHE_DAEMON = os.environ.get("FLEET_CACHE_DAEMON")  # 'host:port' or 'unix:/path'
+MAX_BATCH = 256
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_fleet_cache():
+    """Attach this worker to the fleet cache on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                if FLEET_CACHE_DAEMON:
+                    from cache_daemon import CacheDaemonClient
+                    _cache = CacheDaemonClient(FLEET_CACHE_DAEMON)
+                else:
+                    from shared_cache import SharedSemanticCache
+                    _cache = SharedSemanticCache(model_name=FLEET_CACHE_MODEL, cache_path=FLEET_CACHE_DIR)
+    return _cache
+
+def _authorized():
+    token = request.headers.get("X-Fleet-Token")
+    return bool(FLEET_CACHE_TOKEN and token) and hmac.compare_digest(token.encode(), FLEET_CACHE_TOKEN.encode())
+
+def _body():
+    body = request.get_json(silent=True)
+    return body if isinstance(body, dict) else {}
+
+def _strings(values):
+    return isinstance(values, list) and all(isinstance(value, str) for value in values)
+
+def _serializable(result):
+    if result is None:
+        return None
+    return {**result, "similarity": float(result["similarity"]) if result.get("similarity") is not None else None}
+
+@fleet_cache_bp.route("/api/fleet_cache/lookup", methods=["POST"])
+def fleet_lookup():
+    if not _authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    prompts = _body().get("prompts", [])
+    if not _strings(prompts):
+        return jsonify({"error": "prompts must be a list of strings"}), 400
+    if len(prompts) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} prompts per request"}), 400
+    results = get_fleet_cache().lookup_many(prompts)
+    return jsonify({"results": [_serializable(result) for result in results]})
+
+@fleet_cache_bp.route("/api/fleet_cache/store", methods=["POST"])
+def fleet_store():
+    if not _authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    entries = _body().get("entries", [])
+    if not isinstance(entries, list) or not all(
+            isinstance(entry, dict) and isinstance(entry.get("prompt"), str) and isinstance(entry.get("response"), str)
+            for entry in entries):
+        return jsonify({"error": "entries must be a list of {prompt, response} strings"}), 400
+    if len(entries) > MAX_BATCH:
+        return jsonify({"error": f"At most {MAX_BATCH} entries per request"}), 400
+    get_fleet_cache().add_many([(entry["prompt"], entry["response"]) for entry in entries])
+    return jsonify({"stored": len(entries)})
+
+@fleet_cache_bp.route("/api/fleet_cache/stats", methods=["GET"])
+def fleet_stats():
+    if not _authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify({"status": "ok", "stats": get_fleet_cache().get_stats()})
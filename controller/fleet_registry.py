@@ -0,0 +1,374 @@
+"""
+Fleet Registry - Orchestrator heartbeat state for the controller
+Orchestrators are keyed by the id they send (falling back to their IP), so several behind
+one NAT address no longer overwrite each other. Offline detection uses a timing wheel:
+each heartbeat moves the orchestrator into the slot for its deadline, and advancing the
+wheel only touches the slots that have come due. Heartbeats and expiry are O(1) per
+orchestrator; online/offline counts are maintained incrementally.
+
+A version counter goes up whenever something the dashboard shows changes (membership,
+status, name, IP or the date last seen), so list views can be cached and served as 304s.
+"""
+
+import math
+import time
+import json
+import base64
+import bisect
+import datetime
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger("fleet_registry")
+
+ONLINE = "Online"
+OFFLINE = "Offline"
+
+SORT_FIELDS = ("name", "ip", "status", "last_seen")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Sort key of the last row of the previous page, as encoded in next_cursor.
+
+    Raises:
+        ValueError: If the cursor isn't a base64 JSON [sort value, id] pair of strings
+    """
+    after = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(after, list) or len(after) != 2 or not all(isinstance(part, str) for part in after):
+        raise ValueError("Malformed cursor")
+    return after[0], after[1]
+
+
+class OrchestratorRecord:
+    __slots__ = ("id", "name", "ip", "first_seen", "last_seen", "status", "replication_url", "deadline_tick")
+
+    def __init__(self, orch_id: str, name: str, ip: str, now: float):
+        self.id = orch_id
+        self.name = name
+        self.ip = ip
+        self.first_seen = now
+        self.last_seen = now
+        self.status = ONLINE
+        self.replication_url = None
+        self.deadline_tick = None
+
+    @property
+    def last_seen_at(self) -> datetime.datetime:
+        return datetime.datetime.utcfromtimestamp(self.last_seen)
+
+    @property
+    def last_seen_date(self) -> str:
+        return self.last_seen_at.strftime('%Y-%m-%d')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "ip": self.ip,
+            "last_seen": self.last_seen_at.isoformat(),
+            "status": self.status,
+            "replication_url": self.replication_url,
+        }
+
+
+class FleetRegistry:
+    """
+    Thread-safe registry of orchestrators with timing-wheel timeout detection.
+    """
+
+    def __init__(self, timeout: float = 70.0, tick: float = 1.0):
+        """
+        Initialize the registry.
+
+        Args:
+            timeout: Seconds without a heartbeat before an orchestrator goes offline
+            tick: Wheel resolution in seconds; transitions fire up to one tick late
+        """
+        self.timeout = timeout
+        self.tick = tick
+        # One slot more than a timeout spans, so a deadline never lands behind the cursor
+        self._wheel_size = int(math.ceil(timeout / tick)) + 2
+        self._wheel: List[set] = [set() for _ in range(self._wheel_size)]
+        self._cursor = self._tick_of(time.time())
+        self._records: Dict[str, OrchestratorRecord] = {}
+        self._online = 0
+        self.version = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[OrchestratorRecord, str, str], None]] = []
+        self._views = OrderedDict()  # (version, filters, sort) -> (keys, records), a few recent list views
+
+    def _tick_of(self, timestamp: float) -> int:
+        return int(timestamp // self.tick)
+
+    def add_listener(self, listener: Callable[[OrchestratorRecord, str, str], None]):
+        """Call listener(record, old_status, new_status) on every status change (old_status is None for new ones)"""
+        self._listeners.append(listener)
+
+    def _notify(self, changes):
+        for record, old_status, new_status in changes:
+            for listener in self._listeners:
+                try:
+                    listener(record, old_status, new_status)
+                except Exception as e:
+                    logger.error(f"Fleet listener failed: {e}")
+
+    def heartbeat(self, orch_id: Optional[str], name: str, ip: str, replication_url: Optional[str] = None,
+                  now: Optional[float] = None) -> OrchestratorRecord:
+        """
+        Record a heartbeat.
+
+        Args:
+            orch_id: Orchestrator id; the IP is used when missing
+            name: Display name
+            ip: Remote address
+            replication_url: Cache replication endpoint, if the orchestrator serves one
+            now: Heartbeat time (epoch seconds), defaults to the current time
+
+        Returns:
+            The updated record
+        """
+        now = time.time() if now is None else now
+        key = orch_id or ip
+        changes = []
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                record = OrchestratorRecord(key, name, ip, now)
+                self._records[key] = record
+                self._online += 1
+                changes.append((record, None, ONLINE))
+            else:
+                if record.status == OFFLINE:
+                    record.status = ONLINE
+                    self._online += 1
+                    changes.append((record, OFFLINE, ONLINE))
+                last_day = record.last_seen // 86400
+                if record.name != name or record.ip != ip or max(record.last_seen, now) // 86400 != last_day:
+                    self.version += 1
+                record.name = name
+                record.ip = ip
+                record.last_seen = max(record.last_seen, now)
+            record.replication_url = replication_url
+            if changes:
+                self.version += 1
+
+            # Move the record to the slot of its new deadline
+            if record.deadline_tick is not None:
+                self._wheel[record.deadline_tick % self._wheel_size].discard(key)
+            record.deadline_tick = max(self._tick_of(record.last_seen + self.timeout), self._cursor + 1)
+            self._wheel[record.deadline_tick % self._wheel_size].add(key)
+        self._notify(changes)
+        return record
+
+    def restore(self, rows: List[Dict[str, Any]], now: Optional[float] = None) -> int:
+        """
+        Load persisted orchestrators, e.g. after a restart. Existing records are kept.
+
+        Args:
+            rows: Dicts with id, name, ip, first_seen, last_seen and replication_url
+            now: Current time (epoch seconds), used to decide who is still online
+
+        Returns:
+            Number of records restored
+        """
+        now = time.time() if now is None else now
+        restored = 0
+        with self._lock:
+            for row in rows:
+                key = row["id"]
+                if key in self._records:
+                    continue
+                record = OrchestratorRecord(key, row["name"], row["ip"], row["first_seen"])
+                record.last_seen = row["last_seen"]
+                record.replication_url = row.get("replication_url")
+                if record.last_seen + self.timeout >= now:
+                    record.deadline_tick = max(self._tick_of(record.last_seen + self.timeout), self._cursor + 1)
+                    self._wheel[record.deadline_tick % self._wheel_size].add(key)
+                    self._online += 1
+                else:
+                    record.status = OFFLINE
+                self._records[key] = record
+                restored += 1
+            if restored:
+                self.version += 1
+        return restored
+
+    def expire(self, now: Optional[float] = None) -> List[OrchestratorRecord]:
+        """
+        Advance the wheel to `now` and mark overdue orchestrators offline.
+
+        Returns:
+            Records that went offline
+        """
+        current = self._tick_of(time.time() if now is None else now)
+        changes = []
+        with self._lock:
+            # After a long pause every slot has been due at least once; one pass is enough
+            start = max(self._cursor + 1, current - self._wheel_size + 1)
+            for tick in range(start, current + 1):
+                slot = self._wheel[tick % self._wheel_size]
+                if not slot:
+                    continue
+                due = [key for key in slot if self._records[key].deadline_tick <= current]
+                for key in due:
+                    slot.discard(key)
+                    record = self._records[key]
+                    record.deadline_tick = None
+                    record.status = OFFLINE
+                    self._online -= 1
+                    changes.append((record, ONLINE, OFFLINE))
+            self._cursor = max(self._cursor, current)
+            if changes:
+                self.version += 1
+        self._notify(changes)
+        return [record for record, _, _ in changes]
+
+    def remove(self, orch_id: str) -> bool:
+        with self._lock:
+            record = self._records.pop(orch_id, None)
+            if record is None:
+                return False
+            if record.deadline_tick is not None:
+                self._wheel[record.deadline_tick % self._wheel_size].discard(orch_id)
+            if record.status == ONLINE:
+                self._online -= 1
+            self.version += 1
+        return True
+
+    def prune(self, older_than: float, now: Optional[float] = None) -> List[str]:
+        """
+        Drop offline orchestrators that have not sent a heartbeat for `older_than` seconds.
+
+        Returns:
+            Ids of the removed records
+        """
+        cutoff = (time.time() if now is None else now) - older_than
+        with self._lock:
+            stale = [key for key, record in self._records.items()
+                     if record.status == OFFLINE and record.last_seen < cutoff]
+            for key in stale:
+                # Offline records are not on the wheel
+                del self._records[key]
+            if stale:
+                self.version += 1
+        return stale
+
+    def get(self, orch_id: str) -> Optional[OrchestratorRecord]:
+        return self._records.get(orch_id)
+
+    def records(self) -> List[OrchestratorRecord]:
+        with self._lock:
+            return list(self._records.values())
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            total = len(self._records)
+            return {"total": total, "online": self._online, "offline": total - self._online,
+                    "version": self.version}
+
+    @staticmethod
+    def _sort_key(record: OrchestratorRecord, sort: str) -> Tuple[str, str]:
+        if sort == "name":
+            return (record.name or record.id).lower(), record.id
+        if sort == "last_seen":
+            return record.last_seen_date, record.id
+        return getattr(record, sort), record.id
+
+    def _view(self, status: Optional[str], name: Optional[str], seen_after: Optional[str],
+              seen_before: Optional[str], sort: str):
+        # Filtered records sorted ascending, cached per version so paging through one view is cheap
+        with self._lock:
+            view_key = (self.version, status, name, seen_after, seen_before, sort)
+            view = self._views.get(view_key)
+            if view is not None:
+                self._views.move_to_end(view_key)
+                return view
+            records = list(self._records.values())
+
+        if status:
+            records = [r for r in records if r.status.lower() == status.lower()]
+        if name:
+            needle = name.lower()
+            records = [r for r in records if needle in (r.name or "").lower() or needle in r.id.lower()]
+        if seen_after or seen_before:
+            records = [r for r in records
+                       if (not seen_after or r.last_seen_date >= seen_after)
+                       and (not seen_before or r.last_seen_date <= seen_before)]
+        decorated = sorted(((self._sort_key(r, sort), r) for r in records), key=lambda item: item[0])
+        view = ([key for key, _ in decorated], [r for _, r in decorated])
+
+        with self._lock:
+            self._views[view_key] = view
+            while len(self._views) > 8:
+                self._views.popitem(last=False)
+        return view
+
+    def query(self, status: Optional[str] = None, name: Optional[str] = None, seen_after: Optional[str] = None,
+              seen_before: Optional[str] = None, sort: str = "name", descending: bool = False,
+              cursor: Optional[str] = None, offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """
+        One page of orchestrators.
+
+        Args:
+            status: Only 'Online' or 'Offline' records
+            name: Case-insensitive substring of the name or id
+            seen_after: Inclusive YYYY-MM-DD lower bound on the date last seen
+            seen_before: Inclusive YYYY-MM-DD upper bound on the date last seen
+            sort: One of SORT_FIELDS; ties are broken by id
+            descending: Reverse the sort order
+            cursor: next_cursor of the previous page; stays valid when rows are added or removed
+            offset: Position of the first row when no cursor is given, for jumping to a page
+            limit: Page size
+
+        Returns:
+            Dict with the page's records, next_cursor (None at the end), total matches and version
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {sort!r}")
+        version = self.version
+        keys, records = self._view(status, name, seen_after, seen_before, sort)
+        total = len(records)
+
+        if cursor is not None:
+            after = decode_cursor(cursor)
+            if descending:
+                end = bisect.bisect_left(keys, after)
+            else:
+                start = bisect.bisect_right(keys, after)
+        elif descending:
+            end = total - offset
+        else:
+            start = offset
+
+        if descending:
+            end = max(end, 0)
+            start = max(end - limit, 0)
+            page = records[start:end][::-1]
+            has_more = start > 0
+        else:
+            end = min(start + limit, total)
+            page = records[start:end]
+            has_more = end < total
+
+        next_cursor = None
+        if page and has_more:
+            last_key = self._sort_key(page[-1], sort)
+            next_cursor = base64.urlsafe_b64encode(json.dumps(list(last_key)).encode()).decode()
+        return {"records": page, "next_cursor": next_cursor, "total": total, "version": version}
+
+    def peers(self, exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Online orchestrators that serve cache replication"""
+        return [
+            {"id": record.id, "name": record.name, "replication_url": record.replication_url}
+            for record in self.records()
+            if record.status == ONLINE and record.replication_url and record.id != exclude
+        ]
+
+    def run_expiry(self, stop: Optional[threading.Event] = None):
+        """Advance the wheel every tick until `stop` is set"""
+        stop = stop or threading.Event()
+        while not stop.wait(self.tick):
+            self.expire()
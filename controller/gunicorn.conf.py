@@ -0,0 +1,30 @@
+"""
+Gunicorn settings for the controller
+Run with: gunicorn -c gunicorn.conf.py app:app
+
+Several worker processes share the fleet through the sqlite backend; one of them (the holder
+of the leader lock) runs the heartbeat monitor. Threaded workers keep dashboard event streams
+from tying up a whole process each.
+"""
+
+import os
+import multiprocessing
+
+# Set before the workers import app; the in-memory backend is per process
+os.environ.setdefault("FLEET_BACKEND", "sqlite")
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", str(min(2 * multiprocessing.cpu_count() + 1, 8))))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "16"))
+timeout = 120  # seconds a worker may go unresponsive before it is restarted
+graceful_timeout = 30
+keepalive = 5
+accesslog = None
+# Each worker imports the app itself, so its background threads start in the worker
+preload_app = False
+
+
+def post_worker_init(worker):
+    import app
+    app.start_background_tasks()
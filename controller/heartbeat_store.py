@@ -0,0 +1,125 @@
+"""
+Heartbeat Store - Durable fleet state for the controller
+The latest heartbeat of every orchestrator is kept in SQLite (WAL) so a controller restart
+doesn't forget the fleet. Heartbeats only overwrite a pending row in memory; a background
+thread upserts the pending rows in one transaction per flush, so many heartbeats from the
+same orchestrator between flushes cost a single write.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, List
+
+logger = logging.getLogger("heartbeat_store")
+
+_COLUMNS = "id, name, ip, first_seen, last_seen, replication_url"
+
+
+class HeartbeatStore:
+    """
+    SQLite-backed table of orchestrators with a coalescing background writer.
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = 1.0):
+        """
+        Initialize the store, creating the database if needed.
+
+        Args:
+            db_path: Path of the SQLite database file
+            flush_interval: Seconds between batched writes; at most this much is lost on a crash
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.stats = {"written": 0, "batches": 0, "errors": 0}
+        self._pending: Dict[str, tuple] = {}
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS orchestrators ("
+            "id TEXT PRIMARY KEY, name TEXT, ip TEXT, first_seen REAL NOT NULL, "
+            "last_seen REAL NOT NULL, replication_url TEXT)"
+        )
+        self._conn.commit()
+
+        self._thread = threading.Thread(target=self._run, name="heartbeat-store", daemon=True)
+        self._thread.start()
+
+    def save(self, record):
+        """Queue the record's current state; constant time, never touches the database"""
+        row = (record.id, record.name, record.ip, record.first_seen, record.last_seen, record.replication_url)
+        with self._pending_lock:
+            self._pending[record.id] = row
+
+    def load(self) -> List[Dict[str, Any]]:
+        """All persisted orchestrators"""
+        with self._db_lock:
+            rows = self._conn.execute(f"SELECT {_COLUMNS} FROM orchestrators").fetchall()
+        return [
+            {"id": row[0], "name": row[1], "ip": row[2], "first_seen": row[3], "last_seen": row[4],
+             "replication_url": row[5]}
+            for row in rows
+        ]
+
+    def delete(self, orch_id: str):
+        with self._pending_lock:
+            self._pending.pop(orch_id, None)
+        with self._db_lock:
+            self._conn.execute("DELETE FROM orchestrators WHERE id = ?", (orch_id,))
+            self._conn.commit()
+
+    def flush(self) -> int:
+        """
+        Write all pending rows in one transaction.
+
+        Returns:
+            Number of rows written
+        """
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+            rows, self._pending = list(self._pending.values()), {}
+        try:
+            with self._db_lock:
+                self._conn.executemany(
+                    f"INSERT INTO orchestrators ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET name = excluded.name, ip = excluded.ip, "
+                    "last_seen = MAX(last_seen, excluded.last_seen), replication_url = excluded.replication_url",
+                    rows
+                )
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to persist {len(rows)} heartbeats: {e}")
+            # Put the rows back unless a newer heartbeat arrived meanwhile
+            with self._pending_lock:
+                for row in rows:
+                    self._pending.setdefault(row[0], row)
+            return 0
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+        return len(rows)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {**self.stats, "pending": pending}
+
+    def close(self):
+        """Stop the writer and flush what is still pending"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
@@ -0,0 +1,255 @@
+"""
+History Logger - Background writer for the cache history logs
+Keeps the log files open, batches records and rotates files off the request path.
+"""
+
+import os
+import json
+import gzip
+import time
+import queue
+import shutil
+import atexit
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+from history_store import HistoryStore
+
+logger = logging.getLogger("history_logger")
+
+HISTORY_LOG = "cache_history.log"
+LIST_LOG = "cache_list.log"
+HISTORY_DB = "cache_history.db"
+
+
+class RotatingLogFile:
+    """
+    Append-only log file that stays open between writes.
+    Rolls over to numbered backups by size and/or age, optionally gzip-compressing them.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, rotate_seconds: int = 0,
+                 backup_count: int = 5, compress: bool = False):
+        """
+        Initialize the log file.
+
+        Args:
+            path: Path of the active log file
+            max_bytes: Roll over once the file would exceed this size (0 disables)
+            rotate_seconds: Roll over once the file is older than this (0 disables)
+            backup_count: Number of rotated files to keep
+            compress: Gzip rotated files
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.backup_count = backup_count
+        self.compress = compress
+        self.rotations = 0
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._open()
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._opened_at = time.time()
+
+    def _backup_name(self, n: int) -> str:
+        name = f"{self.path}.{n}"
+        return name + ".gz" if self.compress else name
+
+    def _should_rollover(self, incoming: int) -> bool:
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size + incoming > self.max_bytes:
+            return True
+        if self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds:
+            return True
+        return False
+
+    def _rollover(self):
+        self._file.close()
+        if self.backup_count > 0:
+            for n in range(self.backup_count - 1, 0, -1):
+                src = self._backup_name(n)
+                if os.path.exists(src):
+                    os.replace(src, self._backup_name(n + 1))
+            rotated = f"{self.path}.1"
+            os.replace(self.path, rotated)
+            if self.compress:
+                with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rotated)
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def write(self, data: str):
+        """Append a block of text, rotating first if needed"""
+        if self._should_rollover(len(data)):
+            self._rollover()
+        self._file.write(data)
+        self._size += len(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file and not self._file.closed:
+            self._file.close()
+
+
+class HistoryLogger:
+    """
+    Queue-backed writer for cache history records.
+    log() only enqueues; a daemon thread formats, batches and writes both log files
+    and indexes each batch in the HistoryStore.
+    """
+
+    def __init__(self, log_dir: str = "logs", batch_size: int = 256, flush_interval: float = 0.5,
+                 max_queue: int = 10000, max_bytes: int = 50 * 1024 * 1024, rotate_seconds: int = 0,
+                 backup_count: int = 5, compress: bool = True, ring_size: int = 1000):
+        """
+        Initialize the history logger and start its writer thread.
+
+        Args:
+            log_dir: Directory holding cache_history.log and cache_list.log
+            batch_size: Maximum records written per batch
+            flush_interval: Seconds to wait for more records before flushing a partial batch
+            max_queue: Queue capacity; records beyond it are dropped rather than blocking
+            max_bytes: Size-based rotation threshold per file (0 disables)
+            rotate_seconds: Time-based rotation threshold per file (0 disables)
+            backup_count: Rotated files kept per log
+            compress: Gzip rotated files
+            ring_size: Recent records the history store keeps in memory
+        """
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = {"written": 0, "dropped": 0, "batches": 0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._batch_listeners = []
+
+        os.makedirs(log_dir, exist_ok=True)
+        rotation = dict(max_bytes=max_bytes, rotate_seconds=rotate_seconds,
+                        backup_count=backup_count, compress=compress)
+        self._history_file = RotatingLogFile(os.path.join(log_dir, HISTORY_LOG), **rotation)
+        self._list_file = RotatingLogFile(os.path.join(log_dir, LIST_LOG), **rotation)
+
+        self.store = HistoryStore(os.path.join(log_dir, HISTORY_DB), ring_size=ring_size)
+        self._backfill = self.store.is_empty() and self._list_file._size > 0
+        self.add_batch_listener(self.store.append_batch)
+
+        self._thread = threading.Thread(target=self._run, name="history-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, entry: Dict[str, Any]):
+        """Enqueue a history record without blocking"""
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning(f"History queue full, dropped {self.stats['dropped']} records so far")
+
+    def add_batch_listener(self, callback):
+        """Register a callable invoked from the writer thread with each written batch"""
+        self._batch_listeners.append(callback)
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        history_lines = []
+        list_lines = []
+        for entry in batch:
+            history_lines.append(
+                f"{entry['timestamp']} - {entry['action']} - Sim: {entry['similarity']} - Prompt: {entry['prompt'][:100]}\n"
+            )
+            list_lines.append(json.dumps(entry) + "\n")
+        self._history_file.write("".join(history_lines))
+        self._list_file.write("".join(list_lines))
+        self._history_file.flush()
+        self._list_file.flush()
+        for callback in self._batch_listeners:
+            try:
+                callback(batch)
+            except Exception as e:
+                logger.error(f"History batch listener failed: {e}")
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def _run(self):
+        if self._backfill:
+            try:
+                self.store.import_log(self._list_file.path)
+            except Exception as e:
+                logger.error(f"Failed to backfill history store: {e}")
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._drain()
+            if not batch:
+                continue
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Failed to write history batch: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until every record enqueued so far has been written"""
+        self._queue.join()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Drain the queue, stop the writer thread and close the files"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._history_file.close()
+        self._list_file.close()
+        self.store.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "queued": self._queue.qsize(),
+            "rotations": self._history_file.rotations + self._list_file.rotations,
+        }
+
+
+# One writer per log directory, shared by every adapter in the process
+_history_loggers = {}
+_history_loggers_lock = threading.Lock()
+
+def get_history_logger(log_dir: str = "logs", **kwargs) -> HistoryLogger:
+    """
+    Get the shared history logger for a log directory.
+
+    Args:
+        log_dir: Directory holding the history logs
+        **kwargs: HistoryLogger options, used only when the logger is first created
+
+    Returns:
+        HistoryLogger instance
+    """
+    key = os.path.abspath(log_dir)
+    with _history_loggers_lock:
+        if key not in _history_loggers:
+            _history_loggers[key] = HistoryLogger(log_dir, **kwargs)
+        return _history_loggers[key]
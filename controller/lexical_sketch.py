@@ -0,0 +1,135 @@
+"""
+Lexical Sketch - MinHash LSH over character shingles for near-duplicate prompts
+Finds cached prompts that differ from a query only in punctuation, casing or a few
+characters, even when the vector index's approximate search misses them. Candidates come
+from LSH buckets and are confirmed with the exact shingle Jaccard similarity. SemanticCache
+answers a near-exact match without encoding the prompt, and scores looser matches with
+embedding similarity like any other candidate.
+"""
+
+import re
+import zlib
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def shingles(text: str, size: int = 4) -> Set[int]:
+    """crc32 hashes of the character shingles of the normalized text"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class LexicalSketchIndex:
+    """
+    MinHash signatures split into LSH bands; prompts sharing any band are candidates.
+    Not thread-safe on its own: SemanticCache calls it under its RW lock.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 4,
+                 max_candidates: int = 32, seed: int = 1):
+        """
+        Args:
+            num_perm: MinHash permutations; must be divisible by bands
+            bands: LSH bands; more bands find lower-similarity candidates
+            shingle_size: Characters per shingle
+            max_candidates: Candidates verified per lookup, best signature agreement first
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_candidates = max_candidates
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: odd 64-bit multipliers, overflow wraps
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], Set[str]] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def signature(self, shingle_set: Set[int]) -> np.ndarray:
+        x = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+        with np.errstate(over="ignore"):
+            hashed = (self._a[:, None] * x[None, :] + self._b[:, None]) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, key: str, text: str):
+        if key in self._signatures:
+            return
+        signature = self.signature(shingles(text, self.shingle_size))
+        self._signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def clear(self):
+        self._buckets = {}
+        self._signatures = {}
+
+    def candidates(self, text: str) -> Tuple[Set[int], List[str]]:
+        """Shingles of `text` and the keys sharing an LSH band with it, most similar signatures first"""
+        query_shingles = shingles(text, self.shingle_size)
+        signature = self.signature(query_shingles)
+        found = set()
+        for band_key in self._band_keys(signature):
+            found.update(self._buckets.get(band_key, ()))
+        ranked = sorted(found, key=lambda key: -int((self._signatures[key] == signature).sum()))
+        return query_shingles, ranked[:self.max_candidates]
+
+    def best_match(self, text: str, get_text: Callable[[str], Optional[str]],
+                   threshold: float) -> Optional[Tuple[str, float]]:
+        """
+        Best candidate whose exact shingle Jaccard similarity reaches `threshold`.
+
+        Args:
+            text: Query text
+            get_text: Returns the stored text for a key (None if gone), used to verify candidates
+            threshold: Minimum Jaccard similarity
+
+        Returns:
+            (key, similarity) or None
+        """
+        query_shingles, keys = self.candidates(text)
+        best = None
+        for key in keys:
+            stored = get_text(key)
+            if stored is None:
+                continue
+            similarity = jaccard(query_shingles, shingles(stored, self.shingle_size))
+            if similarity >= threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+                if similarity == 1.0:
+                    break
+        return best
@@ -0,0 +1,366 @@
+"""
+Cache Daemon - One semantic cache and embedding model per machine
+Orchestrator processes talk to it over a Unix socket or localhost TCP instead of each
+loading their own model and index.
+
+Wire protocol: each frame is a 4-byte big-endian length followed by a JSON body.
+    request   {"ops": [{"op": "lookup", "prompt": ...}, {"op": "add", "prompt": ..., "response": ...}, ...]}
+    response  {"results": [{"result": ...} | {"error": "..."}, ...]}   (same order as ops)
+Ops are applied in order; consecutive lookups (or adds, or embeds) are embedded with a single
+batched encode. "embed" returns a prompt's vector and "search" returns the nearest entries to a
+vector, so a sharded client can encode a prompt once and search every node with it.
+
+Run with:
+    python cache_daemon.py --listen 127.0.0.1:7100 --cache-dir ./cache/semantic_cache
+    python cache_daemon.py --listen unix:/tmp/semantic_cache.sock
+"""
+
+import os
+import json
+import itertools
+import queue
+import socket
+import struct
+import logging
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("cache_daemon")
+
+_LENGTH = struct.Struct(">I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+EXPORT_PAGE_SIZE = 500
+
+
+def _json_default(value):
+    # numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def send_frame(sock: socket.socket, payload: Dict[str, Any]):
+    body = json.dumps(payload, default=_json_default).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Dict[str, Any]:
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"Frame of {length} bytes exceeds limit")
+    return json.loads(_recv_exact(sock, length))
+
+
+def parse_address(address: str):
+    """Return (socket family, address) for 'unix:/path' or 'host:port'"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class CacheDaemon:
+    """
+    Executes batched protocol operations against one SemanticCache.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def handle_ops(self, ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Ops run in arrival order (a frame mixes several clients' calls); consecutive
+        # lookups or adds share one batched encode
+        results: List[Optional[Dict[str, Any]]] = []
+        for kind, run in itertools.groupby(ops, key=lambda op: op.get("op")):
+            run = list(run)
+            try:
+                if kind == "lookup":
+                    results.extend({"result": result} for result in
+                                   self.cache.lookup_many([op["prompt"] for op in run]))
+                    continue
+                if kind == "add":
+                    self.cache.add_many([(op["prompt"], op["response"]) for op in run])
+                    results.extend({"result": True} for _ in run)
+                    continue
+                if kind == "embed":
+                    results.extend({"result": vector.tolist()} for vector in
+                                   self.cache.embed_many([op["prompt"] for op in run]))
+                    continue
+            except Exception as e:
+                logger.error(f"Operation {kind} failed: {e}")
+                results.extend({"error": str(e)} for _ in run)
+                continue
+            for op in run:
+                try:
+                    results.append({"result": self._dispatch(op)})
+                except Exception as e:
+                    logger.error(f"Operation {op.get('op')} failed: {e}")
+                    results.append({"error": str(e)})
+        return results
+
+    def _dispatch(self, op: Dict[str, Any]):
+        name = op.get("op")
+        if name == "info":
+            return {
+                "model_name": self.cache.model_name,
+                "dimension": self.cache.dimension,
+                "ttl_seconds": self.cache.ttl_seconds,
+                "similarity_threshold": self.cache.similarity_threshold,
+            }
+        if name == "configure":
+            if "ttl_seconds" in op:
+                self.cache.ttl_seconds = int(op["ttl_seconds"])
+            if "similarity_threshold" in op:
+                self.cache.similarity_threshold = float(op["similarity_threshold"])
+            return True
+        if name == "stats":
+            return self.cache.get_stats()
+        if name == "size":
+            return self.cache.size()
+        if name == "clear":
+            self.cache.clear()
+            return True
+        if name == "export":
+            # Paged by sequence number, so each page starts where the last one ended
+            page, next_seq = self.cache.entries_since(int(op.get("after_seq", 0)),
+                                                      int(op.get("limit", EXPORT_PAGE_SIZE)))
+            entries = []
+            for hash_key, item in page:
+                entries.append({key: value for key, value in item.items() if key not in ("embedding", "seq")})
+                entries[-1]["hash"] = hash_key
+                entries[-1]["embedding"] = item["embedding"]
+            return {"entries": entries, "next_seq": next_seq}
+        if name == "import":
+            entries = op["entries"]
+            vectors = [entry.pop("embedding") for entry in entries]
+            return self.cache.import_entries(entries, vectors)
+        if name == "remove":
+            return self.cache.remove_many(op["hashes"])
+        if name == "search":
+            candidates = self.cache.search_many([op["embedding"]], int(op.get("k", 1)))[0]
+            return [
+                {"similarity": similarity, **{key: value for key, value in entry.items() if key != "embedding"}}
+                for similarity, entry in candidates
+            ]
+        if name == "ping":
+            return "pong"
+        raise ValueError(f"Unknown operation: {name}")
+
+    def serve(self, address: str):
+        """Serve until interrupted"""
+        family, bind_address = parse_address(address)
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                while True:
+                    try:
+                        request = recv_frame(self.request)
+                    except (ConnectionError, OSError):
+                        return
+                    send_frame(self.request, {"results": daemon.handle_ops(request.get("ops", []))})
+
+        if family == socket.AF_UNIX:
+            if os.path.exists(bind_address):
+                os.remove(bind_address)
+            server = socketserver.ThreadingUnixStreamServer(bind_address, Handler)
+        else:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            server = socketserver.ThreadingTCPServer(bind_address, Handler)
+        server.daemon_threads = True
+        logger.info(f"Cache daemon listening on {address}")
+        with server:
+            server.serve_forever()
+
+
+class CacheDaemonClient:
+    """
+    Client for the cache daemon with the same interface the adapter uses on SemanticCache.
+    Calls from any thread are queued and coalesced: while one frame is in flight, new
+    operations accumulate and are sent together in the next frame.
+    """
+
+    def __init__(self, address: str, timeout: float = 5.0, max_batch: int = 64):
+        """
+        Connect to a cache daemon.
+
+        Args:
+            address: 'unix:/path' or 'host:port'
+            timeout: Socket timeout in seconds
+            max_batch: Maximum operations per frame
+        """
+        self.address = address
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.enabled = True
+        self._queue = queue.Queue()
+        self._sock = None
+        self._thread = threading.Thread(target=self._run, name="cache-daemon-client", daemon=True)
+        self._thread.start()
+
+        info = self._call({"op": "info"})
+        self.model_name = info["model_name"]
+        self.dimension = info["dimension"]
+        self._ttl_seconds = info["ttl_seconds"]
+        self._similarity_threshold = info["similarity_threshold"]
+
+    def _connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(address)
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._sock is None:
+                    self._connect()
+                send_frame(self._sock, {"ops": [op for op, _ in batch]})
+                results = recv_frame(self._sock)["results"]
+                for (_, future), result in zip(batch, results):
+                    if "error" in result:
+                        future.set_exception(RuntimeError(result["error"]))
+                    else:
+                        future.set_result(result["result"])
+            except Exception as e:
+                if self._sock is not None:
+                    self._sock.close()
+                    self._sock = None
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(ConnectionError(f"Cache daemon unavailable: {e}"))
+
+    def _submit(self, op: Dict[str, Any]) -> Future:
+        future = Future()
+        self._queue.put((op, future))
+        return future
+
+    def _call(self, op: Dict[str, Any]):
+        return self._submit(op).result(timeout=self.timeout * 2)
+
+    def lookup(self, prompt: str):
+        return self._call({"op": "lookup", "prompt": prompt})
+
+    def lookup_many(self, prompts: List[str]):
+        futures = [self._submit({"op": "lookup", "prompt": prompt}) for prompt in prompts]
+        return [future.result(timeout=self.timeout * 2) for future in futures]
+
+    def embed_many(self, prompts: List[str]) -> List[List[float]]:
+        futures = [self._submit({"op": "embed", "prompt": prompt}) for prompt in prompts]
+        return [future.result(timeout=self.timeout * 2) for future in futures]
+
+    def search_many(self, embeddings, k: int = 1) -> List[List[Dict[str, Any]]]:
+        """Up to k nearest unexpired entries per embedding, most similar first, each with its similarity"""
+        futures = [self._submit({"op": "search", "embedding": [float(x) for x in embedding], "k": k})
+                   for embedding in embeddings]
+        return [future.result(timeout=self.timeout * 2) for future in futures]
+
+    def add(self, prompt: str, response: str):
+        self._call({"op": "add", "prompt": prompt, "response": response})
+
+    def add_many(self, items):
+        futures = [self._submit({"op": "add", "prompt": prompt, "response": response}) for prompt, response in items]
+        for future in futures:
+            future.result(timeout=self.timeout * 2)
+
+    def export_entries(self, after_seq: int = 0, limit: int = EXPORT_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Page of entries (with hash and embedding) changed after a sequence number, oldest first.
+
+        Returns:
+            (entries, seq to pass as after_seq for the next page); a page shorter than limit is the last
+        """
+        result = self._call({"op": "export", "after_seq": after_seq, "limit": limit})
+        return result["entries"], result["next_seq"]
+
+    def import_entries(self, entries: List[Dict[str, Any]]):
+        """Import entries returned by export_entries without re-encoding them"""
+        return self._call({"op": "import", "entries": entries})
+
+    def remove_many(self, hash_keys: List[str]) -> int:
+        return self._call({"op": "remove", "hashes": list(hash_keys)})
+
+    def size(self):
+        return self._call({"op": "size"})
+
+    def get_stats(self):
+        return self._call({"op": "stats"})
+
+    def clear(self):
+        self._call({"op": "clear"})
+
+    def iter_entries(self):
+        after_seq = 0
+        while True:
+            page, after_seq = self.export_entries(after_seq)
+            for entry in page:
+                hash_key = entry.pop("hash")
+                yield hash_key, entry
+            if len(page) < EXPORT_PAGE_SIZE:
+                return
+
+    @property
+    def ttl_seconds(self):
+        return self._ttl_seconds
+
+    @ttl_seconds.setter
+    def ttl_seconds(self, value):
+        self._call({"op": "configure", "ttl_seconds": value})
+        self._ttl_seconds = value
+
+    @property
+    def similarity_threshold(self):
+        return self._similarity_threshold
+
+    @similarity_threshold.setter
+    def similarity_threshold(self, value):
+        self._call({"op": "configure", "similarity_threshold": value})
+        self._similarity_threshold = value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local semantic cache daemon")
+    parser.add_argument('--listen', default='127.0.0.1:7100', help="'host:port' or 'unix:/path/to.sock'")
+    parser.add_argument('--cache-dir', default='./cache/semantic_cache', help='Cache directory')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Embedding model')
+    parser.add_argument('--ttl', type=int, default=3600, help='Entry TTL in seconds')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Similarity threshold')
+    parser.add_argument('--shared', action='store_true', help='Use the multi-process shared store')
+    parser.add_argument('--reduction', help="Index dimensionality reduction, e.g. 'pca:128' or 'truncate:256'")
+    args = parser.parse_args()
+
+    if args.shared:
+        from shared_cache import SharedSemanticCache as cache_class
+    else:
+        from semantic_cache import SemanticCache as cache_class
+    cache = cache_class(model_name=args.model, cache_path=args.cache_dir, ttl_seconds=args.ttl,
+                        similarity_threshold=args.threshold, reduction=args.reduction)
+    CacheDaemon(cache).serve(args.listen)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Cache Export - Incremental encoders for cache history and cache contents
+Every encoder consumes an iterator of records and yields bytes chunks, so an export
+never holds more than one batch in memory regardless of its size.
+
+Columnar format (CCOL1), all integers little-endian:
+    b"CCOL1\\n" | uint32 schema length | schema JSON {"columns": [{"name", "type", ["dim"]}]}
+    then blocks of: uint32 row count | per column: uint32 payload length | payload
+    and a terminating uint32 0.
+    Payloads by column type:
+        str    uint32 offsets[rows + 1] followed by the UTF-8 data
+        f64    float64[rows]
+        f32vec float32[rows * dim]
+"""
+
+import io
+import csv
+import sys
+import json
+import zlib
+import struct
+from array import array
+from typing import Dict, Any, List, Iterable, Iterator
+
+HISTORY_COLUMNS = [
+    {"name": "timestamp", "type": "str"},
+    {"name": "prompt", "type": "str"},
+    {"name": "similarity", "type": "f64"},
+    {"name": "action", "type": "str"},
+]
+
+COLUMNAR_MAGIC = b"CCOL1\n"
+
+
+def cache_columns(dimension: int) -> List[Dict[str, Any]]:
+    """Columns of a full cache export, embeddings included"""
+    return [
+        {"name": "hash", "type": "str"},
+        {"name": "timestamp", "type": "str"},
+        {"name": "prompt", "type": "str"},
+        {"name": "response", "type": "str"},
+        {"name": "metadata", "type": "str"},
+        {"name": "embedding", "type": "f32vec", "dim": dimension},
+    ]
+
+
+def _batched(records: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_ndjson(records: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[bytes]:
+    """Encode records as newline-delimited JSON"""
+    for batch in _batched(records, batch_size):
+        yield "".join(json.dumps(record) + "\n" for record in batch).encode("utf-8")
+
+
+def iter_json_array(records: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[bytes]:
+    """Encode records as a single JSON array, written incrementally"""
+    yield b"["
+    first = True
+    for batch in _batched(records, batch_size):
+        parts = []
+        for record in batch:
+            parts.append(("\n" if first else ",\n") + json.dumps(record))
+            first = False
+        yield "".join(parts).encode("utf-8")
+    yield b"\n]\n"
+
+
+def iter_csv(records: Iterable[Dict[str, Any]], fieldnames: List[str], batch_size: int = 500) -> Iterator[bytes]:
+    """Encode records as CSV with a header row; non-scalar values are JSON-encoded"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    for batch in _batched(records, batch_size):
+        for record in batch:
+            writer.writerow({
+                key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                for key, value in record.items()
+            })
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encode_column(column: Dict[str, Any], batch: List[Dict[str, Any]]) -> bytes:
+    name = column["name"]
+    kind = column["type"]
+    if kind == "str":
+        offsets = array("I", [0])
+        data = bytearray()
+        for record in batch:
+            value = record.get(name)
+            if value is None:
+                value = ""
+            elif not isinstance(value, str):
+                value = json.dumps(value)
+            data += value.encode("utf-8")
+            offsets.append(len(data))
+        return _le(offsets) + bytes(data)
+    if kind == "f64":
+        return _le(array("d", (float(record.get(name) or 0.0) for record in batch)))
+    if kind == "f32vec":
+        dim = column["dim"]
+        values = array("f")
+        for record in batch:
+            vector = record.get(name) or []
+            if len(vector) != dim:
+                raise ValueError(f"Column {name} expects {dim} values, got {len(vector)}")
+            values.extend(float(v) for v in vector)
+        return _le(values)
+    raise ValueError(f"Unknown column type: {kind}")
+
+
+def iter_columnar(records: Iterable[Dict[str, Any]], columns: List[Dict[str, Any]],
+                  batch_size: int = 1000) -> Iterator[bytes]:
+    """Encode records in the CCOL1 columnar block format"""
+    schema = json.dumps({"columns": columns}).encode("utf-8")
+    yield COLUMNAR_MAGIC + struct.pack("<I", len(schema)) + schema
+    for batch in _batched(records, batch_size):
+        block = [struct.pack("<I", len(batch))]
+        for column in columns:
+            payload = _encode_column(column, batch)
+            block.append(struct.pack("<I", len(payload)))
+            block.append(payload)
+        yield b"".join(block)
+    yield struct.pack("<I", 0)
+
+
+def read_columnar(stream) -> Iterator[Dict[str, Any]]:
+    """Decode a CCOL1 stream back into records"""
+    if stream.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("Not a CCOL1 stream")
+    (schema_len,) = struct.unpack("<I", stream.read(4))
+    columns = json.loads(stream.read(schema_len))["columns"]
+    while True:
+        (rows,) = struct.unpack("<I", stream.read(4))
+        if rows == 0:
+            return
+        decoded = {}
+        for column in columns:
+            (length,) = struct.unpack("<I", stream.read(4))
+            payload = stream.read(length)
+            kind = column["type"]
+            if kind == "str":
+                offsets = array("I")
+                offsets.frombytes(payload[:4 * (rows + 1)])
+                data = payload[4 * (rows + 1):]
+                if sys.byteorder == "big":
+                    offsets.byteswap()
+                decoded[column["name"]] = [
+                    data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(rows)
+                ]
+            else:
+                values = array("d" if kind == "f64" else "f")
+                values.frombytes(payload)
+                if sys.byteorder == "big":
+                    values.byteswap()
+                if kind == "f32vec":
+                    dim = column["dim"]
+                    decoded[column["name"]] = [list(values[i * dim:(i + 1) * dim]) for i in range(rows)]
+                else:
+                    decoded[column["name"]] = list(values)
+        for i in range(rows):
+            yield {name: values[i] for name, values in decoded.items()}
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a chunk stream incrementally"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def encode_stream(fmt: str, records: Iterable[Dict[str, Any]], columns: List[Dict[str, Any]],
+                  compress: bool = False) -> Iterator[bytes]:
+    """
+    Encode records in one of the supported export formats.
+
+    Args:
+        fmt: "json", "ndjson", "csv" or "columnar"
+        records: Iterator of records
+        columns: Column definitions (names drive CSV headers, types drive columnar encoding)
+        compress: Gzip the output
+
+    Returns:
+        Iterator of bytes chunks
+    """
+    if fmt == "json":
+        chunks = iter_json_array(records)
+    elif fmt == "ndjson":
+        chunks = iter_ndjson(records)
+    elif fmt == "csv":
+        chunks = iter_csv(records, [column["name"] for column in columns])
+    elif fmt == "columnar":
+        chunks = iter_columnar(records, columns)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    return gzip_stream(chunks) if compress else chunks
+
+
+EXPORT_MEDIA_TYPES = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "columnar": ("application/octet-stream", "ccol"),
+}
+
+
+def export_filename(base: str, fmt: str, compress: bool = False) -> str:
+    name = f"{base}.{EXPORT_MEDIA_TYPES[fmt][1]}"
+    return name + ".gz" if compress else name
+
+
+def export_media_type(fmt: str, compress: bool = False) -> str:
+    return "application/gzip" if compress else EXPORT_MEDIA_TYPES[fmt][0]
+
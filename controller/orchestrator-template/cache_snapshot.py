@@ -0,0 +1,181 @@
+"""
+Cache Snapshot - Compact binary snapshots of a SemanticCache
+Used to pre-warm new orchestrators with the contents of an existing cache.
+
+Layout (integers little-endian):
+    b"SCSNAP1\\n"
+    uint32 header length | header JSON {"version", "model_name", "dimension", "count", "created"}
+    float32 vectors[count * dimension], in entry order
+    uint64 entries length | zlib-compressed JSON list of
+        {"hash", "prompt", "response", "metadata", "timestamp"}
+
+The vector index is rebuilt from the stored vectors on import, so no faiss data is
+written. numpy is imported lazily so the controller can
+validate and serve snapshots without it.
+"""
+
+import os
+import json
+import zlib
+import struct
+import logging
+import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger("cache_snapshot")
+
+SNAPSHOT_MAGIC = b"SCSNAP1\n"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FILENAME = "cache_snapshot.bin"
+
+
+def dump_snapshot(f, model_name: str, dimension: int, entries: List[Dict[str, Any]], vectors) -> None:
+    """Write a snapshot to an open binary file object"""
+    import numpy as np
+
+    vectors = np.ascontiguousarray(vectors, dtype="<f4").reshape(len(entries), dimension)
+    header = json.dumps({
+        "version": SNAPSHOT_VERSION,
+        "model_name": model_name,
+        "dimension": dimension,
+        "count": len(entries),
+        "created": datetime.datetime.now().isoformat(),
+    }).encode("utf-8")
+    body = zlib.compress(json.dumps(entries).encode("utf-8"), 6)
+
+    f.write(SNAPSHOT_MAGIC)
+    f.write(struct.pack("<I", len(header)))
+    f.write(header)
+    f.write(vectors.tobytes())
+    f.write(struct.pack("<Q", len(body)))
+    f.write(body)
+
+
+def write_snapshot(path: str, model_name: str, dimension: int,
+                   entries: List[Dict[str, Any]], vectors) -> int:
+    """
+    Write a snapshot file atomically.
+
+    Args:
+        path: Destination file
+        model_name: Embedding model the vectors were produced with
+        dimension: Embedding dimension
+        entries: Entry records, one per vector row
+        vectors: float32 array of shape (len(entries), dimension)
+
+    Returns:
+        Size of the written file in bytes
+    """
+    tmp_path = f"{path}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        dump_snapshot(f, model_name, dimension, entries, vectors)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def read_snapshot_header(f) -> Dict[str, Any]:
+    """Read and validate the header from an open snapshot file"""
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise ValueError("Not a cache snapshot")
+    raw = f.read(4)
+    if len(raw) != 4:
+        raise ValueError("Snapshot is truncated")
+    (header_len,) = struct.unpack("<I", raw)
+    header = json.loads(f.read(header_len))
+    if not isinstance(header, dict):
+        raise ValueError("Snapshot header is not an object")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('version')}")
+    for field in ("count", "dimension"):
+        value = header.get(field)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            raise ValueError(f"Snapshot header has an invalid {field}: {value!r}")
+    if not isinstance(header.get("model_name"), str):
+        raise ValueError("Snapshot header has no model_name")
+    return header
+
+
+def load_snapshot(f) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Any]:
+    """Read a snapshot from an open binary file object"""
+    import numpy as np
+
+    header = read_snapshot_header(f)
+    count, dimension = header["count"], header["dimension"]
+    raw = f.read(count * dimension * 4)
+    if len(raw) != count * dimension * 4:
+        raise ValueError("Snapshot is truncated")
+    vectors = np.frombuffer(raw, dtype="<f4").astype(np.float32).reshape(count, dimension)
+    (body_len,) = struct.unpack("<Q", f.read(8))
+    entries = json.loads(zlib.decompress(f.read(body_len)))
+    if len(entries) != count:
+        raise ValueError("Snapshot is truncated")
+    return header, entries, vectors
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Any]:
+    """
+    Read a snapshot file.
+
+    Returns:
+        Tuple of (header, entries, float32 vectors array)
+    """
+    with open(path, "rb") as f:
+        return load_snapshot(f)
+
+
+def _auth_headers(token: Optional[str]) -> Dict[str, str]:
+    return {"X-Fleet-Token": token} if token else {}
+
+
+def download_snapshot(url: str, path: str, timeout: int = 30, token: Optional[str] = None) -> Optional[str]:
+    """
+    Download a snapshot from the controller.
+
+    Args:
+        url: Snapshot URL, e.g. http://<controller>:5000/api/cache_snapshot
+        path: Destination file
+        token: Fleet token the controller requires
+
+    Returns:
+        The path on success, None if no snapshot is available
+    """
+    import requests
+
+    with requests.get(url, stream=True, timeout=timeout, headers=_auth_headers(token)) as res:
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            for chunk in res.iter_content(chunk_size=1 << 16):
+                f.write(chunk)
+    with open(tmp_path, "rb") as f:
+        read_snapshot_header(f)
+    os.replace(tmp_path, path)
+    logger.info(f"Downloaded cache snapshot from {url}")
+    return path
+
+
+def upload_snapshot(url: str, path: str, timeout: int = 300, token: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Upload a snapshot file to the controller, which bundles it into new orchestrators.
+
+    Args:
+        url: Snapshot URL, e.g. http://<controller>:5000/api/cache_snapshot
+        path: Snapshot file
+        token: Fleet token the controller requires
+
+    Returns:
+        The controller's response
+    """
+    import requests
+
+    with open(path, "rb") as f:
+        read_snapshot_header(f)
+        f.seek(0)
+        res = requests.post(url, files={"snapshot": (SNAPSHOT_FILENAME, f)}, headers=_auth_headers(token),
+                            timeout=timeout)
+    res.raise_for_status()
+    logger.info(f"Uploaded cache snapshot to {url}")
+    return res.json()
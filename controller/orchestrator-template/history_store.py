@@ -0,0 +1,218 @@
+"""
+History Store - Indexed storage for cache history records
+Recent records live in an in-memory ring buffer; everything is indexed in SQLite
+so tail reads, time-range queries and pagination cost O(result) instead of O(file).
+"""
+
+import os
+import json
+import sqlite3
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, List, Optional, Iterator
+
+logger = logging.getLogger("history_store")
+
+_COLUMNS = "id, timestamp, prompt, similarity, action"
+
+
+class HistoryStore:
+    """
+    Ring buffer plus SQLite (WAL) index of history records.
+    Writes arrive in batches from the history logger thread; reads may come from any thread.
+    """
+
+    def __init__(self, db_path: str, ring_size: int = 1000):
+        """
+        Initialize the store, creating the database if needed.
+
+        Args:
+            db_path: Path of the SQLite database file
+            ring_size: Number of most recent records kept in memory
+        """
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self._ring = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+            "prompt TEXT, similarity REAL, action TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)")
+        self._conn.commit()
+
+        # Seed the ring buffer with the newest persisted records
+        for entry in reversed(self._select("SELECT " + _COLUMNS + " FROM history ORDER BY id DESC LIMIT ?",
+                                           (ring_size,))):
+            self._ring.append(entry)
+
+    @staticmethod
+    def _row_to_entry(row) -> Dict[str, Any]:
+        return {"id": row[0], "timestamp": row[1], "prompt": row[2], "similarity": row[3], "action": row[4]}
+
+    def _select(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def append_batch(self, batch: List[Dict[str, Any]]):
+        """Persist a batch of records and push them onto the ring buffer"""
+        rows = [(e["timestamp"], e["prompt"], e["similarity"], e["action"]) for e in batch]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO history (timestamp, prompt, similarity, action) VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+            last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+        first_id = last_id - len(rows) + 1
+        for offset, entry in enumerate(batch):
+            self._ring.append({"id": first_id + offset, **entry})
+
+    def import_log(self, log_path: str, batch_size: int = 5000) -> int:
+        """
+        Backfill the store from a JSON-lines cache_list.log, streaming it line by line.
+
+        Returns:
+            Number of records imported
+        """
+        imported = 0
+        batch = []
+        with open(log_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    batch.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+                if len(batch) >= batch_size:
+                    self.append_batch(batch)
+                    imported += len(batch)
+                    batch = []
+        if batch:
+            self.append_batch(batch)
+            imported += len(batch)
+        logger.info(f"Imported {imported} history records from {log_path}")
+        return imported
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM history LIMIT 1").fetchone() is None
+
+    def recent(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get the newest records, oldest first.
+
+        Args:
+            limit: Number of records to return
+
+        Returns:
+            List of history records
+        """
+        if limit <= 0:
+            return []
+        ring = list(self._ring)
+        if limit <= len(ring) or len(ring) < self.ring_size:
+            return ring[-limit:]
+        rows = self._select("SELECT " + _COLUMNS + " FROM history ORDER BY id DESC LIMIT ?", (limit,))
+        rows.reverse()
+        return rows
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None, cursor: Optional[int] = None,
+              limit: int = 100, reverse: bool = False) -> Dict[str, Any]:
+        """
+        Page through records, optionally restricted to a time range.
+
+        Args:
+            start: Inclusive ISO timestamp lower bound
+            end: Exclusive ISO timestamp upper bound
+            cursor: next_cursor from the previous page
+            limit: Page size
+            reverse: Newest first when True
+
+        Returns:
+            Dict with the page of entries and the cursor for the next page (None when exhausted)
+        """
+        conditions = []
+        params = []
+        if cursor is not None:
+            conditions.append("id < ?" if reverse else "id > ?")
+            params.append(cursor)
+        else:
+            # Records are inserted in time order, so the time bound maps to an id bound via the index
+            bound = end if reverse else start
+            if bound is not None:
+                op, agg = ("<", "MAX") if reverse else (">=", "MIN")
+                with self._lock:
+                    edge = self._conn.execute(
+                        f"SELECT {agg}(id) FROM history WHERE timestamp {op} ?", (bound,)
+                    ).fetchone()[0]
+                if edge is None:
+                    return {"entries": [], "next_cursor": None}
+                conditions.append("id <= ?" if reverse else "id >= ?")
+                params.append(edge)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        order = "DESC" if reverse else "ASC"
+        entries = self._select(
+            f"SELECT {_COLUMNS} FROM history {where}ORDER BY id {order} LIMIT ?", (*params, limit + 1)
+        )
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1]["id"]
+        return {"entries": entries, "next_cursor": next_cursor}
+
+    def iter_entries(self, start: Optional[str] = None, end: Optional[str] = None,
+                     last: Optional[int] = None, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Yield records in a time range, oldest first, one page in memory at a time.
+
+        Args:
+            start: Inclusive ISO timestamp lower bound
+            end: Exclusive ISO timestamp upper bound
+            last: Only yield the newest N records of the range
+            page_size: Records fetched per query
+        """
+        cursor = None
+        if last is not None:
+            # Start just before the N-th newest record of the range
+            page = self.query(start=start, end=end, limit=1, reverse=True)
+            if not page["entries"]:
+                return
+            conditions = ["id <= ?"]
+            params = [page["entries"][0]["id"]]
+            if start is not None:
+                conditions.append("timestamp >= ?")
+                params.append(start)
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT id FROM history WHERE {' AND '.join(conditions)} ORDER BY id DESC LIMIT 1 OFFSET ?",
+                    (*params, last - 1)
+                ).fetchone()
+            if row is not None:
+                cursor = row[0] - 1
+        while True:
+            page = self.query(start=start, end=end, cursor=cursor, limit=page_size)
+            yield from page["entries"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,23 +1,95 @@
+import os
+import sys
+import json
 import requests
 import time
+import uuid
 import argparse
 
-# This line will be overwritten dynamically by controller during build
 ORCHESTRATOR_NAME = "Unnamed Orchestrator"
 
+# Written next to the executable by the controller for each download
+CONFIG_FILENAME = "orchestrator_config.json"
+# Holds the id this orchestrator reports, so restarts keep one record on the controller
+ID_FILENAME = "orchestrator_id"
+
+def load_config(path=None):
+    # Bulk-provisioned bundles share one executable, so their configs are passed with --config
+    if path is None:
+        if getattr(sys, 'frozen', False):
+            base_dir = os.path.dirname(sys.executable)
+        else:
+            base_dir = os.path.dirname(os.path.abspath(__file__))
+        path = os.path.join(base_dir, CONFIG_FILENAME)
+        if not os.path.exists(path):
+            return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Ignoring {path}: {e}")
+        return {}
+
+def load_orchestrator_id(cache_dir):
+    path = os.path.join(cache_dir, ID_FILENAME)
+    try:
+        with open(path, 'r') as f:
+            orchestrator_id = f.read().strip()
+        if orchestrator_id:
+            return orchestrator_id
+    except OSError:
+        pass
+    orchestrator_id = f"orch_{uuid.uuid4().hex}"
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(orchestrator_id)
+    os.replace(tmp_path, path)
+    return orchestrator_id
+
 def parse_args():
+    pre_parser = argparse.ArgumentParser(add_help=False)
+    pre_parser.add_argument('--config')
+    config_path = pre_parser.parse_known_args()[0].config
+    config = load_config(config_path)
+    if config_path:
+        # The cache manager reads the controller URL and token from the same file
+        os.environ['ORCHESTRATOR_CONFIG'] = os.path.abspath(config_path)
+
     parser = argparse.ArgumentParser(description="Orchestrator Heartbeat Sender")
-    parser.add_argument('--controller', required=True, help='Controller base URL (e.g. http://<ip>:5000)')
-    parser.add_argument('--interval', type=int, default=60, help='Heartbeat interval in seconds')
-    return parser.parse_args()
+    parser.add_argument('--config', help=f'Settings file (default: {CONFIG_FILENAME} next to the executable)')
+    parser.add_argument('--controller', default=config.get('controller'),
+                        help='Controller base URL (e.g. http://<ip>:5000)')
+    parser.add_argument('--interval', type=int, default=config.get('interval', 60), help='Heartbeat interval in seconds')
+    parser.add_argument('--name', default=config.get('name', ORCHESTRATOR_NAME), help='Orchestrator name')
+    parser.add_argument('--token', default=config.get('token'), help='Fleet token the controller issued')
+    parser.add_argument('--cache-dir', default='./cache',
+                        help=f'Cache directory; also holds the {ID_FILENAME} file with this orchestrator\'s id')
+    parser.add_argument('--replication-port', type=int, default=0,
+                        help='Serve and pull cache deltas with peer orchestrators on this port (0 = off)')
+    parser.add_argument('--replication-bind', default='0.0.0.0',
+                        help='Address to serve cache deltas on (peers must be able to reach it)')
+    parser.add_argument('--replication-rate', type=int, default=1024 * 1024,
+                        help='Replication bandwidth cap in bytes/s per direction (0 = unlimited)')
+    parser.add_argument('--publish-snapshot', action='store_true',
+                        help='Upload a snapshot of the local cache to the controller and exit')
+    args = parser.parse_args()
+    if not args.controller:
+        parser.error(f"--controller is required when {CONFIG_FILENAME} doesn't set it")
+    return args
 
-def send_heartbeat(controller_url, orchestrator_id):
+def send_heartbeat(controller_url, orchestrator_id, name, replication_port=0, token=None):
     try:
         payload = {
             "id": orchestrator_id,
-            "name": ORCHESTRATOR_NAME
+            "name": name
         }
+        if replication_port:
+            payload["replication_port"] = replication_port
         headers = {'Content-Type': 'application/json'}
+        if token:
+            # Without it the controller won't list this orchestrator as a replication peer
+            headers['X-Fleet-Token'] = token
         res = requests.post(f"{controller_url}/heartbeat", json=payload, headers=headers, timeout=5)
         print(f"[Heartbeat] {res.status_code}")
     except Exception as e:
@@ -25,14 +97,40 @@ def send_heartbeat(controller_url, orchestrator_id):
 
 def main():
     args = parse_args()
-    orchestrator_id = f"orch_{int(time.time())}"
+    orchestrator_id = load_orchestrator_id(args.cache_dir)
 
-    print(f"[INFO] Orchestrator: {ORCHESTRATOR_NAME}")
+    if args.publish_snapshot:
+        from cache_manager import get_cache_manager
+        cache_manager = get_cache_manager(args.cache_dir)
+        cache_manager.config["fleet_token"] = args.token or cache_manager.config.get("fleet_token")
+        result = cache_manager.publish_snapshot(f"{args.controller}/api/cache_snapshot")
+        print(f"[INFO] Snapshot upload: {result}")
+        sys.exit(0 if result.get('success') else 1)
+
+    print(f"[INFO] Orchestrator: {args.name} ({orchestrator_id})")
     print(f"[INFO] Controller: {args.controller}")
     print(f"[INFO] Interval: {args.interval}s")
 
+    if args.replication_port:
+        # Imported here so the plain heartbeat sender doesn't need the cache dependencies
+        from cache_manager import get_cache_manager
+        from cache_replication import CacheReplicator
+        cache = get_cache_manager(args.cache_dir).semantic_cache
+        if cache is None or not hasattr(cache, "entries_since"):
+            # Daemon and sharded caches are shared already; only local caches replicate
+            print("[WARNING] Cache replication needs a local semantic cache; disabled")
+            args.replication_port = 0
+        elif not args.token:
+            print("[WARNING] Cache replication needs the fleet token (--token); disabled")
+            args.replication_port = 0
+        else:
+            CacheReplicator(cache, orchestrator_id, args.controller, port=args.replication_port,
+                            max_bytes_per_sec=args.replication_rate, token=args.token,
+                            host=args.replication_bind).start()
+            print(f"[INFO] Cache replication on {args.replication_bind}:{args.replication_port}")
+
     while True:
-        send_heartbeat(args.controller, orchestrator_id)
+        send_heartbeat(args.controller, orchestrator_id, args.name, args.replication_port, args.token)
         time.sleep(args.interval)
 
 if __name__ == '__main__':
@@ -0,0 +1,189 @@
+"""
+Remote Cache - Client for the controller-hosted fleet semantic cache
+Lookups from concurrent callers are coalesced into batched HTTP requests over a pooled
+session. A lookup that does not complete within its timeout falls back to the local cache.
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, List, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger("remote_cache")
+
+
+class RequestBatcher:
+    """
+    Collects submitted payloads for up to `window` seconds (or `max_batch` items) and
+    hands them to `send_batch` in one call from a worker thread.
+    """
+
+    def __init__(self, send_batch: Callable[[List[Any]], List[Any]], max_batch: int = 32,
+                 window: float = 0.005, name: str = "request-batcher"):
+        self.send_batch = send_batch
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Any) -> Future:
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Callers that already gave up don't need a request
+            batch = [(payload, future) for payload, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.send_batch([payload for payload, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class RemoteCacheClient:
+    """
+    Fleet cache client with the SemanticCache interface used by CacheAdapter.
+    Entries are written to the local cache and pushed to the fleet cache in the background.
+    """
+
+    def __init__(self, base_url: str, local=None, timeout: float = 0.5, max_batch: int = 32,
+                 batch_window: float = 0.005, pool_size: int = 10, token: Optional[str] = None):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Controller URL, e.g. http://<controller>:5000
+            local: Local SemanticCache used on timeouts and errors (optional)
+            timeout: Seconds a lookup waits for the fleet cache before falling back
+            max_batch: Maximum prompts or entries per request
+            batch_window: Seconds to wait for more requests before sending a batch
+            pool_size: HTTP connection pool size
+            token: Value for the X-Fleet-Token header, if the controller requires one
+        """
+        self.base_url = base_url.rstrip("/")
+        self.local = local
+        self.timeout = timeout
+        self.enabled = True
+        self.remote_stats = {"remote_hits": 0, "remote_misses": 0, "remote_fallbacks": 0, "remote_store_errors": 0}
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        pool = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", pool)
+        self.session.mount("https://", pool)
+        if token:
+            self.session.headers["X-Fleet-Token"] = token
+
+        self._lookups = RequestBatcher(self._send_lookups, max_batch, batch_window, "fleet-cache-lookups")
+        self._stores = RequestBatcher(self._send_stores, max_batch, batch_window, "fleet-cache-stores")
+
+    def __getattr__(self, name):
+        if self.local is None:
+            raise AttributeError(name)
+        return getattr(self.local, name)
+
+    def _send_lookups(self, prompts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        res = self.session.post(f"{self.base_url}/api/fleet_cache/lookup", json={"prompts": prompts},
+                                timeout=max(self.timeout * 4, 2.0))
+        res.raise_for_status()
+        return res.json()["results"]
+
+    def _send_stores(self, entries: List[Dict[str, str]]) -> List[bool]:
+        res = self.session.post(f"{self.base_url}/api/fleet_cache/store", json={"entries": entries},
+                                timeout=max(self.timeout * 4, 2.0))
+        res.raise_for_status()
+        return [True] * len(entries)
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.remote_stats[stat] += 1
+
+    def _local_lookup(self, prompt: str):
+        self._count("remote_fallbacks")
+        return self.local.lookup(prompt) if self.local is not None else None
+
+    def lookup(self, prompt: str):
+        future = self._lookups.submit(prompt)
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning(f"Fleet cache lookup timed out after {self.timeout}s, using local cache")
+            return self._local_lookup(prompt)
+        except Exception as e:
+            logger.warning(f"Fleet cache lookup failed ({e}), using local cache")
+            return self._local_lookup(prompt)
+
+        if result and result.get("response"):
+            self._count("remote_hits")
+            return result
+        self._count("remote_misses")
+        return None
+
+    def lookup_many(self, prompts: List[str]):
+        return [self.lookup(prompt) for prompt in prompts]
+
+    def add(self, prompt: str, response: str):
+        if self.local is not None:
+            self.local.add(prompt, response)
+        future = self._stores.submit({"prompt": prompt, "response": response})
+        future.add_done_callback(self._store_done)
+
+    def _store_done(self, future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            self._count("remote_store_errors")
+            logger.warning(f"Failed to push entry to fleet cache: {future.exception()}")
+
+    def get_stats(self):
+        stats = self.local.get_stats() if self.local is not None else {"enabled": True}
+        with self._stats_lock:
+            stats.update(self.remote_stats)
+        return stats
+
+    def size(self):
+        return self.local.size() if self.local is not None else 0
+
+    def clear(self):
+        # Only the local copy; the fleet cache is shared with other orchestrators
+        if self.local is not None:
+            self.local.clear()
+
+    @property
+    def ttl_seconds(self):
+        return self.local.ttl_seconds if self.local is not None else 3600
+
+    @ttl_seconds.setter
+    def ttl_seconds(self, value):
+        if self.local is not None:
+            self.local.ttl_seconds = value
+
+    @property
+    def similarity_threshold(self):
+        return self.local.similarity_threshold if self.local is not None else 0.8
+
+    @similarity_threshold.setter
+    def similarity_threshold(self, value):
+        if self.local is not None:
+            self.local.similarity_threshold = value
@@ -0,0 +1,311 @@
+"""
+Segmented Index - LSM-style vector index for the semantic cache
+New vectors go into a small flat "memtable" segment, so an insert never retrains anything.
+Full memtables are frozen into immutable segments; a background compactor merges frozen
+segments into trained IVF segments, dropping deleted rows as it goes. Deletes are
+tombstones until their segment is rewritten. A search queries every segment and merges
+the results, so it scans the memtable plus a few IVF cells per segment rather than every vector.
+
+Vectors are identified by caller-chosen int64 ids.
+"""
+
+import math
+import logging
+import threading
+from typing import Dict, Any, List, Iterable
+
+import numpy as np
+import faiss
+
+logger = logging.getLogger("segmented_index")
+
+
+def _flat_contents(index) -> np.ndarray:
+    # Vectors of an IndexIDMap(IndexFlatL2), in insertion order
+    return index.index.reconstruct_n(0, index.ntotal)
+
+
+def _flat_ids(index) -> np.ndarray:
+    return faiss.vector_to_array(index.id_map).astype(np.int64)
+
+
+class Segment:
+    """
+    Immutable set of vectors with a flat or IVF faiss index over them.
+    The vectors live only in the faiss index; contents() reads them back for compaction.
+    """
+
+    def __init__(self, dimension: int, vectors: np.ndarray, ids: np.ndarray, nprobe: int = 16,
+                 min_ivf_rows: int = 4096):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, dimension)
+        self.dimension = dimension
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.kind = "flat"
+        self._quantizer = None
+
+        count = len(self.ids)
+        if count >= min_ivf_rows:
+            # ~sqrt(n) lists, with enough points per list to train the centroids
+            nlist = max(1, min(int(math.sqrt(count)), count // 39))
+            self._quantizer = faiss.IndexFlatL2(dimension)
+            index = faiss.IndexIVFFlat(self._quantizer, dimension, nlist)
+            index.train(vectors)
+            index.nprobe = min(nprobe, nlist)
+            self.kind = "ivf"
+        else:
+            index = faiss.IndexIDMap(faiss.IndexFlatL2(dimension))
+        index.add_with_ids(vectors, self.ids)
+        self.index = index
+
+    def contents(self):
+        """
+        Read the stored vectors back out of the index.
+
+        Returns:
+            (vectors, ids) in the index's storage order
+        """
+        if self.kind == "flat":
+            return _flat_contents(self.index), _flat_ids(self.index)
+        invlists = self.index.invlists
+        vectors, ids = [], []
+        for list_no in range(self.index.nlist):
+            size = invlists.list_size(list_no)
+            if not size:
+                continue
+            codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size)
+            vectors.append(np.frombuffer(codes, dtype=np.float32).reshape(size, self.dimension).copy())
+            ids.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).astype(np.int64))
+        if not ids:
+            return np.zeros((0, self.dimension), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return np.vstack(vectors), np.concatenate(ids)
+
+    def search(self, queries: np.ndarray, k: int, selector=None):
+        """faiss search, skipping ids the selector rejects"""
+        if selector is None:
+            return self.index.search(queries, k)
+        if self.kind == "ivf":
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=self.index.nprobe)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return self.index.search(queries, k, params=params)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class SegmentedIndex:
+    """
+    Vector index with O(1) appends, tombstone deletes and merged search across segments.
+    """
+
+    def __init__(self, dimension: int, memtable_size: int = 4096, max_segments: int = 4,
+                 min_ivf_rows: int = 4096, nprobe: int = 16, max_deleted_ratio: float = 0.25,
+                 background: bool = True):
+        """
+        Initialize an empty index.
+
+        Args:
+            dimension: Vector dimension
+            memtable_size: Rows in the mutable segment before it is frozen
+            max_segments: Immutable segments allowed before the compactor merges them
+            min_ivf_rows: Segments smaller than this stay flat instead of training IVF
+            nprobe: IVF lists searched per segment
+            max_deleted_ratio: Tombstoned fraction that makes a segment worth rewriting
+            background: Compact in a background thread (otherwise compact() must be called)
+        """
+        self.dimension = dimension
+        self.memtable_size = memtable_size
+        self.max_segments = max_segments
+        self.min_ivf_rows = min_ivf_rows
+        self.nprobe = nprobe
+        self.max_deleted_ratio = max_deleted_ratio
+        self.background = background
+
+        self._lock = threading.Lock()  # guards the segment list, memtable and tombstones
+        self._compact_lock = threading.Lock()  # one compaction at a time
+        self._thread_lock = threading.Lock()  # guards starting and retiring the compactor thread
+        self._wake = threading.Event()
+        self._thread = None
+        self.compactions = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        self._memtable = faiss.IndexIDMap(faiss.IndexFlatL2(self.dimension))
+        self._segments: List[Segment] = []
+        self._tombstones = set()
+        self._excluded = None  # (selector, batch) rejecting tombstoned ids; rebuilt after they change
+        self._live = 0
+
+    @property
+    def ntotal(self) -> int:
+        return self._live
+
+    def add(self, vectors, ids):
+        """Append vectors; ids must not already be live in the index"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        ids = np.ascontiguousarray(ids, dtype=np.int64).reshape(-1)
+        frozen = False
+        with self._lock:
+            start = 0
+            while start < len(ids):
+                room = self.memtable_size - self._memtable.ntotal
+                end = min(len(ids), start + room)
+                self._memtable.add_with_ids(vectors[start:end], ids[start:end])
+                start = end
+                if self._memtable.ntotal >= self.memtable_size:
+                    self._freeze()
+                    frozen = True
+            self._live += len(ids)
+        if frozen and self.background:
+            self._schedule()
+
+    def _freeze(self):
+        # Caller holds self._lock; the frozen memtable becomes a flat segment until compacted
+        self._segments.append(Segment(self.dimension, _flat_contents(self._memtable), _flat_ids(self._memtable),
+                                      min_ivf_rows=self.memtable_size + 1))
+        self._memtable = faiss.IndexIDMap(faiss.IndexFlatL2(self.dimension))
+
+    def remove(self, ids: Iterable[int]):
+        """Tombstone ids; they stop matching immediately and are dropped at the next compaction"""
+        with self._lock:
+            for vector_id in ids:
+                vector_id = int(vector_id)
+                if vector_id not in self._tombstones:
+                    self._tombstones.add(vector_id)
+                    self._excluded = None
+                    self._live -= 1
+        if self.background and len(self._tombstones) > self.max_deleted_ratio * max(self._live, 1):
+            self._schedule()
+
+    def reset(self):
+        with self._compact_lock, self._lock:
+            self._reset_state()
+
+    def _selector(self):
+        # Caller holds self._lock
+        if self._excluded is None and self._tombstones:
+            batch = faiss.IDSelectorBatch(np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones)))
+            # The batch is kept alongside the selector wrapping it, which doesn't own it
+            self._excluded = (faiss.IDSelectorNot(batch), batch)
+        return self._excluded[0] if self._excluded is not None else None
+
+    def search(self, queries, k: int = 1):
+        """
+        Nearest live vectors across all segments.
+
+        Returns:
+            (distances, ids) arrays of shape (n, k), padded with inf / -1 like faiss
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        with self._lock:
+            segments = list(self._segments)
+            # Tombstoned ids are skipped inside faiss, so every segment returns k live rows
+            selector = self._selector()
+            candidates = []
+            # The memtable is the only mutable index, so only its search needs the lock
+            if self._memtable.ntotal:
+                params = faiss.SearchParameters(sel=selector) if selector is not None else None
+                candidates.append(self._memtable.search(queries, min(k, self._memtable.ntotal), params=params))
+        for segment in segments:
+            candidates.append(segment.search(queries, min(k, len(segment)), selector))
+
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            merged = []
+            for D, I in candidates:
+                for distance, vector_id in zip(D[row], I[row]):
+                    if vector_id >= 0:
+                        merged.append((float(distance), int(vector_id)))
+            merged.sort()
+            for column, (distance, vector_id) in enumerate(merged[:k]):
+                distances[row, column] = distance
+                labels[row, column] = vector_id
+        return distances, labels
+
+    # Compaction
+
+    def _schedule(self):
+        with self._thread_lock:
+            self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._compact_loop, name="index-compactor", daemon=True)
+                self._thread.start()
+
+    def _compact_loop(self):
+        while True:
+            if not self._wake.wait(timeout=60):
+                # Idle: retire, unless a wake arrived since; _schedule() starts a new thread after this
+                with self._thread_lock:
+                    if not self._wake.is_set():
+                        self._thread = None
+                        return
+            self._wake.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Index compaction failed: {e}")
+
+    def _pick_segments(self) -> List[Segment]:
+        with self._lock:
+            segments = list(self._segments)
+            tombstones = np.fromiter(self._tombstones, dtype=np.int64, count=len(self._tombstones))
+        # Segments with many deleted rows are rewritten
+        picked = [s for s in segments
+                  if len(tombstones) and np.isin(s.ids, tombstones).sum() > self.max_deleted_ratio * len(s)]
+        rewrite = bool(picked)
+        rest = sorted((s for s in segments if s not in picked), key=len)
+        # Frozen memtables are merged into one trained segment as soon as there are two
+        flat = [s for s in rest if s.kind == "flat"]
+        if len(flat) > 1:
+            picked += flat
+            rest = [s for s in rest if s.kind != "flat"]
+        # Then fold in the smallest segments until at most max_segments remain
+        while rest and len(rest) + (1 if picked else 0) > self.max_segments:
+            picked.append(rest.pop(0))
+        return picked if rewrite or len(picked) > 1 else []
+
+    def compact(self) -> bool:
+        """
+        Merge segments and purge tombstoned rows. Searches keep running meanwhile.
+
+        Returns:
+            True if anything was rewritten
+        """
+        with self._compact_lock:
+            picked = self._pick_segments()
+            if not picked:
+                return False
+            with self._lock:
+                dropped = set(self._tombstones)
+            contents = [s.contents() for s in picked]
+            vectors = np.vstack([segment_vectors for segment_vectors, _ in contents])
+            ids = np.concatenate([segment_ids for _, segment_ids in contents])
+            keep = ~np.isin(ids, list(dropped)) if dropped else np.ones(len(ids), dtype=bool)
+            merged = None
+            if keep.any():
+                merged = Segment(self.dimension, vectors[keep], ids[keep], self.nprobe, self.min_ivf_rows)
+
+            with self._lock:
+                self._segments = [s for s in self._segments if s not in picked]
+                if merged is not None:
+                    self._segments.append(merged)
+                # Tombstones for rows that no longer exist anywhere can go
+                purged = set(ids[~keep].tolist())
+                self._tombstones = self._tombstones - purged
+                self._excluded = None
+            self.compactions += 1
+            logger.info(f"Compacted {len(picked)} segments into "
+                        f"{f'a {merged.kind} segment of {len(merged)} rows' if merged else 'nothing'}, "
+                        f"purged {len(purged)} deleted rows")
+            return True
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "live": self._live,
+                "memtable": self._memtable.ntotal,
+                "segments": [{"kind": s.kind, "rows": len(s)} for s in self._segments],
+                "tombstones": len(self._tombstones),
+                "compactions": self.compactions,
+            }
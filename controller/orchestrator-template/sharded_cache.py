@@ -0,0 +1,409 @@
+"""
+Sharded Cache - Semantic cache partitioned across several cache daemons
+Entries are placed on nodes with a consistent-hash ring keyed by the prompt hash, so adding
+or removing a node only moves the entries whose ring segment changed. Similar prompts can
+live on any node, so a lookup has the prompt encoded once (by the node that owns its hash),
+searches every node in parallel with that vector, and merges the nodes' top-k candidates.
+
+Start a local test deployment (one daemon process per node) with:
+    python sharded_cache.py --nodes 4 --base-port 7101 --cache-dir ./cache/shards
+and point the cache manager at it with "shard_addresses": ["127.0.0.1:7101", ...].
+"""
+
+import os
+import sys
+import bisect
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from cache_daemon import CacheDaemonClient, EXPORT_PAGE_SIZE
+
+logger = logging.getLogger("sharded_cache")
+
+
+def _ring_position(key: str) -> int:
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+
+class ConsistentHashRing:
+    """
+    Hash ring with virtual nodes so keys spread evenly over a small number of nodes.
+    """
+
+    def __init__(self, nodes: Optional[List[str]] = None, vnodes: int = 64):
+        self.vnodes = vnodes
+        self._positions: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes or []:
+            self.add_node(node)
+
+    def add_node(self, node: str):
+        for replica in range(self.vnodes):
+            position = _ring_position(f"{node}#{replica}")
+            index = bisect.bisect(self._positions, position)
+            self._positions.insert(index, position)
+            self._owners.insert(index, node)
+
+    def copy(self) -> "ConsistentHashRing":
+        ring = ConsistentHashRing(vnodes=self.vnodes)
+        ring._positions = list(self._positions)
+        ring._owners = list(self._owners)
+        return ring
+
+    def remove_node(self, node: str):
+        keep = [i for i, owner in enumerate(self._owners) if owner != node]
+        self._positions = [self._positions[i] for i in keep]
+        self._owners = [self._owners[i] for i in keep]
+
+    def node_for(self, key: str) -> str:
+        if not self._positions:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._positions, _ring_position(key)) % len(self._positions)
+        return self._owners[index]
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners))
+
+
+class ShardedCacheClient:
+    """
+    Cache client with the SemanticCache interface used by CacheAdapter, backed by one
+    CacheDaemonClient per node.
+    """
+
+    def __init__(self, addresses: List[str], vnodes: int = 64, timeout: float = 5.0, top_k: int = 3):
+        """
+        Connect to every node.
+
+        Args:
+            addresses: Cache daemon addresses ('host:port' or 'unix:/path')
+            vnodes: Virtual nodes per address on the hash ring
+            timeout: Per-node socket timeout in seconds
+            top_k: Candidates each node returns per search
+        """
+        if not addresses:
+            raise ValueError("A sharded cache needs at least one node")
+        self.timeout = timeout
+        self.top_k = top_k
+        self.enabled = True
+        self.nodes: Dict[str, CacheDaemonClient] = {}
+        self.ring = ConsistentHashRing(vnodes=vnodes)
+        self._lock = threading.RLock()
+        # Held for a whole add_node/remove_node so rebalances don't interleave; lookups never take it
+        self._rebalance_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(4, len(addresses) * 2), thread_name_prefix="shard-fanout")
+        self.node_errors: Dict[str, int] = {}
+        self.stats = {"hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+        for address in addresses:
+            self._connect(address)
+
+        first = next(iter(self.nodes.values()))
+        self.model_name = first.model_name
+        self.dimension = first.dimension
+
+    def _open(self, address: str) -> CacheDaemonClient:
+        client = CacheDaemonClient(address, timeout=self.timeout)
+        if self.nodes:
+            existing = next(iter(self.nodes.values()))
+            if (client.model_name, client.dimension) != (existing.model_name, existing.dimension):
+                raise ValueError(
+                    f"Node {address} uses {client.model_name} ({client.dimension}d), "
+                    f"shard uses {existing.model_name} ({existing.dimension}d)"
+                )
+        self.node_errors.setdefault(address, 0)
+        return client
+
+    def _connect(self, address: str):
+        self.nodes[address] = self._open(address)
+        self.ring.add_node(address)
+
+    @staticmethod
+    def _hash_prompt(prompt: str) -> str:
+        # Same key SemanticCache stores entries under
+        return hashlib.sha256(prompt.encode()).hexdigest()
+
+    def _fan_out(self, call):
+        """Run call(client) on every node in parallel; failed nodes yield None"""
+        with self._lock:
+            nodes = list(self.nodes.items())
+        futures = [(address, self._pool.submit(call, client)) for address, client in nodes]
+        results = []
+        for address, future in futures:
+            try:
+                results.append(future.result(timeout=self.timeout * 2))
+            except Exception as e:
+                self.node_errors[address] += 1
+                logger.warning(f"Cache node {address} failed: {e}")
+                results.append(None)
+        return results
+
+    def _embed(self, prompts: List[str]):
+        # Each prompt is encoded once, by the node owning its hash so the encode load spreads;
+        # if that node fails the others are tried in turn
+        with self._lock:
+            nodes = dict(self.nodes)
+            groups: Dict[str, List[int]] = {}
+            for i, prompt in enumerate(prompts):
+                groups.setdefault(self.ring.node_for(self._hash_prompt(prompt)), []).append(i)
+
+        def encode(owner: str, rows: List[int]):
+            for address in [owner] + [address for address in nodes if address != owner]:
+                try:
+                    return nodes[address].embed_many([prompts[i] for i in rows])
+                except Exception as e:
+                    self.node_errors[address] += 1
+                    logger.warning(f"Cache node {address} failed to embed: {e}")
+            raise ConnectionError("No cache node could embed the prompts")
+
+        futures = [(rows, self._pool.submit(encode, owner, rows)) for owner, rows in groups.items()]
+        vectors = [None] * len(prompts)
+        for rows, future in futures:
+            for i, vector in zip(rows, future.result()):
+                vectors[i] = vector
+        return vectors
+
+    def search_many(self, prompts: List[str], k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Nearest unexpired entries across all nodes for each prompt.
+
+        Args:
+            prompts: Prompts to search for
+            k: Candidates per prompt (defaults to top_k)
+
+        Returns:
+            One list per prompt of up to k entries (each with its similarity), most similar first
+        """
+        if not prompts:
+            return []
+        k = k or self.top_k
+        vectors = self._embed(prompts)
+        per_node = [results or [[] for _ in prompts]
+                    for results in self._fan_out(lambda client: client.search_many(vectors, k))]
+        return [
+            sorted((candidate for node in candidates for candidate in node),
+                   key=lambda candidate: candidate["similarity"], reverse=True)[:k]
+            for candidates in zip(*per_node)
+        ]
+
+    def lookup(self, prompt: str):
+        return self.lookup_many([prompt])[0]
+
+    def lookup_many(self, prompts: List[str]):
+        if not prompts:
+            return []
+        try:
+            merged = self.search_many(prompts)
+        except Exception as e:
+            logger.warning(f"Sharded lookup failed: {e}")
+            merged = [[] for _ in prompts]
+        threshold = self.similarity_threshold
+        results = []
+        for prompt, candidates in zip(prompts, merged):
+            best = candidates[0] if candidates and candidates[0]["similarity"] >= threshold else None
+            results.append({
+                "response": best["response"],
+                "similarity": best["similarity"],
+                "original_query": prompt,
+                "metadata": best.get("metadata", {}),
+            } if best else None)
+        with self._stats_lock:
+            hits = sum(result is not None for result in results)
+            self.stats["hits"] += hits
+            self.stats["misses"] += len(results) - hits
+        return results
+
+    def add(self, prompt: str, response: str):
+        self.add_many([(prompt, response)])
+
+    def add_many(self, items):
+        with self._lock:
+            groups: Dict[str, list] = {}
+            for prompt, response in items:
+                groups.setdefault(self.ring.node_for(self._hash_prompt(prompt)), []).append((prompt, response))
+            for address, group in groups.items():
+                self.nodes[address].add_many(group)
+
+    def size(self):
+        return sum(size or 0 for size in self._fan_out(lambda client: client.size()))
+
+    def get_stats(self):
+        with self._lock:
+            addresses = list(self.nodes)
+        node_stats = self._fan_out(lambda client: client.get_stats())
+        # Nodes only see vector searches, so hits and misses are counted here rather than summed
+        with self._stats_lock:
+            hits, misses = self.stats["hits"], self.stats["misses"]
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "cache_size": sum(stats.get("cache_size", 0) for stats in node_stats if stats),
+            "hit_count": hits,
+            "miss_count": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups > 0 else 0.0,
+            "total_saved_cost": round(sum(stats.get("total_saved_cost", 0.0) for stats in node_stats if stats), 6),
+            "status": f"✅ Sharded cache across {len(addresses)} nodes",
+            "nodes": {
+                address: {"cache_size": stats.get("cache_size") if stats else None, "errors": self.node_errors[address]}
+                for address, stats in zip(addresses, node_stats)
+            },
+        }
+
+    def clear(self):
+        self._fan_out(lambda client: client.clear())
+        with self._stats_lock:
+            self.stats = {"hits": 0, "misses": 0}
+
+    def iter_entries(self):
+        with self._lock:
+            clients = list(self.nodes.values())
+        for client in clients:
+            yield from client.iter_entries()
+
+    @staticmethod
+    def _copy_entries(source: CacheDaemonClient, keep_on: str, ring: ConsistentHashRing,
+                      nodes: Dict[str, CacheDaemonClient], after_seq: int = 0) -> Tuple[List[str], int]:
+        """
+        Copy entries off `source` whose owner on `ring` is no longer `keep_on`.
+
+        Returns:
+            (hashes copied, seq to resume from to pick up entries added since)
+        """
+        copied = []
+        while True:
+            page, after_seq = source.export_entries(after_seq, EXPORT_PAGE_SIZE)
+            groups: Dict[str, list] = {}
+            for entry in page:
+                owner = ring.node_for(entry["hash"])
+                if owner != keep_on:
+                    groups.setdefault(owner, []).append(entry)
+            for owner, entries in groups.items():
+                nodes[owner].import_entries(entries)
+                copied.extend(entry["hash"] for entry in entries)
+            if len(page) < EXPORT_PAGE_SIZE:
+                return copied, after_seq
+
+    def add_node(self, address: str) -> int:
+        """
+        Add a node and move the entries it now owns onto it.
+
+        Entries are copied without holding the client lock; until the copy is done the old
+        ring routes adds and the old owners keep answering lookups.
+
+        Returns:
+            Number of entries moved
+        """
+        with self._rebalance_lock:
+            with self._lock:
+                if address in self.nodes:
+                    return 0
+                client = self._open(address)
+                sources = dict(self.nodes)
+                ring = self.ring.copy()
+                ring.add_node(address)
+            nodes = {**sources, address: client}
+            copies = {other: self._copy_entries(source, other, ring, nodes) for other, source in sources.items()}
+            # add_many routes and sends under the lock, so no add goes by the old ring after this
+            with self._lock:
+                self.nodes[address] = client
+                self.ring = ring
+            moved = 0
+            for other, (copied, after_seq) in copies.items():
+                # Entries the old ring sent to `other` during the copy
+                copied += self._copy_entries(sources[other], other, ring, nodes, after_seq)[0]
+                if copied:
+                    sources[other].remove_many(copied)
+                moved += len(copied)
+            logger.info(f"Added cache node {address}; moved {moved} entries")
+            return moved
+
+    def remove_node(self, address: str) -> int:
+        """
+        Drain a node onto the remaining nodes and drop it from the ring.
+
+        The node keeps answering lookups until its entries have been copied; the client
+        lock is only held to swap the ring and drop the node.
+
+        Returns:
+            Number of entries moved
+        """
+        with self._rebalance_lock:
+            with self._lock:
+                if address not in self.nodes:
+                    return 0
+                if len(self.nodes) == 1:
+                    raise ValueError("Can't remove the last cache node")
+                client = self.nodes[address]
+                ring = self.ring.copy()
+                ring.remove_node(address)
+                targets = {other: node for other, node in self.nodes.items() if other != address}
+            copied, after_seq = self._copy_entries(client, address, ring, targets)
+            with self._lock:
+                self.ring = ring
+            # Entries the old ring sent to the node during the copy
+            copied += self._copy_entries(client, address, ring, targets, after_seq)[0]
+            with self._lock:
+                del self.nodes[address]
+            logger.info(f"Removed cache node {address}; moved {len(copied)} entries")
+            return len(copied)
+
+    def _configure_all(self, name: str, value):
+        with self._lock:
+            clients = list(self.nodes.values())
+        for client in clients:
+            setattr(client, name, value)
+
+    @property
+    def ttl_seconds(self):
+        return next(iter(self.nodes.values())).ttl_seconds
+
+    @ttl_seconds.setter
+    def ttl_seconds(self, value):
+        self._configure_all("ttl_seconds", value)
+
+    @property
+    def similarity_threshold(self):
+        return next(iter(self.nodes.values())).similarity_threshold
+
+    @similarity_threshold.setter
+    def similarity_threshold(self, value):
+        self._configure_all("similarity_threshold", value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local sharded cache: one cache daemon process per node")
+    parser.add_argument('--nodes', type=int, default=3, help='Number of cache nodes')
+    parser.add_argument('--base-port', type=int, default=7101, help='Port of the first node')
+    parser.add_argument('--cache-dir', default='./cache/shards', help='Parent directory for node caches')
+    parser.add_argument('--model', default='all-MiniLM-L6-v2', help='Embedding model')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Similarity threshold')
+    args = parser.parse_args()
+
+    daemon_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_daemon.py")
+    processes = []
+    for node in range(args.nodes):
+        address = f"127.0.0.1:{args.base_port + node}"
+        processes.append(subprocess.Popen([
+            sys.executable, daemon_script,
+            "--listen", address,
+            "--cache-dir", os.path.join(args.cache_dir, f"node{node}"),
+            "--model", args.model,
+            "--threshold", str(args.threshold),
+        ]))
+        print(address)
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
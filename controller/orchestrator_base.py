@@ -0,0 +1,137 @@
+"""
+Orchestrator Base - Prebuilt orchestrator executable shared by every download
+The orchestrator is compiled with PyInstaller once per template version (a hash of the
+template sources and build options) instead of once per download, and kept in a
+content-addressed ArtifactCache. Per-download settings (name, controller URL, heartbeat
+interval) go into a small JSON sidecar next to the executable, which orchestrator.py
+reads at startup.
+
+Build the base ahead of time (e.g. in the Docker image) with:
+    python orchestrator_base.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Dict, Any, Optional
+
+from artifact_cache import ArtifactCache, artifact_key
+
+logger = logging.getLogger("orchestrator_base")
+
+TEMPLATE_DIR = './orchestrator-template'
+ARTIFACT_DIR = './orchestrator_dist/artifacts'
+BUILD_DIR = './orchestrator_dist/build'
+EXECUTABLE_NAME = "orchestrator_build"
+EXECUTABLE_SUFFIX = ".bin"
+CONFIG_FILENAME = "orchestrator_config.json"
+PYINSTALLER_OPTIONS = ["--onefile", "--clean", "--noconsole"]
+
+# Generated by the old per-download build; not part of the template
+_IGNORED_SOURCES = {"orchestrator_build.py"}
+
+_build_lock = threading.Lock()
+
+
+def template_version(template_dir: str = TEMPLATE_DIR) -> str:
+    """Hash of the template's Python sources and requirements"""
+    digest = hashlib.sha256()
+    for filename in sorted(os.listdir(template_dir)):
+        if filename in _IGNORED_SOURCES or not (filename.endswith(".py") or filename == "requirements.txt"):
+            continue
+        digest.update(filename.encode("utf-8") + b"\0")
+        with open(os.path.join(template_dir, filename), "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def executable_cache(root: str = ARTIFACT_DIR, max_bytes: int = 2 * 1024 ** 3) -> ArtifactCache:
+    return ArtifactCache(root, max_bytes=max_bytes, suffix=EXECUTABLE_SUFFIX)
+
+
+def base_executable_key(template_dir: str = TEMPLATE_DIR) -> str:
+    return artifact_key(template_version(template_dir), PYINSTALLER_OPTIONS)
+
+
+def cached_base_executable(artifacts: ArtifactCache, template_dir: str = TEMPLATE_DIR) -> Optional[str]:
+    """Path of the base executable for the current template if it has been built"""
+    return artifacts.get(base_executable_key(template_dir))
+
+
+def ensure_base_executable(artifacts: ArtifactCache, template_dir: str = TEMPLATE_DIR,
+                           work_root: str = BUILD_DIR) -> str:
+    """
+    Path of the base executable for the current template, building it if needed.
+
+    Args:
+        artifacts: Cache the executable is stored in
+        template_dir: Directory holding orchestrator.py and its modules
+        work_root: Where PyInstaller's scratch directory is created (same filesystem as the cache)
+
+    Returns:
+        Path of the executable
+    """
+    key = base_executable_key(template_dir)
+    executable_path = artifacts.get(key, count=False)
+    if executable_path is not None:
+        return executable_path
+
+    with _build_lock:
+        executable_path = artifacts.get(key, count=False)
+        if executable_path is not None:
+            return executable_path
+        os.makedirs(work_root, exist_ok=True)
+        work_dir = tempfile.mkdtemp(dir=work_root, prefix="build-")
+        try:
+            logger.info(f"Building orchestrator base executable {key[:12]}")
+            subprocess.run([
+                "pyinstaller",
+                *PYINSTALLER_OPTIONS,
+                "--distpath", os.path.join(work_dir, "dist"),
+                "--workpath", os.path.join(work_dir, "build"),
+                "--specpath", work_dir,
+                "--name", EXECUTABLE_NAME,
+                os.path.abspath(os.path.join(template_dir, "orchestrator.py"))
+            ], check=True)
+            built = os.path.join(work_dir, "dist", EXECUTABLE_NAME)
+            if not os.path.exists(built):
+                raise FileNotFoundError("orchestrator_build not found!")
+            # Moved in whole, so a cached executable is always a complete one
+            return artifacts.put(key, built)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def orchestrator_config(name: str, controller_url: str = None, interval: int = None,
+                        token: str = None) -> Dict[str, Any]:
+    """Sidecar settings for one download; keys left out fall back to the orchestrator's defaults"""
+    config = {"name": name}
+    if controller_url:
+        config["controller"] = controller_url
+    if interval:
+        config["interval"] = int(interval)
+    if token:
+        config["token"] = token
+    return config
+
+
+def config_bytes(config: Dict[str, Any]) -> bytes:
+    return json.dumps(config, indent=2).encode("utf-8")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    template_dir = sys.argv[1] if len(sys.argv) > 1 else TEMPLATE_DIR
+    path = ensure_base_executable(executable_cache(), template_dir)
+    print(f"[INFO] Orchestrator base executable at {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,58 +4,213 @@ import json
 from typing import Callable, Coroutine, Any
 import numpy as np
 from sentence_transformers import SentenceTransformer
-import faiss
+import copy
 import hashlib
+import bisect
 import datetime
+import threading
+import time
+from cache_snapshot import write_snapshot, read_snapshot
+from rwlock import RWLock
+from segmented_index import SegmentedIndex
+from lexical_sketch import LexicalSketchIndex
+from dim_reduction import build_reducer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("semantic_cache")
 
+# Upper bounds (in words) of the length buckets used for batching and encode-time metrics
+LENGTH_BUCKETS = (16, 32, 64, 128, 256, 512)
+# Dead seq log positions tolerated on top of one per live entry before the log is compacted
+SEQ_LOG_SLACK = 1024
+
 
 class SemanticCache:
-    def __init__(self, model_name="all-MiniLM-L6-v2", cache_path="./semantic_cache", enabled=True, ttl_seconds=3600):
+    def __init__(self, model_name="all-MiniLM-L6-v2", cache_path="./semantic_cache", enabled=True, ttl_seconds=3600,
+                 similarity_threshold=0.8, sketch_threshold=0.9, sketch_hit_threshold=0.95, chunk_words=None,
+                 max_chunks=8, encode_batch_size=32, reduction=None):
         self.model_name = model_name
         self.cache_path = cache_path
         self.enabled = enabled
         self.logger = logger
         self.ttl_seconds = ttl_seconds  # ⏳ TTL in seconds (default 1 hour)
+        self.similarity_threshold = similarity_threshold
+        # Near-duplicate prompts (shingle Jaccard >= sketch_threshold) are candidates alongside the
+        # index's nearest neighbour, and need embedding similarity >= similarity_threshold to hit.
+        # A match at sketch_hit_threshold (and similarity_threshold) is answered without encoding
+        self.sketch_threshold = sketch_threshold
+        self.sketch_hit_threshold = sketch_hit_threshold
+        self.sketch = LexicalSketchIndex() if sketch_threshold else None
+
+        # Prompts longer than chunk_words are embedded as the weighted mean of their chunks;
+        # at most max_chunks (spread over the prompt) are encoded, which caps the cost of huge prompts
+        self.chunk_words = chunk_words
+        self.max_chunks = max_chunks
+        self.encode_batch_size = encode_batch_size
+        self.encode_stats = {}  # bucket label -> {"texts", "batches", "seconds", "max_batch_seconds"}
+        self.long_prompt_stats = {"chunked": 0, "capped": 0}
+
+        # Optional 'pca:<dim>' or 'truncate:<dim>': the index holds reduced vectors, but entries keep their
+        # full embeddings (hit decisions, exports and replication use them), so only the index shrinks
+        self.reduction = reduction
+        self.reducer = None
 
         self.cache = {}  # dict: hash -> {prompt, embedding, response, metadata, timestamp}
         self.index = None
-        self.id_map = {}
+        self.id_map = {}  # index id -> hash
+        self._hash_ids = {}  # hash -> index id
+        self._next_id = 0
         self.stats = {
             "hits": 0,
             "misses": 0,
             "saved_cost": 0.0,
         }
 
+        # Every insert gets the next sequence number so peers can pull what changed since a point
+        self.last_seq = 0
+        self._seq_log = []  # ascending seq numbers
+        self._seq_hashes = []  # hash key recorded at the same position
+
+        # cache/index/id_map/seq log are guarded by the RW lock; stats by their own small lock
+        self._lock = RWLock()
+        self._stats_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._fit_lock = threading.Lock()
+
         os.makedirs(self.cache_path, exist_ok=True)
         self._init_model()
         self._load_cache()
+        self._maybe_fit_reducer()
 
     def _init_model(self):
         try:
             self.model = SentenceTransformer(self.model_name)
             self.dimension = self.model.get_sentence_embedding_dimension()
-            self.index = faiss.IndexFlatL2(self.dimension)
+            if self.chunk_words is None:
+                # ~1.3 tokens per English word, so chunks stay under the model's truncation point
+                self.chunk_words = max(8, int((getattr(self.model, "max_seq_length", None) or 256) / 1.3))
+            if self.reduction:
+                self.reducer = build_reducer(self.reduction, self.dimension,
+                                             os.path.join(self.cache_path, "reducer.npz"))
+            self.index = SegmentedIndex(self._index_dimension())
             self.logger.info(f"✅ Semantic cache initialized with model {self.model_name}")
         except Exception as e:
             self.logger.error(f"❌ Failed to load embedding model: {e}")
             raise e
 
     def _get_embedding(self, prompt: str):
-        return self.model.encode(prompt)
+        return self._get_embeddings([prompt])[0]
+
+    def _chunk_prompt(self, prompt: str):
+        words = prompt.split()
+        if len(words) <= self.chunk_words:
+            return [prompt], [max(len(words), 1)]
+        starts = list(range(0, len(words), self.chunk_words))
+        capped = len(starts) > self.max_chunks
+        if capped:
+            # Keep chunks spread over the whole prompt, always including the first and last
+            picks = np.unique(np.linspace(0, len(starts) - 1, self.max_chunks).round().astype(int))
+            starts = [starts[i] for i in picks]
+        chunks = [words[start:start + self.chunk_words] for start in starts]
+        with self._stats_lock:
+            self.long_prompt_stats["chunked"] += 1
+            self.long_prompt_stats["capped"] += int(capped)
+        return [" ".join(chunk) for chunk in chunks], [len(chunk) for chunk in chunks]
+
+    @staticmethod
+    def _length_bucket(words: int) -> str:
+        for bound in LENGTH_BUCKETS:
+            if words <= bound:
+                return f"<={bound}"
+        return f">{LENGTH_BUCKETS[-1]}"
+
+    def _get_embeddings(self, prompts):
+        texts, weights, owners = [], [], []
+        for i, prompt in enumerate(prompts):
+            chunks, chunk_weights = self._chunk_prompt(prompt)
+            texts.extend(chunks)
+            weights.extend(chunk_weights)
+            owners.extend([i] * len(chunks))
+
+        # Texts of similar length are encoded together so batches carry little padding
+        buckets = {}
+        for j, words in enumerate(weights):
+            buckets.setdefault(self._length_bucket(words), []).append(j)
+        encoded = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for label, rows in buckets.items():
+            start = time.perf_counter()
+            encoded[rows] = self.model.encode([texts[j] for j in rows], batch_size=self.encode_batch_size)
+            self._record_encode(label, len(rows), time.perf_counter() - start)
+
+        if len(texts) == len(prompts):
+            return encoded
+
+        # Pool chunk embeddings per prompt, weighted by chunk length, keeping the chunks' scale
+        owners = np.array(owners)
+        weights = np.array(weights, dtype=np.float32)
+        embeddings = np.zeros((len(prompts), self.dimension), dtype=np.float32)
+        for i in range(len(prompts)):
+            rows = np.flatnonzero(owners == i)
+            if len(rows) == 1:
+                embeddings[i] = encoded[rows[0]]
+                continue
+            pooled = np.average(encoded[rows], axis=0, weights=weights[rows])
+            norm = np.linalg.norm(pooled)
+            if norm > 0:
+                pooled *= np.linalg.norm(encoded[rows], axis=1).mean() / norm
+            embeddings[i] = pooled
+        return embeddings
+
+    def _record_encode(self, label: str, texts: int, seconds: float):
+        with self._stats_lock:
+            bucket = self.encode_stats.setdefault(
+                label, {"texts": 0, "batches": 0, "seconds": 0.0, "max_batch_seconds": 0.0}
+            )
+            bucket["texts"] += texts
+            bucket["batches"] += 1
+            bucket["seconds"] += seconds
+            bucket["max_batch_seconds"] = max(bucket["max_batch_seconds"], seconds)
 
     def _hash_prompt(self, prompt: str):
         return hashlib.sha256(prompt.encode()).hexdigest()
 
+    def _compact_seq_log(self):
+        # Caller holds the write lock. Each live entry's own "seq" marks its one current position,
+        # so positions superseded by a later write or left by a removal are dropped once they
+        # outnumber the live ones
+        if len(self._seq_log) < 2 * len(self.cache) + SEQ_LOG_SLACK:
+            return
+        live = [(seq, hash_key) for seq, hash_key in zip(self._seq_log, self._seq_hashes)
+                if (self.cache.get(hash_key) or {}).get("seq") == seq]
+        self._seq_log = [seq for seq, _ in live]
+        self._seq_hashes = [hash_key for _, hash_key in live]
+
+    def _record_seq(self, hash_key: str, entry: dict):
+        # Caller holds the write lock
+        self._compact_seq_log()
+        self.last_seq += 1
+        entry["seq"] = self.last_seq
+        self._seq_log.append(self.last_seq)
+        self._seq_hashes.append(hash_key)
+
+    def _count(self, stat: str, amount=1):
+        with self._stats_lock:
+            self.stats[stat] = self.stats.get(stat, 0) + amount
+
     def _save_cache(self):
-        with open(os.path.join(self.cache_path, "cache.json"), "w") as f:
-            json.dump(self.cache, f, indent=2)
-        faiss.write_index(self.index, os.path.join(self.cache_path, "index.faiss"))
-        with open(os.path.join(self.cache_path, "stats.json"), "w") as f:
-            json.dump(self.stats, f)
-        self.logger.info(f"Saved cache with {len(self.cache)} entries")
+        # Must be called without holding the RW lock. Only the shallow copy happens under it:
+        # entries are replaced, never modified, once they're in the cache, so the copy can be
+        # written out while adds and lookups carry on
+        with self._save_lock:
+            with self._lock.read_locked():
+                cache = dict(self.cache)
+            with self._stats_lock:
+                stats = dict(self.stats)
+            with open(os.path.join(self.cache_path, "cache.json"), "w") as f:
+                json.dump(cache, f, indent=2)
+            with open(os.path.join(self.cache_path, "stats.json"), "w") as f:
+                json.dump(stats, f)
+        self.logger.info(f"Saved cache with {len(cache)} entries")
 
     def _load_cache(self):
         try:
@@ -64,17 +219,22 @@ class SemanticCache:
                 with open(data_file, "r") as f:
                     self.cache = json.load(f)
 
-                embeddings = []
-                for hash_key, item in self.cache.items():
-                    embeddings.append(np.array(item["embedding"], dtype=np.float32))
-                    self.id_map[len(self.id_map)] = hash_key
+                # The index is rebuilt from the stored embeddings rather than persisted
+                if self.cache:
+                    embeddings = np.array([item["embedding"] for item in self.cache.values()], dtype=np.float32)
+                    self._index_add(list(self.cache.keys()), embeddings)
 
-                if embeddings:
-                    embeddings = np.vstack(embeddings).astype(np.float32)
-                    self.index.add(embeddings)
+                # Entries saved before sequence numbers existed are numbered after the rest
+                for hash_key, item in sorted(self.cache.items(), key=lambda kv: kv[1].get("seq") or float("inf")):
+                    if item.get("seq"):
+                        self.last_seq = item["seq"]
+                        self._seq_log.append(item["seq"])
+                        self._seq_hashes.append(hash_key)
+                    else:
+                        self._record_seq(hash_key, item)
 
                 self.logger.info(f"Loaded {len(self.cache)} cached responses")
-                self.logger.info(f"Loaded FAISS index with {self.index.ntotal} entries")
+                self.logger.info(f"Loaded index with {self.index.ntotal} entries")
 
             stats_file = os.path.join(self.cache_path, "stats.json")
             if os.path.exists(stats_file):
@@ -90,7 +250,21 @@ class SemanticCache:
         embedding_np = np.array([embedding]).astype(np.float32)
 
         hash_key = self._hash_prompt(prompt)
-        self.cache[hash_key] = {
+        self._insert(hash_key, self._new_entry(prompt, response, embedding), embedding_np)
+
+    def add_many(self, items):
+        # items: (prompt, response) pairs; one batched encode and a single save
+        if not items:
+            return
+        embeddings = self._get_embeddings([prompt for prompt, _ in items])
+        for (prompt, response), embedding in zip(items, embeddings):
+            self._insert(self._hash_prompt(prompt), self._new_entry(prompt, response, embedding),
+                         np.array([embedding]).astype(np.float32), save=False)
+        self._maybe_fit_reducer()
+        self._save_cache()
+
+    def _new_entry(self, prompt: str, response: str, embedding):
+        return {
             "prompt": prompt,
             "embedding": embedding.tolist(),
             "response": response,
@@ -98,68 +272,399 @@ class SemanticCache:
             "timestamp": datetime.datetime.now().isoformat()  # ⏳ Add timestamp
         }
 
-        self.index.add(embedding_np)
-        self.id_map[self.index.ntotal - 1] = hash_key
+    def _index_dimension(self):
+        if self.reducer is not None and self.reducer.fitted:
+            return self.reducer.output_dim
+        return self.dimension
+
+    def _index_vectors(self, vectors):
+        # Until a PCA reducer has been fitted the index holds full-dimension vectors
+        if self.reducer is not None and self.reducer.fitted:
+            return self.reducer.transform(vectors)
+        return vectors
+
+    def _maybe_fit_reducer(self):
+        if self.reducer is None or self.reducer.fitted or self.size() < self.reducer.min_train_rows:
+            return
+        # The fit and the new index are built on a copy while lookups and inserts carry on;
+        # the write lock is only taken to swap them in
+        with self._fit_lock:
+            if self.reducer.fitted:
+                return
+            with self._lock.read_locked():
+                hash_keys = list(self.cache.keys())
+                vectors = np.array([self.cache[hash_key]["embedding"] for hash_key in hash_keys], dtype=np.float32)
+            reducer = copy.copy(self.reducer).fit(vectors)
+            index = SegmentedIndex(reducer.output_dim)
+            index.add(reducer.transform(vectors), np.arange(len(hash_keys), dtype=np.int64))
+
+            with self._lock.write_locked():
+                id_map = dict(enumerate(hash_keys))
+                hash_ids = {hash_key: vector_id for vector_id, hash_key in id_map.items()}
+                # Catch up with what changed while the fit ran
+                gone = [hash_key for hash_key in hash_keys if hash_key not in self.cache]
+                index.remove([hash_ids[hash_key] for hash_key in gone])
+                for hash_key in gone:
+                    del id_map[hash_ids.pop(hash_key)]
+                added = [hash_key for hash_key in self.cache if hash_key not in hash_ids]
+                next_id = len(hash_keys)
+                if added:
+                    ids = np.arange(next_id, next_id + len(added), dtype=np.int64)
+                    index.add(reducer.transform(np.array([self.cache[hash_key]["embedding"] for hash_key in added],
+                                                         dtype=np.float32)), ids)
+                    for vector_id, hash_key in zip(ids.tolist(), added):
+                        id_map[vector_id] = hash_key
+                        hash_ids[hash_key] = vector_id
+                    next_id += len(added)
+                self.reducer, self.index, self.id_map, self._hash_ids, self._next_id = (
+                    reducer, index, id_map, hash_ids, next_id
+                )
+            self.logger.info(f"Rebuilt index at {reducer.output_dim} dimensions")
+
+    def _index_add(self, hash_keys, vectors):
+        # Caller holds the write lock
+        ids = np.arange(self._next_id, self._next_id + len(hash_keys), dtype=np.int64)
+        self._next_id += len(hash_keys)
+        self.index.add(self._index_vectors(vectors), ids)
+        for vector_id, hash_key in zip(ids.tolist(), hash_keys):
+            self.id_map[vector_id] = hash_key
+            self._hash_ids[hash_key] = vector_id
+            if self.sketch is not None:
+                self.sketch.add(hash_key, self.cache[hash_key]["prompt"])
+
+    def _insert(self, hash_key: str, entry: dict, embedding_np, save: bool = True):
+        with self._lock.write_locked():
+            self._record_seq(hash_key, entry)
+            self.cache[hash_key] = entry
+            # Same hash means same prompt, so an existing entry keeps its vector
+            if hash_key not in self._hash_ids:
+                self._index_add([hash_key], embedding_np)
+        if save:
+            self._maybe_fit_reducer()
+            self._save_cache()
+
+    def _candidates(self, embedding_np, k: int):
+        # Up to k nearest entries as (similarity, entry), most similar first
+        with self._lock.read_locked():
+            if self.index.ntotal == 0:
+                return []
+            D, I = self.index.search(self._index_vectors(embedding_np), k=min(k, self.index.ntotal))
+            reduced = self.reducer is not None and self.reducer.fitted
+            candidates = []
+            for distance, vector_id in zip(D[0], I[0]):
+                best_hash = self.id_map.get(int(vector_id)) if vector_id >= 0 else None
+                cached = self.cache.get(best_hash) if best_hash else None
+                if cached is None:
+                    continue
+                if reduced:
+                    # Reduced distances run short, so the hit decision uses the full embeddings
+                    distance = np.sum((np.asarray(cached["embedding"], dtype=np.float32) - embedding_np[0]) ** 2)
+                candidates.append((1 / (1 + float(distance)), cached))
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates
+
+    def _search(self, embedding_np):
+        # Nearest entry as (similarity, entry), or (None, None) when the cache is empty
+        candidates = self._candidates(embedding_np, 1)
+        return candidates[0] if candidates else (None, None)
+
+    def embed_many(self, prompts):
+        """
+        Embed prompts without looking them up, so one encode can be searched against several caches.
+
+        Returns:
+            float32 array of shape (len(prompts), dimension)
+        """
+        if not prompts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return self._get_embeddings(prompts)
+
+    def search_many(self, embeddings, k: int = 1):
+        """
+        Nearest unexpired entries for each embedding. Hit/miss stats are left to the caller.
+
+        Args:
+            embeddings: Vectors from embed_many (of a cache using the same model)
+            k: Candidates per embedding
+
+        Returns:
+            One list of (similarity, entry) per embedding, most similar first
+        """
+        results = []
+        for embedding in embeddings:
+            candidates = self._candidates(np.asarray([embedding], dtype=np.float32), k)
+            results.append([(similarity, entry) for similarity, entry in candidates if not self._is_expired(entry)])
+        return results
+
+    def size(self):
+        return len(self.cache)
+
+    def export_snapshot(self, path: str):
+        items = list(self.iter_entries())
+        entries = []
+        vectors = np.zeros((len(items), self.dimension), dtype=np.float32)
+        for row, (hash_key, item) in enumerate(items):
+            vectors[row] = item["embedding"]
+            entries.append({
+                "hash": hash_key,
+                "prompt": item["prompt"],
+                "response": item["response"],
+                "metadata": item.get("metadata", {}),
+                "timestamp": item.get("timestamp"),
+            })
+        size = write_snapshot(path, self.model_name, self.dimension, entries, vectors)
+        self.logger.info(f"Exported snapshot with {len(entries)} entries ({size} bytes) to {path}")
+        return {"entries": len(entries), "bytes": size}
+
+    def import_snapshot(self, path: str):
+        header, entries, vectors = read_snapshot(path)
+        if header["model_name"] != self.model_name or header["dimension"] != self.dimension:
+            raise ValueError(
+                f"Snapshot was built with {header['model_name']} ({header['dimension']}d), "
+                f"cache uses {self.model_name} ({self.dimension}d)"
+            )
+
+        result = self.import_entries(entries, vectors)
+        self.logger.info(f"Imported snapshot {path}: {result['imported']} new entries, {result['cache_size']} total")
+        return result
+
+    def import_entries(self, entries, vectors):
+        # entries: dicts with hash/prompt/response/metadata/timestamp; vectors: float32[len(entries), dim]
+        # Keep whichever copy of an entry is newer; stored vectors are reused, no re-encoding
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(entries), self.dimension)
+        new_hashes = []
+        new_rows = []
+        with self._lock.write_locked():
+            for row, entry in enumerate(entries):
+                hash_key = entry["hash"]
+                existing = self.cache.get(hash_key)
+                if existing and existing.get("timestamp", "") >= (entry.get("timestamp") or ""):
+                    continue
+                item = {
+                    "prompt": entry["prompt"],
+                    "embedding": vectors[row].tolist(),
+                    "response": entry["response"],
+                    "metadata": entry.get("metadata", {}),
+                    "timestamp": entry.get("timestamp") or datetime.datetime.now().isoformat(),
+                }
+                if entry.get("origin"):
+                    item["origin"] = entry["origin"]
+                self._record_seq(hash_key, item)
+                self.cache[hash_key] = item
+                if existing is None:
+                    new_hashes.append(hash_key)
+                    new_rows.append(row)
+
+            if new_rows:
+                self._index_add(new_hashes, vectors[new_rows])
+            cache_size = len(self.cache)
+        self._maybe_fit_reducer()
         self._save_cache()
+        return {"imported": len(new_rows), "cache_size": cache_size}
+
+    def remove_many(self, hash_keys):
+        # Removed vectors are tombstoned in the index and purged by its compaction
+        with self._lock.write_locked():
+            removed_ids = []
+            for hash_key in hash_keys:
+                if self.cache.pop(hash_key, None) is not None:
+                    vector_id = self._hash_ids.pop(hash_key)
+                    del self.id_map[vector_id]
+                    removed_ids.append(vector_id)
+                    if self.sketch is not None:
+                        self.sketch.remove(hash_key)
+            self.index.remove(removed_ids)
+            self._compact_seq_log()
+            removed = len(removed_ids)
+        if removed:
+            self._save_cache()
+        return removed
+
+    def entries_since(self, seq: int, limit: int = 500, exclude_origin=None):
+        # Current entries changed after `seq`, oldest first, and the seq to resume from
+        with self._lock.read_locked():
+            position = bisect.bisect_right(self._seq_log, seq)
+            entries = []
+            next_seq = seq
+            while position < len(self._seq_log) and len(entries) < limit:
+                entry_seq, hash_key = self._seq_log[position], self._seq_hashes[position]
+                position += 1
+                next_seq = entry_seq
+                entry = self.cache.get(hash_key)
+                # Superseded or removed since this seq was recorded
+                if entry is None or entry.get("seq") != entry_seq:
+                    continue
+                if exclude_origin is not None and entry.get("origin") == exclude_origin:
+                    continue
+                entries.append((hash_key, entry))
+            return entries, next_seq
+
+    def iter_entries(self):
+        # Iterate over a snapshot of the keys so concurrent adds don't break the export
+        with self._lock.read_locked():
+            hash_keys = list(self.cache.keys())
+        for hash_key in hash_keys:
+            entry = self.cache.get(hash_key)
+            if entry is not None:
+                yield hash_key, entry
 
     def get_stats(self):
-        hit_count = self.stats["hits"]
-        miss_count = self.stats["misses"]
+        with self._stats_lock:
+            stats = dict(self.stats)
+            encode_by_length = {
+                label: {
+                    "texts": bucket["texts"],
+                    "batches": bucket["batches"],
+                    "avg_ms_per_text": round(bucket["seconds"] * 1000 / bucket["texts"], 3),
+                    "max_batch_ms": round(bucket["max_batch_seconds"] * 1000, 3),
+                }
+                for label, bucket in self.encode_stats.items()
+            }
+            long_prompts = dict(self.long_prompt_stats)
+        hit_count = stats["hits"]
+        miss_count = stats["misses"]
         total = hit_count + miss_count
         return {
             "enabled": self.enabled,
-            "cache_size": len(self.cache),
+            "cache_size": self.size(),
             "hit_count": hit_count,
             "miss_count": miss_count,
             "hit_rate": round(hit_count / total, 4) if total > 0 else 0.0,
-            "total_saved_cost": round(self.stats["saved_cost"], 6),
+            "total_saved_cost": round(stats["saved_cost"], 6),
+            "sketch_hits": stats.get("sketch_hits", 0),
+            "encodes_skipped": stats.get("encodes_skipped", 0),
+            "encode_by_length": encode_by_length,
+            "long_prompts": long_prompts,
             "status": "✅ Semantic cache loaded and ready",
         }
 
     def clear(self):
-        self.cache = {}
-        self.index.reset()
-        self.id_map = {}
-        self.stats = {"hits": 0, "misses": 0, "saved_cost": 0.0}
+        with self._lock.write_locked():
+            self.cache = {}
+            self.index.reset()
+            self.id_map = {}
+            self._hash_ids = {}
+            if self.sketch is not None:
+                self.sketch.clear()
+            # last_seq keeps counting so peers never see a sequence number reused
+            self._seq_log = []
+            self._seq_hashes = []
+        with self._stats_lock:
+            self.stats = {"hits": 0, "misses": 0, "saved_cost": 0.0}
         self._save_cache()
 
     def lookup(self, prompt: str):
-        embedding = self._get_embedding(prompt)
+        sketch_match = self._sketch_match(prompt)
+        result = self._lookup_lexical(prompt, sketch_match)
+        if result is not None:
+            return result
+        return self._lookup_embedding(prompt, self._get_embedding(prompt), sketch_match)
+
+    def lookup_many(self, prompts):
+        # One batched encode for the prompts the sketch couldn't answer
+        if not prompts:
+            return []
+        sketch_matches = [self._sketch_match(prompt) for prompt in prompts]
+        results = [self._lookup_lexical(prompt, match) for prompt, match in zip(prompts, sketch_matches)]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            embeddings = self._get_embeddings([prompts[i] for i in pending])
+            for i, embedding in zip(pending, embeddings):
+                results[i] = self._lookup_embedding(prompts[i], embedding, sketch_matches[i])
+        return results
+
+    def _is_expired(self, cached: dict) -> bool:
+        try:
+            ts = datetime.datetime.fromisoformat(cached.get("timestamp", "2000-01-01T00:00:00"))
+            return (datetime.datetime.now() - ts).total_seconds() > self.ttl_seconds
+        except Exception as e:
+            self.logger.warning(f"⚠️ Failed to parse timestamp: {e}")
+            return False
+
+    def _sketch_match(self, prompt: str):
+        # (hash, shingle Jaccard) of a lexical near-duplicate, or None
+        if self.sketch is None:
+            return None
+        with self._lock.read_locked():
+            return self.sketch.best_match(
+                prompt, lambda hash_key: (self.cache.get(hash_key) or {}).get("prompt"), self.sketch_threshold
+            )
+
+    def _lookup_lexical(self, prompt: str, sketch_match):
+        """
+        Answer from a near-exact lexical match without encoding the prompt.
+
+        Returns:
+            The hit, or None when the prompt needs an embedding lookup (no strict match, or it expired)
+        """
+        if sketch_match is None or self.sketch_hit_threshold is None:
+            return None
+        hash_key, jaccard = sketch_match
+        if jaccard < max(self.sketch_hit_threshold, self.similarity_threshold):
+            return None
+        with self._lock.read_locked():
+            cached = self.cache.get(hash_key)
+        if cached is None or self._is_expired(cached):
+            return None
+        self._count("hits")
+        self._count("sketch_hits")
+        self._count("encodes_skipped")
+        self.logger.info(f"✅ Cache hit from lexical match! Jaccard: {jaccard:.4f}, Query: {prompt}...")
+        return {
+            "response": cached["response"],
+            # No embedding was computed; the Jaccard cleared a threshold at least as strict as similarity's
+            "similarity": jaccard,
+            "sketch_similarity": jaccard,
+            "original_query": prompt,
+            "metadata": cached.get("metadata", {}),
+        }
+
+    def _lookup_embedding(self, prompt: str, embedding, sketch_match=None):
         embedding_np = np.array([embedding]).astype(np.float32)
 
-        if self.index.ntotal > 0:
-            D, I = self.index.search(embedding_np, k=1)
-            similarity = 1 / (1 + D[0][0])
-            best_id = I[0][0]
-            best_hash = self.id_map.get(best_id)
-
-            if best_hash and best_hash in self.cache:
-                cached = self.cache[best_hash]
-
-                # ✅ Check for TTL expiration
-                try:
-                    ts = datetime.datetime.fromisoformat(cached.get("timestamp", "2000-01-01T00:00:00"))
-                    if (datetime.datetime.now() - ts).total_seconds() > self.ttl_seconds:
-                        self.logger.info(f"⏳ Cache entry expired (TTL hit): {prompt[:50]}...")
-                        self.stats["misses"] += 1
-                        return None
-                except Exception as e:
-                    self.logger.warning(f"⚠️ Failed to parse timestamp: {e}")
-
-                if similarity >= 0.8:
-                    self.stats["hits"] += 1
-                    self.logger.info(f"✅ Cache hit! Similarity: {similarity:.4f}, Query: {prompt}...")
-                    return {
-                        "response": cached["response"],
-                        "similarity": similarity,
-                        "original_query": prompt,
-                        "metadata": cached.get("metadata", {}),
-                    }
-                else:
-                    self.logger.info(f"❌ Cache miss or low similarity ({similarity:.4f}) for: {prompt}...")
+        # Encoding happens outside the lock; only the search and entry read are guarded
+        similarity, cached = self._search(embedding_np)
+
+        # A near-duplicate the index search didn't surface (e.g. outside the probed IVF cells)
+        # is scored with the same embedding similarity as any other candidate
+        sketch_similarity = None
+        if sketch_match is not None:
+            with self._lock.read_locked():
+                candidate = self.cache.get(sketch_match[0])
+            if candidate is not None and candidate is not cached:
+                distance = np.sum((np.asarray(candidate["embedding"], dtype=np.float32) - embedding_np[0]) ** 2)
+                if cached is None or 1 / (1 + float(distance)) > similarity:
+                    similarity, cached = 1 / (1 + float(distance)), candidate
+            if candidate is not None and candidate is cached:
+                sketch_similarity = sketch_match[1]
+
+        if cached is not None:
+            # ✅ Check for TTL expiration
+            if self._is_expired(cached):
+                self.logger.info(f"⏳ Cache entry expired (TTL hit): {prompt[:50]}...")
+                self._count("misses")
+                return None
+
+            if similarity >= self.similarity_threshold:
+                self._count("hits")
+                if sketch_similarity is not None:
+                    self._count("sketch_hits")
+                self.logger.info(f"✅ Cache hit! Similarity: {similarity:.4f}, Query: {prompt}...")
+                result = {
+                    "response": cached["response"],
+                    "similarity": similarity,
+                    "original_query": prompt,
+                    "metadata": cached.get("metadata", {}),
+                }
+                if sketch_similarity is not None:
+                    # Shingle Jaccard of the lexical match; not comparable with similarity
+                    result["sketch_similarity"] = sketch_similarity
+                return result
+            else:
+                self.logger.info(f"❌ Cache miss or low similarity ({similarity:.4f}) for: {prompt}...")
 
         self.logger.info(f"❌ Cache miss for: {prompt}")
-        self.stats["misses"] += 1
+        self._count("misses")
         return None
 
     def wrap_async(self, func: Callable[[str], Coroutine[Any, Any, Any]]) -> Callable[[str], Coroutine[Any, Any, Any]]:
@@ -168,27 +673,14 @@ class SemanticCache:
                 return await func(prompt)
 
             result = self.lookup(prompt)
-            if result and result.get("similarity", 0) >= 0.8:
+            if result and result.get("similarity", 0) >= self.similarity_threshold:
                 return result
 
             response = await func(prompt)
-            self.stats["misses"] += 1
-            self.stats["saved_cost"] += getattr(response, "cost", 0)
+            self._count("misses")
+            self._count("saved_cost", getattr(response, "cost", 0))
 
-            hash_key = self._hash_prompt(prompt)
-            embedding = self._get_embedding(prompt)
-
-            self.cache[hash_key] = {
-                "prompt": prompt,
-                "embedding": embedding.tolist(),
-                "response": response.response if hasattr(response, "response") else response,
-                "metadata": {},
-                "timestamp": datetime.datetime.now().isoformat()
-            }
-
-            self.index.add(np.array([embedding]).astype(np.float32))
-            self.id_map[self.index.ntotal - 1] = hash_key
-            self._save_cache()
+            self.add(prompt, response.response if hasattr(response, "response") else response)
 
             return {
                 "response": response.response if hasattr(response, "response") else response,
@@ -0,0 +1,488 @@
+"""
+Shared Cache - Multi-process semantic cache backed by one memory-mapped store per host
+Every process pointing at the same cache directory searches the same mmap'd vectors
+(shared through the page cache) instead of loading its own copy of cache.json and the index.
+
+Store layout under <cache_path>/shared:
+    header.bin            magic | uint32 dimension | uint32 epoch | uint64 committed row count
+                          | uint64 rows committed in earlier epochs | uint64 committed tombstones
+                          | uint64 version, odd while a writer is updating the fields before it
+    vectors.<epoch>.f32   float32[rows, dimension]
+    norms.<epoch>.f32     float32[rows]      squared L2 norm of each vector
+    hashes.<epoch>.bin    32-byte sha256 digest per row
+    offsets.<epoch>.u64   uint64 (start, length) per row into entries.<epoch>.jsonl
+    entries.<epoch>.jsonl one JSON entry per row
+    removed.<epoch>.u64   uint64 row number per tombstone (rows dropped by remove_many)
+    .lock                 writer lock file
+
+Writers append under an exclusive file lock and publish rows by bumping the committed
+count in the header last. Readers compare the mmap'd header with what they have mapped
+on each lookup, which is how new entries become visible without a reload. Removal appends
+tombstones the same way; tombstoned rows are masked out of searches and iteration.
+The header is read without the lock, so it is versioned like a seqlock: writers make the
+version odd, update the fields and make it even again, and readers retry until they read
+the same even version before and after the fields.
+Mapped files are never shrunk, since other processes would fault reading past the new
+end: clear() starts a fresh set of files under the next epoch and switches to it in the
+header, and readers remap when they see the epoch change.
+"""
+
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+import datetime
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Iterator
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+try:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:  # Windows
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+logger = logging.getLogger("shared_cache")
+
+_HEADER = struct.Struct("<8sIIQQQQ")
+_MAGIC = b"SHCACHE3"
+# Mutable header fields (epoch, count, seq_base, removed) and the version that guards them
+_STATE = struct.Struct("<IQQQ")
+_STATE_OFFSET = 12
+_VERSION = struct.Struct("<Q")
+_VERSION_OFFSET = 40
+# Reads of an odd version before assuming the writer died mid-update
+_MAX_HEADER_SPINS = 10000
+_OFFSET = struct.Struct("<QQ")
+_DATA_FILES = ("vectors.f32", "norms.f32", "hashes.bin", "offsets.u64", "entries.jsonl", "removed.u64")
+
+
+class _Mapping:
+    """One epoch's committed rows as seen by this process; replaced, never changed, on refresh"""
+
+    def __init__(self, store: "SharedCacheStore", epoch: int, rows: int, seq_base: int, removed: int):
+        self.epoch = epoch
+        self.rows = rows
+        self.seq_base = seq_base
+        self.removed = removed
+        self.vectors = self.norms = self.offsets = self.hashes = None
+        self.live = np.ones(rows, dtype=bool)
+        # Opened first: once the epoch's files are unlinked by clear() this raises FileNotFoundError
+        self.entries_fh = open(store._data_path("entries.jsonl", epoch), "rb")
+        self._read_lock = threading.Lock()
+        if rows:
+            self.vectors = np.memmap(store._data_path("vectors.f32", epoch), dtype="<f4", mode="r",
+                                     shape=(rows, store.dimension))
+            self.norms = np.memmap(store._data_path("norms.f32", epoch), dtype="<f4", mode="r", shape=(rows,))
+            self.offsets = np.memmap(store._data_path("offsets.u64", epoch), dtype="<u8", mode="r", shape=(rows, 2))
+            self.hashes = np.memmap(store._data_path("hashes.bin", epoch), dtype=np.uint8, mode="r",
+                                    shape=(rows, 32))
+        if removed:
+            # Small and rarely written, so it is read rather than mapped
+            self.live[np.fromfile(store._data_path("removed.u64", epoch), dtype="<u8", count=removed)] = False
+
+    def matches(self, epoch: int, rows: int, removed: int) -> bool:
+        return (self.epoch, self.rows, self.removed) == (epoch, rows, removed)
+
+    def entry(self, row: int) -> Dict[str, Any]:
+        start, length = (int(v) for v in self.offsets[row])
+        with self._read_lock:
+            self.entries_fh.seek(start)
+            data = self.entries_fh.read(length)
+        return json.loads(data)
+
+
+class SharedCacheStore:
+    """
+    Append-only vector and entry store shared by all processes on a host; removed rows are tombstoned.
+    """
+
+    def __init__(self, path: str, dimension: int):
+        """
+        Open (or create) the store.
+
+        Args:
+            path: Store directory
+            dimension: Embedding dimension; must match an existing store
+        """
+        self.path = path
+        self.dimension = dimension
+        os.makedirs(path, exist_ok=True)
+        self._header_path = os.path.join(path, "header.bin")
+        self._lock_fh = open(os.path.join(path, ".lock"), "a+b")
+        self._thread_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._header = None
+
+        with self._writer():
+            if not os.path.exists(self._header_path) or os.path.getsize(self._header_path) < _HEADER.size:
+                with open(self._header_path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, dimension, 0, 0, 0, 0, 0))
+            with open(self._header_path, "rb") as f:
+                magic, stored_dimension, epoch, _, _, _, _ = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a shared cache store")
+            if stored_dimension != dimension:
+                raise ValueError(f"Shared store has dimension {stored_dimension}, model produces {dimension}")
+            for name in _DATA_FILES:
+                open(self._data_path(name, epoch), "ab").close()
+            stale = {int(parts[1]) for parts in (filename.split(".") for filename in os.listdir(path))
+                     if len(parts) == 3 and parts[1].isdigit() and int(parts[1]) != epoch}
+            for old_epoch in stale:
+                self._remove_epoch(old_epoch)
+
+        self._header_fh = open(self._header_path, "r+b")
+        self._header = mmap.mmap(self._header_fh.fileno(), _HEADER.size)
+        self._mapping = None
+
+    def _data_path(self, name: str, epoch: int) -> str:
+        stem, ext = name.split(".")
+        return os.path.join(self.path, f"{stem}.{epoch}.{ext}")
+
+    @contextmanager
+    def _writer(self):
+        # Serialises writers across threads (thread lock) and processes (file lock)
+        with self._thread_lock:
+            _lock_file(self._lock_fh)
+            try:
+                if self._header is not None:
+                    self._settle_header()
+                yield
+            finally:
+                _unlock_file(self._lock_fh)
+
+    def _read_header(self) -> Tuple[int, int, int, int]:
+        """(epoch, count, seq_base, removed) as last published by a writer"""
+        spins = 0
+        while True:
+            version = _VERSION.unpack_from(self._header, _VERSION_OFFSET)[0]
+            if version % 2 == 0:
+                state = _STATE.unpack_from(self._header, _STATE_OFFSET)
+                if _VERSION.unpack_from(self._header, _VERSION_OFFSET)[0] == version:
+                    return state
+                continue
+            spins += 1
+            if spins >= _MAX_HEADER_SPINS:
+                # Taking the writer lock settles a version left odd by a writer that died
+                with self._writer():
+                    pass
+                spins = 0
+            time.sleep(0)
+
+    def _settle_header(self):
+        # Caller holds the writer lock, so an odd version was left by a writer that died mid-update.
+        # The fields are packed in one call and point at data written before them, so they are kept
+        version = _VERSION.unpack_from(self._header, _VERSION_OFFSET)[0]
+        if version % 2:
+            _VERSION.pack_into(self._header, _VERSION_OFFSET, version + 1)
+            logger.warning(f"Recovered shared cache header left mid-update in {self.path}")
+
+    def _write_header(self, epoch: int, count: int, seq_base: int, removed: int):
+        # Caller holds the writer lock
+        version = _VERSION.unpack_from(self._header, _VERSION_OFFSET)[0]
+        _VERSION.pack_into(self._header, _VERSION_OFFSET, version + 1)
+        _STATE.pack_into(self._header, _STATE_OFFSET, epoch, count, seq_base, removed)
+        _VERSION.pack_into(self._header, _VERSION_OFFSET, version + 2)
+        self._header.flush()
+
+    def __len__(self):
+        _, count, _, removed = self._read_header()
+        return count - removed
+
+    def _refresh(self) -> _Mapping:
+        """Mapping of every row committed by any process so far"""
+        epoch, count, seq_base, removed = self._read_header()
+        mapping = self._mapping
+        if mapping is not None and mapping.matches(epoch, count, removed):
+            return mapping
+        with self._refresh_lock:
+            while True:
+                epoch, count, seq_base, removed = self._read_header()
+                mapping = self._mapping
+                if mapping is not None and mapping.matches(epoch, count, removed):
+                    return mapping
+                try:
+                    mapping = _Mapping(self, epoch, count, seq_base, removed)
+                except FileNotFoundError:
+                    # Cleared while we were mapping; the header already names the next epoch
+                    continue
+                self._mapping = mapping
+                return mapping
+
+    def search(self, query: np.ndarray, k: int = 1) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        Exact L2 search over the shared vectors.
+
+        Returns:
+            List of (squared distance, entry), nearest first
+        """
+        mapping = self._refresh()
+        count = mapping.rows
+        if count == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        distances = mapping.norms - 2.0 * (mapping.vectors @ query) + float(query @ query)
+        if mapping.removed:
+            distances[~mapping.live] = np.inf
+        k = min(k, count - mapping.removed)
+        if k <= 0:
+            return []
+        rows = np.argpartition(distances, k - 1)[:k] if k < count else np.arange(count)
+        rows = rows[np.argsort(distances[rows])][:k]
+        return [(max(float(distances[row]), 0.0), mapping.entry(int(row))) for row in rows]
+
+    def hashes(self) -> set:
+        mapping = self._refresh()
+        if mapping.rows == 0:
+            return set()
+        return {bytes(digest).hex() for digest in mapping.hashes[mapping.live]}
+
+    def iter_rows(self, start_seq: int = 0) -> Iterator[Tuple[int, Dict[str, Any], np.ndarray]]:
+        """
+        Live rows as (seq, entry, vector), oldest first.
+
+        Every row gets seq = rows committed before it across all epochs + 1, so sequence
+        numbers keep increasing through clear().
+
+        Args:
+            start_seq: Only rows with a greater seq are yielded
+        """
+        mapping = self._refresh()
+        first_row = max(start_seq - mapping.seq_base, 0)
+        for row in (np.flatnonzero(mapping.live[first_row:]) + first_row).tolist():
+            yield mapping.seq_base + row + 1, mapping.entry(row), np.array(mapping.vectors[row], dtype=np.float32)
+
+    @property
+    def last_seq(self) -> int:
+        _, count, seq_base, _ = self._read_header()
+        return seq_base + count
+
+    def _repair(self, epoch: int, count: int, removed: int):
+        """Drop partially written rows left behind by a writer that died mid-append"""
+        # Only bytes past the committed rows are cut, and no process maps those
+        entries_size = 0
+        if count:
+            with open(self._data_path("offsets.u64", epoch), "rb") as f:
+                f.seek((count - 1) * _OFFSET.size)
+                start, length = _OFFSET.unpack(f.read(_OFFSET.size))
+                entries_size = start + length
+        expected = {
+            "vectors.f32": count * self.dimension * 4,
+            "norms.f32": count * 4,
+            "hashes.bin": count * 32,
+            "offsets.u64": count * _OFFSET.size,
+            "entries.jsonl": entries_size,
+            "removed.u64": removed * 8,
+        }
+        for name, size in expected.items():
+            file_path = self._data_path(name, epoch)
+            if os.path.getsize(file_path) != size:
+                os.truncate(file_path, size)
+
+    @staticmethod
+    def _live_rows(mapping: _Mapping, digests: set) -> List[int]:
+        """Live rows stored under one of the digests"""
+        if mapping.rows == 0 or not digests:
+            return []
+        # Compare the first 8 bytes of every digest at once, then check candidates in full
+        prefixes = np.ascontiguousarray(mapping.hashes).view("<u8")[:, 0]
+        wanted = np.frombuffer(b"".join(digest[:8] for digest in digests), dtype="<u8")
+        candidates = np.flatnonzero(np.isin(prefixes, wanted) & mapping.live).tolist()
+        return [row for row in candidates if bytes(mapping.hashes[row]) in digests]
+
+    def append_many(self, items: List[Tuple[str, Dict[str, Any], np.ndarray]], replace: bool = False) -> int:
+        """
+        Append entries and publish them to every process.
+
+        Args:
+            items: (sha256 hex hash, entry, vector) tuples; entries must not contain the embedding
+            replace: Tombstone live rows already stored under the same hashes in the same commit,
+                and keep only the last item per hash
+
+        Returns:
+            Committed row count after the append
+        """
+        if replace:
+            latest = {hash_key: position for position, (hash_key, _, _) in enumerate(items)}
+            items = [items[position] for position in sorted(latest.values())]
+        if not items:
+            return len(self)
+        with self._writer():
+            epoch, count, seq_base, removed = self._read_header()
+            self._repair(epoch, count, removed)
+            if replace:
+                replaced = self._live_rows(self._refresh(), {bytes.fromhex(hash_key) for hash_key, _, _ in items})
+                if replaced:
+                    with open(self._data_path("removed.u64", epoch), "ab") as f:
+                        f.write(np.asarray(replaced, dtype="<u8").tobytes())
+                    removed += len(replaced)
+            vectors = np.vstack([np.asarray(vector, dtype="<f4").reshape(1, -1) for _, _, vector in items])
+            norms = np.einsum("ij,ij->i", vectors, vectors).astype("<f4")
+            entries_offset = os.path.getsize(self._data_path("entries.jsonl", epoch))
+            entry_blobs = []
+            offsets = []
+            for _, entry, _ in items:
+                blob = (json.dumps(entry) + "\n").encode("utf-8")
+                offsets.append(_OFFSET.pack(entries_offset, len(blob)))
+                entries_offset += len(blob)
+                entry_blobs.append(blob)
+            with open(self._data_path("entries.jsonl", epoch), "ab") as f:
+                f.write(b"".join(entry_blobs))
+            with open(self._data_path("offsets.u64", epoch), "ab") as f:
+                f.write(b"".join(offsets))
+            with open(self._data_path("hashes.bin", epoch), "ab") as f:
+                f.write(b"".join(bytes.fromhex(hash_key) for hash_key, _, _ in items))
+            with open(self._data_path("norms.f32", epoch), "ab") as f:
+                f.write(norms.tobytes())
+            with open(self._data_path("vectors.f32", epoch), "ab") as f:
+                f.write(vectors.tobytes())
+            # Publishing the new count (and any tombstones) is the commit point
+            count += len(items)
+            self._write_header(epoch, count, seq_base, removed)
+        return count - removed
+
+    def remove_many(self, hash_keys) -> int:
+        """
+        Tombstone every live row stored under one of the hashes.
+
+        Returns:
+            Number of rows removed
+        """
+        digests = {bytes.fromhex(hash_key) for hash_key in hash_keys}
+        if not digests:
+            return 0
+        with self._writer():
+            epoch, count, seq_base, removed = self._read_header()
+            self._repair(epoch, count, removed)
+            rows = self._live_rows(self._refresh(), digests)
+            if not rows:
+                return 0
+            with open(self._data_path("removed.u64", epoch), "ab") as f:
+                f.write(np.asarray(rows, dtype="<u8").tobytes())
+            # Publishing the new tombstone count is the commit point
+            self._write_header(epoch, count, seq_base, removed + len(rows))
+        return len(rows)
+
+    def clear(self):
+        with self._writer():
+            epoch, count, seq_base, _ = self._read_header()
+            for name in _DATA_FILES:
+                open(self._data_path(name, epoch + 1), "wb").close()
+            # Switching epochs is the commit point; readers remap on their next lookup
+            self._write_header(epoch + 1, 0, seq_base + count, 0)
+            # Processes that still map the old files keep them alive until they remap
+            self._remove_epoch(epoch)
+
+    def _remove_epoch(self, epoch: int):
+        # Processes that still map the files keep them alive until they remap
+        for name in _DATA_FILES:
+            try:
+                os.remove(self._data_path(name, epoch))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                # Windows refuses while another process has the file open; retried on the next open
+                logger.warning(f"Could not remove {self._data_path(name, epoch)}: {e}")
+
+
+class SharedSemanticCache(SemanticCache):
+    """
+    SemanticCache whose entries and index live in a SharedCacheStore.
+    Hit/miss stats stay per process.
+    """
+
+    def _load_cache(self):
+        # Rows appended by other processes never reach a per-process sketch, so it is left out
+        self.sketch = None
+        # The store searches full-dimension vectors shared by every process
+        self.reducer = None
+        self.store = SharedCacheStore(os.path.join(self.cache_path, "shared"), self.dimension)
+        self.logger.info(f"Attached to shared cache store with {len(self.store)} entries")
+
+    def _save_cache(self):
+        # Appends are durable as soon as they are committed to the shared store
+        pass
+
+    def size(self):
+        return len(self.store)
+
+    def _insert(self, hash_key: str, entry: dict, embedding_np, save: bool = True):
+        stored = {key: value for key, value in entry.items() if key != "embedding"}
+        stored["hash"] = hash_key
+        # Re-adding a prompt replaces its row, as it replaces the entry in SemanticCache
+        self.store.append_many([(hash_key, stored, embedding_np[0])], replace=True)
+
+    def _candidates(self, embedding_np, k: int):
+        return [(1 / (1 + distance), entry) for distance, entry in self.store.search(embedding_np[0], k=k)]
+
+    @property
+    def last_seq(self):
+        return self.store.last_seq if hasattr(self, "store") else 0
+
+    @last_seq.setter
+    def last_seq(self, value):
+        # SemanticCache.__init__ resets it; the shared store numbers its rows itself
+        pass
+
+    def iter_entries(self):
+        for _, entry, vector in self.store.iter_rows():
+            hash_key = entry.pop("hash")
+            entry["embedding"] = vector.tolist()
+            yield hash_key, entry
+
+    def entries_since(self, seq: int, limit: int = 500, exclude_origin=None):
+        # Rows committed after `seq` (by any process on this host), oldest first, and the seq to resume from
+        entries = []
+        next_seq = seq
+        for row_seq, entry, vector in self.store.iter_rows(start_seq=seq):
+            if len(entries) >= limit:
+                break
+            next_seq = row_seq
+            if exclude_origin is not None and entry.get("origin") == exclude_origin:
+                continue
+            hash_key = entry.pop("hash")
+            entry["seq"] = row_seq
+            entry["embedding"] = vector.tolist()
+            entries.append((hash_key, entry))
+        return entries, next_seq
+
+    def import_entries(self, entries, vectors):
+        # Rows are append-only: entries already in the store are skipped rather than replaced
+        known = self.store.hashes()
+        items = []
+        for row, entry in enumerate(entries):
+            if entry["hash"] in known:
+                continue
+            known.add(entry["hash"])
+            entry.setdefault("metadata", {})
+            entry["timestamp"] = entry.get("timestamp") or datetime.datetime.now().isoformat()
+            items.append((entry["hash"], entry, vectors[row]))
+        cache_size = self.store.append_many(items)
+        return {"imported": len(items), "cache_size": cache_size}
+
+    def remove_many(self, hash_keys):
+        return self.store.remove_many(hash_keys)
+
+    def clear(self):
+        self.store.clear()
+        with self._stats_lock:
+            self.stats = {"hits": 0, "misses": 0, "saved_cost": 0.0}
@@ -0,0 +1,70 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The model is replaced below, so the real package is only needed if it's installed
+try:
+    import sentence_transformers  # noqa: F401
+except ImportError:
+    sys.modules["sentence_transformers"] = types.SimpleNamespace(SentenceTransformer=None)
+
+import semantic_cache  # noqa: E402
+
+
+class CountingModel:
+    """Deterministic bag-of-words encoder that records every text it encodes"""
+
+    max_seq_length = 256
+
+    def __init__(self, model_name):
+        self.encoded = []
+
+    def get_sentence_embedding_dimension(self):
+        return 16
+
+    def encode(self, texts, batch_size=32):
+        self.encoded.extend(texts)
+        vectors = np.zeros((len(texts), 16), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, sum(word.encode()) % 16] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_cache, "SentenceTransformer", CountingModel)
+    cache = semantic_cache.SemanticCache(cache_path=str(tmp_path))
+    cache.add("What is the capital of France?", "Paris")
+    cache.model.encoded.clear()
+    return cache
+
+
+def test_near_duplicate_hit_skips_encode(cache):
+    result = cache.lookup("what is the capital of france")
+
+    assert result["response"] == "Paris"
+    assert result["sketch_similarity"] >= cache.sketch_hit_threshold
+    assert cache.model.encoded == []
+    assert cache.get_stats()["encodes_skipped"] == 1
+
+
+def test_lookup_many_encodes_only_prompts_without_a_lexical_match(cache):
+    results = cache.lookup_many(["What is the capital of France??", "How tall is Mount Everest?"])
+
+    assert results[0]["response"] == "Paris"
+    assert cache.model.encoded == ["How tall is Mount Everest?"]
+
+
+def test_loose_lexical_match_is_encoded(cache):
+    cache.sketch_hit_threshold = 1.01
+
+    cache.lookup("what is the capital of france")
+
+    assert cache.model.encoded == ["what is the capital of france"]
+    assert cache.get_stats()["encodes_skipped"] == 0
@@ -0,0 +1,83 @@
+"""
+Zip Stream - Zip archives generated while they are sent
+Entries are read in chunks and the archive bytes are yielded as soon as zipfile produces
+them, so a download needs neither a temporary file nor the whole archive in memory.
+zipfile writes sizes and CRCs in data descriptors because the output can't be seeked.
+"""
+
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator, Tuple, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+# (archive name, file path or bytes, compression)
+ZipEntry = Tuple[str, Union[str, bytes], int]
+
+
+class _StreamSink:
+    """Write-only file object that buffers zipfile's output until the generator collects it"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries: Iterable[ZipEntry], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield a zip archive of `entries` piece by piece.
+
+    Args:
+        entries: (arcname, source, compression) tuples; source is a path or bytes,
+            compression zipfile.ZIP_STORED (for already-compressed data) or ZIP_DEFLATED
+        chunk_size: Bytes read from each file per step
+
+    Yields:
+        Consecutive parts of the archive
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, "w") as archive:
+        for arcname, source, compression in entries:
+            if isinstance(source, (bytes, bytearray)):
+                info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                info.compress_type = compression
+                info.external_attr = 0o644 << 16
+                archive.writestr(info, source)
+            else:
+                # from_file keeps the mode, so the executable stays executable after unzipping
+                info = zipfile.ZipInfo.from_file(source, arcname)
+                info.compress_type = compression
+                # Tells zipfile up front whether the entry needs zip64 fields
+                info.file_size = os.path.getsize(source)
+                with open(source, "rb") as f, archive.open(info, "w") as dest:
+                    while True:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory, written when the archive closes
+    yield sink.drain()